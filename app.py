@@ -1,28 +1,58 @@
+import json
+import logging
 import os
+import time
 import uuid
-import tempfile
 import shutil
 from pathlib import Path
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, g
 from ocr_preprocessor import OCRProcessor
 from werkzeug.utils import secure_filename
-from yolox_od.inference import run_inference
-import cv2
-import numpy as np
+from document_pipeline import rasterize_pdf, process_document, PDF_DPI, PDF_MAX_PAGES, POPPLER_PATH
+from page_dedupe import PageHashIndex
+from ocr_archive import OCRArchive
+from routing_policy import RoutingPolicy, RoutingReport
+from result_store import ResultStore, file_hash
+from result_sink import ResultSink
+from result_export import get_format
+from document_scheduler import DocumentScheduler, document_cost, INTERACTIVE, BULK
+from jobs import Job, JobManager, QueueFull, DONE, FAILED, INTERACTIVE_KIND
+from work_queue import WorkQueue, DONE as QUEUE_DONE
+from config import WORK_QUEUE_POLL_SECONDS, WORK_QUEUE_WAIT_SECONDS
+from models import OCRResult, InvoiceFields
+from log_setup import configure_logging, set_correlation_id, reset_correlation_id, get_correlation_id
 
 # PDF → image
 from pdf2image import convert_from_path
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
 # Initialize OCR processor
 ocr_processor = OCRProcessor()
 
+# Per-document result rows; target_results.xlsx is exported from here on demand.
+# Request threads only queue rows - the sink's writer thread does all the inserts.
+result_store = ResultStore.from_config()
+result_sink = ResultSink(result_store)
+
+# Upload jobs share one scheduler: BATCH_DOCUMENT_CONCURRENCY files and BATCH_PAGE_CONCURRENCY Vision requests at once
+document_scheduler = DocumentScheduler.from_config()
+
+# With WORK_QUEUE_ENABLED, upload jobs are processed by batch_processor.py --queue workers (on this host or others)
+# instead of in this process; UPLOAD_DIR must then be on storage those hosts mount at the same path
+work_queue = WorkQueue.from_config()
+
 # === CONFIG ===
 UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "./uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100 MB
+# Seconds between checks that an upload job's queued files are still in the work queue
+QUEUE_CHECK_SECONDS = 30
+
 ALLOWED_EXTS = {"pdf", "jpg", "jpeg", "png"}
 ALLOWED_MIME = {
     "application/pdf",
@@ -31,20 +61,36 @@ ALLOWED_MIME = {
     "image/png",
 }
 
-PDF_DPI = int(os.environ.get("PDF_DPI", "200"))
-PDF_MAX_PAGES = os.environ.get("PDF_MAX_PAGES")  # e.g. "10" to cap pages
-PDF_MAX_PAGES = int(PDF_MAX_PAGES) if PDF_MAX_PAGES else None
-
+# PDF_DPI, PDF_MAX_PAGES and POPPLER_PATH are read from the environment in document_pipeline.
 # If Poppler executables aren't in PATH, set POPPLER_PATH to the bin folder:
 #   Windows example: set POPPLER_PATH=C:\poppler\bin
 #   Linux/macOS: usually not needed if installed via apt/brew
-POPPLER_PATH = os.environ.get("POPPLER_PATH")
 
 
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTS
 
 
+@app.before_request
+def start_correlation():
+    # Ties upload, OD and OCR log events of one request together
+    g.correlation_token = set_correlation_id(request.headers.get("X-Request-ID"))
+    logger.info("%s %s", request.method, request.path)
+
+
+@app.after_request
+def add_correlation_header(response):
+    response.headers["X-Request-ID"] = get_correlation_id() or ""
+    return response
+
+
+@app.teardown_request
+def end_correlation(exc=None):
+    token = g.pop("correlation_token", None)
+    if token is not None:
+        reset_correlation_id(token)
+
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -128,119 +174,212 @@ def upload():
         }), 500
 
 
-@app.route("/upload-document", methods=["POST"])
-def upload_document():
-    if "file" not in request.files:
-        return jsonify({"error": "No file part in form-data (expected key 'file')."}), 400
+def _failed_result(filename: str, error: str) -> OCRResult:
+    return OCRResult(
+        filename=filename,
+        total_pages=0,
+        master_fields=InvoiceFields(),
+        fields_found=[],
+        page_details=[],
+        processing_status="Failed",
+        error_message=error,
+        sticker_flag=False,
+        signature_flag=False
+    )
+
+
+def _ui_row(result: dict) -> dict:
+    """Table row for the UI from a stored OCRResult"""
+    fields = result.get("master_fields") or {}
+    return {
+        'filename': result.get('filename', 'Unknown'),
+        'invoice_number': fields.get('invoice_number'),
+        'store_number': fields.get('store_number'),
+        'invoice_date': fields.get('invoice_date'),
+        'sticker_date': fields.get('sticker_date'),
+        'total_quantity': fields.get('total_quantity'),
+        'has_frito_lay': "Yes" if fields.get('has_frito_lay') else "No",
+        'has_signature': "Yes" if fields.get('has_signature') else "No",
+        'has_sticker': "Yes" if fields.get('has_sticker') else "No",
+        'processing_status': result.get('processing_status', 'Failed'),
+        'is_valid': fields.get('is_valid', 'Invalid')
+    }
+
+
+def _process_job_files(job: Job):
+    """Process a job's pending files in this process, reporting each stage to the job's event stream"""
+    # Near-duplicate pages across the job's files reuse OCR/OD results
+    page_index = PageHashIndex.from_config()
+    routing_policy = RoutingPolicy.from_config()
+    archive = OCRArchive.from_config()
+
+    def process_file(job_file):
+        job.file_started(job_file)
+        path = Path(job_file.path)
+
+        def progress(stage, **data):
+            job.emit(stage, file=job_file.index, filename=job_file.filename, **data)
 
-    f = request.files["file"]
-    if not f.filename:
-        return jsonify({"error": "No file selected."}), 400
+        try:
+            content_hash = file_hash(path)
+            if path.suffix.lower() == ".pdf":
+                image_paths = rasterize_pdf(path, path.parent / f"{path.stem}-pages")
+            else:
+                image_paths = [str(path)]
+            progress("rasterized", pages=len(image_paths))
+
+            # OD on the first page gives the sticker/signature flags, then OCR every page
+            result = process_document(image_paths, job_file.filename, ocr_processor, page_index, routing_policy, archive,
+                                      progress=progress, page_pool=document_scheduler.page_pool)
+            result_sink.put(result, content_hash)
+            result_data = result.model_dump(mode="json")
+            progress("written", row=_ui_row(result_data))
+            job.file_done(job_file, result_data)
+        except Exception as e:
+            logger.exception("Error processing %s: %s", job_file.filename, e, extra={"document": job_file.filename})
+            _record_failure(job, job_file, str(e))
 
-    if not allowed_file(f.filename):
-        return jsonify({"error": "Only PDF, JPG, JPEG, PNG allowed."}), 400
+    try:
+        # Files overlap on the scheduler's workers; outcomes come back in upload order. Single-document uploads
+        # go ahead of batches, and short documents ahead of long ones
+        priority = INTERACTIVE if job.kind == INTERACTIVE_KIND else BULK
+
+        def cost(job_file):
+            return document_cost(job_file.path, PDF_MAX_PAGES)
+
+        for job_file, _, error in document_scheduler.map(process_file, job.pending_files(), priority, cost):
+            if error is not None:
+                logger.error("Error processing %s: %s", job_file.filename, error, extra={"document": job_file.filename})
+                job.file_failed(job_file, str(error))
+    finally:
+        if page_index is not None:
+            page_index.save()
+        if archive is not None:
+            archive.close()
+
+
+def _record_failure(job: Job, job_file, error: str):
+    failed_result = _failed_result(job_file.filename, error)
+    result_sink.put(failed_result)
+    result_data = failed_result.model_dump(mode="json")
+    job.emit("written", file=job_file.index, filename=job_file.filename, row=_ui_row(result_data))
+    job.file_failed(job_file, error, result_data)
+
+
+def _queue_job_files(job: Job):
+    """Hand a job's pending files to the shared work queue and record each outcome as a worker finishes it.
+
+    Task ids are derived from the job and file, so a job resumed after a
+    restart waits for the tasks it queued before instead of queueing them again.
+    A file fails when its task disappears from the queue folder, or when it is
+    not finished within WORK_QUEUE_WAIT_SECONDS (e.g. no worker is running).
+    """
+    tasks = {}
+    for job_file in job.pending_files():
+        task_id = work_queue.put(job_file.path, job_file.filename, task_id=f"{job.id}-{job_file.index:04d}",
+                                 job_id=job.id)
+        tasks[task_id] = job_file
+    job.emit("queued", tasks=len(tasks))
+    deadline = time.monotonic() + WORK_QUEUE_WAIT_SECONDS
+    next_check = time.monotonic() + QUEUE_CHECK_SECONDS
+    while tasks:
+        for task in work_queue.finished(list(tasks)):
+            job_file = tasks.pop(task.id)
+            if task.state == QUEUE_DONE:
+                result = OCRResult.model_validate(task.result)
+                result_sink.put(result, task.content_hash)
+                result_data = result.model_dump(mode="json")
+                job.emit("written", file=job_file.index, filename=job_file.filename, row=_ui_row(result_data))
+                job.file_done(job_file, result_data)
+            else:
+                logger.error("Error processing %s: %s", job_file.filename, task.error,
+                             extra={"document": job_file.filename, "task_id": task.id, "attempts": task.attempts})
+                _record_failure(job, job_file, task.error or "Processing failed")
+        if tasks and time.monotonic() >= next_check:
+            next_check = time.monotonic() + QUEUE_CHECK_SECONDS
+            work_queue.reclaim_expired()  # a stranded task goes back to ready even if no worker is running
+            for task_id in work_queue.missing(list(tasks)):
+                job_file = tasks.pop(task_id)
+                logger.error("Task of %s is no longer in the work queue", job_file.filename,
+                             extra={"document": job_file.filename, "task_id": task_id})
+                _record_failure(job, job_file, "Task is no longer in the work queue")
+        if tasks and time.monotonic() >= deadline:
+            for task_id, job_file in tasks.items():
+                logger.error("No worker finished %s within %.0fs", job_file.filename, WORK_QUEUE_WAIT_SECONDS,
+                             extra={"document": job_file.filename, "task_id": task_id})
+                _record_failure(job, job_file, f"Not processed within {WORK_QUEUE_WAIT_SECONDS:.0f}s")
+            return
+        if tasks:
+            time.sleep(WORK_QUEUE_POLL_SECONDS)
+
+
+def run_job(job: Job) -> dict:
+    """Process a job's files in a background worker (or wait for the work queue's workers); returns the job summary"""
+    if work_queue is not None:
+        _queue_job_files(job)
+    else:
+        _process_job_files(job)
 
-    # Create a unique folder per upload to avoid name clashes
-    base_name = Path(secure_filename(f.filename)).stem
-    token = uuid.uuid4().hex[:8]
-    upload_base = UPLOAD_DIR / f"{base_name}-{token}"
-    upload_base.mkdir(parents=True, exist_ok=True)
+    # Files finished before a restart count too, so the report is rebuilt from the stored results
+    report = RoutingReport()
+    for job_file in job.files:
+        if job_file.result is not None:
+            report.add(OCRResult.model_validate(job_file.result))
+    shutil.rmtree(UPLOAD_DIR / "jobs" / job.id, ignore_errors=True)
+    progress = job.progress()
+    logger.info("Batch finished", extra={"successful": progress["done"], "failed": progress["failed"],
+                                         "report": report.summary()})
+    return {"report": report.summary()}
 
-    # Save original file
-    ext = f.filename.rsplit(".", 1)[1].lower()
-    original_path = upload_base / f"original.{ext}"
+
+job_manager = JobManager(run_job)
+
+
+def _submit_job(kind: str, files: list):
+    """Save the uploads under UPLOAD_DIR/jobs/<id>/ and queue them; 202 with the job id"""
+    job_id = uuid.uuid4().hex
+    job_dir = UPLOAD_DIR / "jobs" / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    saved = []
     try:
-        f.save(original_path)
+        for i, f in enumerate(files):
+            path = job_dir / f"{i:04d}-{secure_filename(f.filename) or 'upload'}"
+            f.save(path)
+            saved.append((f.filename, path))
+        job_manager.submit(kind, saved, job_id=job_id)
+    except QueueFull as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return jsonify({"error": f"Too many jobs waiting, try again later ({e})"}), 503
     except Exception as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
         return jsonify({"error": f"Failed to save file: {e}"}), 500
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "file_count": len(saved)
+    }), 202
 
-    image_paths = []
-    
-    # If image, use it directly
-    if ext in {"jpg", "jpeg", "png"}:
-        image_paths.append(str(original_path))
-    else:
-        # If PDF, convert pages to PNG
-        pages_dir = upload_base / "pages"
-        pages_dir.mkdir(exist_ok=True)
 
-        try:
-            # Convert PDF → PIL images
-            pages = convert_from_path(
-                str(original_path),
-                dpi=PDF_DPI,
-                poppler_path=POPPLER_PATH
-            )
+@app.route("/upload-document", methods=["POST"])
+def upload_document():
+    """Queue one document; poll /jobs/<job_id> for the result"""
+    if "file" not in request.files:
+        return jsonify({"error": "No file part in form-data (expected key 'file')."}), 400
 
-            if PDF_MAX_PAGES is not None:
-                pages = pages[:PDF_MAX_PAGES]
+    f = request.files["file"]
+    if not f.filename:
+        return jsonify({"error": "No file selected."}), 400
 
-            for i, page in enumerate(pages, start=1):
-                out_path = pages_dir / f"page_{i:03d}.png"
-                page.save(out_path, "PNG")
-                image_paths.append(str(out_path))
+    if not allowed_file(f.filename):
+        return jsonify({"error": "Only PDF, JPG, JPEG, PNG allowed."}), 400
 
-        except Exception as e:
-            hint = (
-                "Install Poppler and/or set POPPLER_PATH. "
-                "Ubuntu: apt install poppler-utils; macOS: brew install poppler; "
-                "Windows: download build and set POPPLER_PATH to its 'bin' folder."
-            )
-            return jsonify({
-                "error": f"Error converting PDF to images: {e}",
-                "hint": hint
-            }), 500
-
-    # Process images with OCR
-    try:
-        # Process with OCR - get sticker and signature flags from OD model
-        sticker_flag = False
-        signature_flag = False
-        
-        # Run OD model on the first image to detect sticker and signature
-        if image_paths:
-            try:
-                import cv2
-                first_image = cv2.imread(image_paths[0])
-                if first_image is not None:
-                    print(f"Running OD model on {f.filename}...")
-                    vis_img, op_results = run_inference(first_image)
-                    
-                    # Extract detection results
-                    print(f"OD model returned: {type(op_results)} - {op_results}")
-                    
-                    if op_results and len(op_results) > 0:
-                        # op_results is now a list of detected class names
-                        detected_classes = op_results
-                        print(f"Detected classes: {detected_classes}")
-                        
-                        # Check for sticker and signature detections using exact class names
-                        sticker_flag = 'sticker' in detected_classes
-                        signature_flag = 'signature' in detected_classes
-                        
-                        print(f"OD Results - Sticker: {sticker_flag}, Signature: {signature_flag}")
-                    else:
-                        print("No objects detected by OD model")
-                else:
-                    print(f"Could not read image for OD model: {image_paths[0]}")
-            except Exception as e:
-                print(f"Error running OD model: {e}")
-                # Fall back to default values
-                sticker_flag = False
-                signature_flag = False
-        
-        final_results = ocr_processor.process_images(image_paths, f.filename, sticker_flag, signature_flag)
-        
-        # Save to Excel
-        ocr_processor.save_to_excel(final_results, f.filename, final_results.sticker_flag if hasattr(final_results, 'sticker_flag') else False)
-        
-    except Exception as e:
-        return jsonify({"error": f"Error processing images with OCR: {e}"}), 500
+    return _submit_job("document", [f])
 
 
 @app.route("/batch-process-files", methods=["POST"])
 def batch_process_files():
-    """Process multiple PDF files uploaded via form"""
+    """Queue multiple PDF files uploaded via form; poll /jobs/<job_id> for progress and results"""
     if "files" not in request.files:
         return jsonify({"error": "No files provided"}), 400
     
@@ -254,236 +393,92 @@ def batch_process_files():
     
     if not pdf_files:
         return jsonify({"error": "No PDF files found in selection"}), 400
-    
-    try:
-        # Create output directory
-        output_dir = Path("inference_output")
-        output_dir.mkdir(exist_ok=True)
-        
-        # Create output Excel file - use single file for all results
-        output_excel = output_dir / "target_results.xlsx"
-        
-        # Process each PDF file individually
-        all_results = []
-        successful = 0
-        failed = 0
-        
-        for f in pdf_files:
-            try:
-                
-                # Create a unique temporary directory for this file
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # Save the PDF file
-                    pdf_path = os.path.join(temp_dir, secure_filename(f.filename))
-                    f.save(pdf_path)
-                    
-                    # Process the PDF using OCR processor directly
-                    from ocr_preprocessor import OCRProcessor
-                    ocr_processor = OCRProcessor()
-                    
-                    # Convert PDF to images
-                    from pdf2image import convert_from_path
-                    pages = convert_from_path(
-                        pdf_path,
-                        dpi=200,
-                        poppler_path=os.environ.get("POPPLER_PATH")
-                    )
-                    
-                    # Save pages as images
-                    image_paths = []
-                    for i, page in enumerate(pages, start=1):
-                        img_path = os.path.join(temp_dir, f"page_{i:03d}.png")
-                        page.save(img_path, "PNG")
-                        image_paths.append(img_path)
-                    
-                    # Process with OCR - get sticker and signature flags from OD model
-                    sticker_flag = False
-                    signature_flag = False
-                    
-                    # Run OD model on the first image to detect sticker and signature
-                    if image_paths:
-                        try:
-                            import cv2
-                            first_image = cv2.imread(image_paths[0])
-                            if first_image is not None:
-                                print(f"Running OD model on {f.filename}...")
-                                vis_img, op_results = run_inference(first_image)
-                                
-                                # Extract detection results
-                                print(f"OD model returned: {type(op_results)} - {op_results}")
-                                
-                                if op_results and len(op_results) > 0:
-                                    # op_results is now a list of detected class names
-                                    detected_classes = op_results
-                                    print(f"Detected classes: {detected_classes}")
-                                    
-                                    # Check for sticker and signature detections using exact class names
-                                    sticker_flag = 'sticker' in detected_classes
-                                    signature_flag = 'signature' in detected_classes
-                                    
-                                    print(f"OD Results - Sticker: {sticker_flag}, Signature: {signature_flag}")
-                                else:
-                                    print("No objects detected by OD model")
-                            else:
-                                print(f"Could not read image for OD model: {image_paths[0]}")
-                        except Exception as e:
-                            print(f"Error running OD model: {e}")
-                            # Fall back to default values
-                            sticker_flag = False
-                            signature_flag = False
-                    
-                    result = ocr_processor.process_images(image_paths, f.filename, sticker_flag, signature_flag)
-                    
-                    print(f"OCR processing completed for {f.filename}")
-                    print(f"Result type: {type(result)}")
-                    print(f"Result has master_fields: {hasattr(result, 'master_fields')}")
-                    if hasattr(result, 'master_fields'):
-                        print(f"Master fields: {result.master_fields}")
-                    
-                    # Result is ready
-                    all_results.append(result)
-                    successful += 1
-                    
-            except Exception as e:
-                print(f"Error processing {f.filename}: {e}")
-                failed += 1
-                # Create a failed result
-                from models import OCRResult, InvoiceFields
-                failed_result = OCRResult(
-                    filename=f.filename,
-                    total_pages=0,
-                    master_fields=InvoiceFields(),
-                    fields_found=[],
-                    page_details=[],
-                    processing_status="Failed",
-                    error_message=str(e),
-                    sticker_flag=False,
-                    signature_flag=False
-                )
-                all_results.append(failed_result)
-        
-        # Save results to Excel
-        print(f"All results: {all_results}")
-        print(f"Successful: {successful}, Failed: {failed}")
-        from models import ExcelRow
-        excel_rows = []
-        print(f"Processing {len(all_results)} results to create Excel rows...")
-        for i, result in enumerate(all_results):
-            print(f"Processing result {i+1}: {type(result)}")
-            try:
-                if hasattr(result, 'master_fields'):
-                    print(f"Result {i+1} has master_fields, creating ExcelRow...")
-                    excel_row = ExcelRow.from_ocr_result(result, result.sticker_flag if hasattr(result, 'sticker_flag') else False)
-                    print(f"Successfully created ExcelRow for result {i+1}")
-                else:
-                    print(f"Result {i+1} is a failed result dict, creating failed ExcelRow...")
-                    excel_row = ExcelRow.from_failed_processing(
-                        result.get('filename', 'Unknown'),
-                        result.get('error_message', 'Unknown error')
-                    )
-                    print(f"Successfully created failed ExcelRow for result {i+1}")
-                excel_rows.append(excel_row)
-            except Exception as e:
-                print(f"Error creating ExcelRow for result {i+1}: {e}")
-                # Create a failed row
-                excel_row = ExcelRow.from_failed_processing(
-                    result.filename if hasattr(result, 'filename') else 'Unknown',
-                    str(e)
-                )
-                excel_rows.append(excel_row)
-        
-        print(f"Created {len(excel_rows)} Excel rows")
-        
-        # Convert to DataFrame and save - append to existing file if it exists
-        import pandas as pd
-        row_dicts = []
-        for row in excel_rows:
-            row_dict = row.model_dump()
-            # Convert boolean values to strings to avoid Excel TRUE/FALSE
-            for key, value in row_dict.items():
-                if isinstance(value, bool):
-                    if key == 'has_sticker':
-                        # has_sticker should reflect the OD model result
-                        row_dict[key] = "Yes" if value else "No"
-                    elif key == 'has_signature':
-                        # has_signature should reflect the OCR result
-                        row_dict[key] = "Yes" if value else "No"
-                    elif key == 'has_frito_lay':
-                        # has_frito_lay should reflect the OCR result
-                        row_dict[key] = "Yes" if value else "No"
-                    else:
-                        # For other boolean fields, convert as usual
-                        row_dict[key] = "Yes" if value else "No"
-            row_dicts.append(row_dict)
-        
-        new_df = pd.DataFrame(row_dicts)
-        
-        try:
-            if output_excel.exists():
-                # Read the existing data
-                existing_df = pd.read_excel(output_excel)
-                # Ensure the existing DataFrame has the correct columns
-                for col in new_df.columns:
-                    if col not in existing_df.columns:
-                        existing_df[col] = None
-                existing_df = existing_df[list(new_df.columns)]
-                
-                # Append the new DataFrame
-                combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-            else:
-                # If the file doesn't exist, start with the new data
-                combined_df = new_df
-            
-            # Write the entire combined DataFrame back to the Excel file
-            combined_df.to_excel(output_excel, index=False)
-            
-        except Exception as e:
-            print(f"Error appending to Excel: {e}")
-            # Fallback: save as new file
-            new_df.to_excel(output_excel, index=False)
-        
-        # Convert results to a format suitable for the UI
-        ui_results = []
-        for result in all_results:
-            if hasattr(result, 'master_fields'):
-                ui_result = {
-                    'filename': result.filename,
-                    'invoice_number': result.master_fields.invoice_number,
-                    'store_number': result.master_fields.store_number,
-                    'invoice_date': result.master_fields.invoice_date,
-                    'sticker_date': result.master_fields.sticker_date,
-                    'total_quantity': result.master_fields.total_quantity,
-                    'has_frito_lay': "Yes" if result.master_fields.has_frito_lay else "No",
-                    'has_signature': "Yes" if result.master_fields.has_signature else "No",
-                    'has_sticker': "Yes" if result.master_fields.has_sticker else "No",
-                    'processing_status': result.processing_status,
-                    'is_valid': result.master_fields.is_valid
-                }
-            else:
-                ui_result = {
-                    'filename': result.filename if hasattr(result, 'filename') else 'Unknown',
-                    'invoice_number': None,
-                    'store_number': None,
-                    'invoice_date': None,
-                    'sticker_date': None,
-                    'total_quantity': None,
-                    'has_frito_lay': "No",
-                    'has_signature': "No",
-                    'has_sticker': "No",
-                    'processing_status': 'Failed',
-                    'is_valid': 'Invalid'
-                }
-            ui_results.append(ui_result)
-        
-        return jsonify({
-            "message": f"Batch processing completed. Success: {successful}, Failed: {failed}",
-            "pdf_count": len(pdf_files),
-            "output_file": str(output_excel),
-            "results": ui_results
-        }), 200
-        
-    except Exception as e:
-        return jsonify({"error": f"Error during batch processing: {e}"}), 500
+
+    return _submit_job("batch", pdf_files)
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queue one or more documents (form key 'files' or 'file')"""
+    files = [f for f in request.files.getlist("files") + request.files.getlist("file") if f.filename]
+    if not files:
+        return jsonify({"error": "No files provided (expected key 'files' or 'file')"}), 400
+    rejected = [f.filename for f in files if not allowed_file(f.filename)]
+    if rejected:
+        return jsonify({"error": f"Only PDF, JPG, JPEG, PNG allowed: {', '.join(rejected)}"}), 400
+    return _submit_job("document" if len(files) == 1 else "batch", files)
+
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    """Most recent jobs with their progress (no per-file results)"""
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({
+        "queued": job_manager.queued(),
+        "scheduler": document_scheduler.metrics(),
+        "jobs": [job.to_dict(include_results=False) for job in job_manager.recent(limit)]
+    }), 200
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Status, per-file progress and, as files finish, their results"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    data = job.to_dict()
+    results = [f.result for f in job.files if f.result is not None]
+    progress = data["progress"]
+    data["results"] = [_ui_row(result) for result in results]
+    data["output_file"] = "/results/export"
+    data["message"] = (
+        f"Batch processing completed. Success: {progress['done']}, Failed: {progress['failed']}"
+        if job.status in (DONE, FAILED) else
+        f"Processed {progress['done'] + progress['failed']} of {progress['total']} file(s)"
+    )
+    return jsonify(data), 200
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress.
+
+    Starts with a ``snapshot`` event (the job as GET /jobs/<id> returns it)
+    unless the client reconnects with Last-Event-ID, then streams the stage
+    events - file_started, rasterized, detected, ocred, extracted, written,
+    file_done/file_failed - and ends after ``job_finished``.
+    """
+    if job_manager.get(job_id) is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+
+    def stream():
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        if after is None:
+            after = job_manager.events.last_id(job_id)
+            job = job_manager.get(job_id)
+            yield _sse("snapshot", job.to_dict(include_results=False), after)
+            if job.status in (DONE, FAILED) and after == 0:
+                return  # finished before this process started: nothing more will come
+        for event in job_manager.events.follow(job_id, after):
+            if event is not None:
+                yield _sse(event[1], event[2], event[0])
+                continue
+            # Idle: keep proxies from closing the connection, and stop if the job ended without events here
+            job = job_manager.get(job_id)
+            if job.status in (DONE, FAILED) and job_manager.events.last_id(job_id) == 0:
+                yield _sse("job_finished", {"status": job.status, "error": job.error, "progress": job.progress(),
+                                            "summary": job.summary})
+                return
+            yield ": keepalive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _sse(name: str, data: dict, event_id: int = None) -> str:
+    event_id = f"id: {event_id}\n" if event_id else ""
+    return f"{event_id}event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @app.route("/batch-process", methods=["POST"])
@@ -506,24 +501,40 @@ def batch_process():
         # Create batch processor
         processor = BatchProcessor(folder_path)
         
-        # Get PDF files
-        pdf_files = processor.get_pdf_files()
-        
-        if not pdf_files:
+        # The inputs are walked lazily, so look at the first one only to reject an empty folder
+        if next(iter(processor.get_pdf_files()), None) is None:
             return jsonify({"error": f"No PDF files found in: {folder_path}"}), 400
         
         # Process batch
-        processor.process_batch()
+        summary = processor.process_batch()
         
         return jsonify({
             "message": "Batch processing completed successfully",
-            "pdf_count": len(pdf_files),
-            "output_file": str(processor.output_excel)
+            "pdf_count": summary["total_files"],
+            "successful": summary["successful"],
+            "failed": summary["failed"],
+            "output_file": summary["output_file"]
         }), 200
         
     except Exception as e:
         return jsonify({"error": f"Error during batch processing: {e}"}), 500
 
 
+@app.route("/results/export", methods=["GET"])
+def export_results():
+    """Download the results (?format=xlsx|csv|jsonl|parquet), streamed from the result store while it is generated"""
+    try:
+        export_format = get_format(request.args.get("format"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result_sink.flush()
+    logger.info("Results export started", extra={"rows": result_store.count(), "format": export_format.name})
+    return Response(
+        result_store.iter_export(export_format),
+        mimetype=export_format.mimetype,
+        headers={"Content-Disposition": f"attachment; filename=target_results{export_format.extension}"},
+    )
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080, debug=True)
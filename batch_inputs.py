@@ -0,0 +1,218 @@
+# batch_inputs.py
+"""
+Streaming enumeration of batch inputs.
+
+``iter_inputs`` walks a folder with ``os.scandir`` and yields PDF paths as it
+finds them, without listing or sorting the tree first. Processing of a huge
+tree can therefore start at once, and memory does not grow with the number
+of files. Options:
+
+- ``recursive`` descends into subfolders, depth first (not into symlinked ones).
+- ``include`` and ``exclude`` are glob lists, matched against the path
+  relative to the root (``*`` also matches ``/``). An excluded folder is not
+  entered at all.
+- The ``.pdf`` extension is matched in any case.
+- With ``archives``, PDFs inside ``.zip`` files are yielded as
+  ``<zip path>!/<member>`` and are read straight from the archive.
+
+``input_signature``, ``input_hash`` and ``local_copy`` accept both kinds of
+path, so the batch manifest and the rasterize stage can treat zip members
+like ordinary files.
+
+``Shard`` splits the inputs between nodes that share the folder
+(``--shard i/N``). Ownership follows the content hash, so every node
+agrees on who owns a file, whatever order it was found in or name it has.
+The hashes are remembered in the shard's batch manifest by size and mtime,
+so a rerun only reads the files that are new or changed.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import time
+import zipfile
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from config import BATCH_RECURSIVE, BATCH_INCLUDE, BATCH_EXCLUDE, BATCH_READ_ZIPS
+
+logger = logging.getLogger(__name__)
+
+MEMBER_SEPARATOR = "!/"
+
+
+def _matches(path: str, patterns) -> bool:
+    return any(fnmatchcase(path, pattern) for pattern in patterns)
+
+
+def _wanted(relative: str, include, exclude) -> bool:
+    return (not include or _matches(relative, include)) and not _matches(relative, exclude)
+
+
+def iter_inputs(root, recursive: bool = BATCH_RECURSIVE, include=BATCH_INCLUDE, exclude=BATCH_EXCLUDE,
+                archives: bool = BATCH_READ_ZIPS):
+    """Yield the PDFs under ``root`` (file paths, or ``archive.zip!/member.pdf``) as they are found"""
+    root = str(root)
+    prefix = len(os.path.join(root, ""))
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError as e:
+            logger.warning("Cannot read folder %s: %s", folder, e)
+            continue
+        subfolders = []
+        with entries:
+            for entry in entries:
+                relative = entry.path[prefix:].replace(os.sep, "/")
+                name = entry.name.lower()
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not _matches(relative, exclude):
+                            subfolders.append(entry.path)
+                    elif name.endswith(".pdf"):
+                        if _wanted(relative, include, exclude):
+                            yield entry.path
+                    elif archives and name.endswith(".zip") and not _matches(relative, exclude):
+                        yield from _zip_members(entry.path, relative, include, exclude)
+                except OSError as e:
+                    logger.warning("Skipping %s: %s", entry.path, e)
+        # Visit subfolders in the order they were listed
+        stack.extend(reversed(subfolders))
+
+
+def _zip_members(path: str, relative: str, include, exclude):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = [info.filename for info in archive.infolist()
+                     if not info.is_dir() and info.filename.lower().endswith(".pdf")]
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning("Skipping unreadable archive %s: %s", path, e)
+        return
+    for member in names:
+        if _wanted(f"{relative}/{member}", include, exclude):
+            yield f"{path}{MEMBER_SEPARATOR}{member}"
+
+
+def split_member(path: str):
+    """(archive path, member name) for a zip member path, (path, None) otherwise"""
+    archive, separator, member = str(path).partition(MEMBER_SEPARATOR)
+    if separator and archive.lower().endswith(".zip"):
+        return archive, member
+    return str(path), None
+
+
+def resolve_input(path) -> str:
+    """Absolute form of an input path (the archive part of a zip member path is resolved)"""
+    archive, member = split_member(path)
+    resolved = str(Path(archive).resolve())
+    return resolved if member is None else f"{resolved}{MEMBER_SEPARATOR}{member}"
+
+
+def input_signature(path) -> tuple:
+    """(size, mtime) of a file, or of a zip member as recorded in its archive"""
+    archive, member = split_member(path)
+    if member is None:
+        stat = os.stat(archive)
+        return stat.st_size, stat.st_mtime
+    with zipfile.ZipFile(archive) as zf:
+        info = zf.getinfo(member)
+    return info.file_size, time.mktime(info.date_time + (0, 0, -1))
+
+
+def input_hash(path) -> str:
+    """SHA-256 of a file's or zip member's content"""
+    archive, member = split_member(path)
+    if member is None:
+        with open(archive, "rb") as f:
+            return _digest(f)
+    with zipfile.ZipFile(archive) as zf, zf.open(member) as f:
+        return _digest(f)
+
+
+def _digest(f) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_copy(path, directory) -> str:
+    """A path on disk with the input's content: the file itself, or the zip member extracted into ``directory``"""
+    archive, member = split_member(path)
+    if member is None:
+        return archive
+    target = Path(directory) / f"source-{Path(member).name}"
+    with zipfile.ZipFile(archive) as zf, zf.open(member) as source, open(target, "wb") as out:
+        shutil.copyfileobj(source, out, 1 << 20)
+    return str(target)
+
+
+class Shard:
+    """Shard ``index`` of ``count`` (1-based): owns the inputs whose content hash falls in its bucket"""
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}: need 1 <= i <= N")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec: str):
+        """``"3/8"`` -> Shard(3, 8)"""
+        index, separator, count = spec.partition("/")
+        if not separator:
+            raise ValueError(f"Invalid shard {spec!r}: expected i/N")
+        return cls(int(index), int(count))
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @property
+    def label(self) -> str:
+        """For file names, e.g. "shard-03-of-08" """
+        width = len(str(self.count))
+        return f"shard-{self.index:0{width}d}-of-{self.count:0{width}d}"
+
+    def owns(self, content_hash: str) -> bool:
+        return int(content_hash[:16], 16) % self.count == self.index - 1
+
+    def select(self, paths, hashes=None, chunk_size: int = 500):
+        """Yield (path, content_hash) for the inputs this shard owns.
+
+        Every input has to be hashed to find its owner. ``hashes`` (a
+        BatchManifest, or anything with its ``known_hashes``/``record_hashes``)
+        remembers them by size and mtime, so only new or changed files are
+        read; without it every input is read on every run.
+        """
+        chunk = []
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) >= chunk_size:
+                yield from self._select_chunk(chunk, hashes)
+                chunk = []
+        if chunk:
+            yield from self._select_chunk(chunk, hashes)
+
+    def _select_chunk(self, paths: list, hashes) -> list:
+        keys = [resolve_input(path) for path in paths]
+        known = hashes.known_hashes(keys) if hashes is not None else {}
+        owned, computed = [], []
+        for path, key in zip(paths, keys):
+            try:
+                size, mtime = input_signature(key)
+                cached = known.get(key)
+                if cached is not None and (cached[0], cached[1]) == (size, mtime):
+                    content_hash = cached[2]
+                else:
+                    content_hash = input_hash(key)
+                    computed.append((key, size, mtime, content_hash))
+            except (OSError, KeyError, zipfile.BadZipFile) as e:
+                logger.warning("Skipping %s: %s", path, e)
+                continue
+            if self.owns(content_hash):
+                owned.append((path, content_hash))
+        if hashes is not None:
+            hashes.record_hashes(computed)
+        return owned
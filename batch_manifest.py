@@ -0,0 +1,226 @@
+# batch_manifest.py
+"""
+Persistent manifest of a folder batch, so an interrupted run can pick up
+where it stopped.
+
+Every input PDF (or PDF inside a zip, see batch_inputs.py) has one row:
+absolute path, size, mtime, content hash, the last pipeline stage it
+completed (rasterize, detect, ocr, extract) and a checkpoint of the stage
+outputs so far (the pickled ``DocumentWork``: OD route, OCR'd pages,
+OCRResult). ``iter_plan`` turns a stream of PDFs into the
+work still to do:
+
+- files marked done whose size and mtime are unchanged are skipped;
+- files stopped part way resume from their checkpoint, so the stages that
+  finished (in particular the billed Vision calls) are not run again;
+  rasterized pages live in a temporary directory and are re-rendered;
+- a file whose size or mtime changed is re-hashed; the same content keeps its
+  row, different content starts over.
+
+A sharded run (see batch_inputs.Shard) hashes every input to find its own.
+The hashes are remembered by path, size and mtime, including those of files
+other shards own (``known_hashes``/``record_hashes``), so a rerun only reads
+new or changed files.
+
+A file is only marked done after its result row has been written to the
+result store, so a crash between the two re-stores the checkpointed result
+rather than losing it. Failed files are retried on the next run, from their
+last completed stage.
+
+The manifest is a SQLite file opened per call, so worker processes can write
+their checkpoints to it directly.
+"""
+import logging
+import pickle
+import sqlite3
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from batch_inputs import resolve_input, input_signature, input_hash
+from batch_work import DocumentWork, STAGES
+from config import BATCH_MANIFEST_ENABLED, BATCH_MANIFEST_PATH
+
+logger = logging.getLogger(__name__)
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    stage TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    checkpoint BLOB,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL
+);
+"""
+
+
+class BatchManifest:
+    """SQLite manifest of batch inputs and how far each one got"""
+
+    def __init__(self, path=BATCH_MANIFEST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @classmethod
+    def from_config(cls, shard=None):
+        """Manifest at BATCH_MANIFEST_PATH (one per shard), or None when BATCH_MANIFEST_ENABLED is off"""
+        if not BATCH_MANIFEST_ENABLED:
+            return None
+        path = Path(BATCH_MANIFEST_PATH)
+        if shard is not None:
+            path = path.with_name(f"{path.stem}.{shard.label}{path.suffix}")
+        return cls(path)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def plan(self, pdf_files, force: bool = False):
+        """(work to do as a list of DocumentWork items, number of files skipped as already done)"""
+        counts = {}
+        works = list(self.iter_plan(pdf_files, force, counts))
+        return works, counts["already_done"]
+
+    def iter_plan(self, pdf_files, force: bool = False, counts: dict = None, chunk_size: int = 500):
+        """Yield the DocumentWork items still to do for ``pdf_files`` (any iterable, read lazily in chunks).
+
+        Items are paths, or (path, content hash) pairs when the hash is already
+        known (see batch_inputs.Shard.select). With ``force`` the rows of these files are dropped first, so every file
+        is processed from scratch. ``counts`` (a dict) receives the running
+        "already_done" and "resumed" totals.
+        """
+        counts = counts if counts is not None else {}
+        counts.update(already_done=0, resumed=0)
+        chunk = []
+        for item in pdf_files:
+            path, known_hash = item if isinstance(item, tuple) else (item, "")
+            chunk.append((resolve_input(path), known_hash))
+            if len(chunk) >= chunk_size:
+                yield from self._plan_chunk(chunk, force, counts)
+                chunk = []
+        if chunk:
+            yield from self._plan_chunk(chunk, force, counts)
+        logger.info("Batch manifest: %d already done, %d resumed", counts["already_done"], counts["resumed"],
+                    extra={"manifest": str(self.path)})
+
+    def _plan_chunk(self, chunk: list, force: bool, counts: dict) -> list:
+        keys = [key for key, _ in chunk]
+        conn = self._connect()
+        try:
+            with conn:
+                if force:
+                    conn.executemany("DELETE FROM files WHERE path = ?", [(key,) for key in keys])
+                rows = {row[0]: row[1:] for row in conn.execute(
+                    f"SELECT path, size, mtime, content_hash, stage, status FROM files "
+                    f"WHERE path IN ({', '.join('?' * len(keys))})", keys)}
+
+                works, now = [], time.time()
+                for key, content_hash in chunk:
+                    try:
+                        size, mtime = input_signature(key)
+                    except (OSError, KeyError) as e:
+                        logger.warning("Skipping %s: %s", key, e)
+                        continue
+                    row = rows.get(key)
+                    if row is not None and (row[0], row[1]) != (size, mtime):
+                        content_hash = content_hash or input_hash(key)
+                        if content_hash != row[2]:
+                            row = None  # new content under the old name: start over
+                        conn.execute("UPDATE files SET size = ?, mtime = ?, updated_at = ? WHERE path = ?",
+                                     (size, mtime, now, key))
+                    if row is None:
+                        conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, content_hash, status, updated_at) "
+                                     "VALUES (?, ?, ?, ?, ?, ?)", (key, size, mtime, content_hash, PENDING, now))
+                        works.append(DocumentWork(key, content_hash=content_hash))
+                    elif row[4] == DONE:
+                        counts["already_done"] += 1
+                    elif row[3] is not None:
+                        checkpoint = conn.execute("SELECT checkpoint FROM files WHERE path = ?", (key,)).fetchone()[0]
+                        works.append(pickle.loads(checkpoint))
+                        counts["resumed"] += 1
+                    else:
+                        works.append(DocumentWork(key, content_hash=row[2]))
+        finally:
+            conn.close()
+        return works
+
+    def known_hashes(self, paths: list) -> dict:
+        """{path: (size, mtime, content hash)} recorded for ``paths`` (resolved), whichever shard owns them"""
+        conn = self._connect()
+        try:
+            return {row[0]: row[1:] for row in conn.execute(
+                f"SELECT path, size, mtime, content_hash FROM hashes WHERE path IN ({', '.join('?' * len(paths))})",
+                paths)}
+        finally:
+            conn.close()
+
+    def record_hashes(self, rows: list):
+        """Remember (path, size, mtime, content hash) rows, so an unchanged file is not read again to hash it"""
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO hashes (path, size, mtime, content_hash) VALUES (?, ?, ?, ?)",
+                                 rows)
+        finally:
+            conn.close()
+
+    def checkpoint(self, stage: str, work: DocumentWork):
+        """Record that ``work`` completed ``stage``, with its outputs so far (no-op if it had already)"""
+        if work.stage is not None and STAGES.index(stage) <= STAGES.index(work.stage):
+            return
+        work.stage = stage
+        blob = pickle.dumps(replace(work, pages_dir=None, error=None), protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE files SET stage = ?, content_hash = ?, checkpoint = ?, updated_at = ? "
+                             "WHERE path = ?", (stage, work.content_hash, blob, time.time(), work.path))
+        finally:
+            conn.close()
+
+    def mark_failed(self, path: str, error: str):
+        self._set_status([(FAILED, error, time.time(), path)])
+
+    def mark_done(self, paths):
+        """Mark files done (once their rows are in the result store); their checkpoints are dropped"""
+        now = time.time()
+        self._set_status([(DONE, None, now, path) for path in paths], drop_checkpoint=True)
+
+    def _set_status(self, params: list, drop_checkpoint: bool = False):
+        if not params:
+            return
+        checkpoint = ", checkpoint = NULL" if drop_checkpoint else ""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(f"UPDATE files SET status = ?, error = ?, updated_at = ?{checkpoint} WHERE path = ?",
+                                 params)
+        finally:
+            conn.close()
+
+    def counts(self) -> dict:
+        """Number of files per status"""
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+        finally:
+            conn.close()
@@ -1,21 +1,59 @@
+import argparse
+import itertools
+import logging
+import multiprocessing
 import os
+import signal
+import sys
+import threading
 import time
 from pathlib import Path
-from pdf2image import convert_from_path
 from ocr_preprocessor import OCRProcessor
-from models import ExcelRow
-import pandas as pd
+from page_dedupe import PageHashIndex
+from ocr_archive import OCRArchive
+from routing_policy import RoutingPolicy, RoutingReport
+from result_store import ResultStore
+from result_sink import ResultSink
+from result_export import get_format
+from log_setup import configure_logging
+import batch_workers
+from batch_work import DocumentWork
+from batch_workers import init_worker, process_file, process_pdf
+from batch_manifest import BatchManifest
+from batch_inputs import iter_inputs, resolve_input, Shard
+from result_segments import ResultSegment
+from pipeline_engine import Pipeline, Stage, parse_stages, PROCESS
+from folder_watcher import FolderWatcher
+from work_queue import WorkQueue, default_owner
+from config import (BATCH_WORKERS, BATCH_CHUNK_SIZE, BATCH_FILE_TIMEOUT, BATCH_START_METHOD, BATCH_ENGINE, PIPELINE_STAGES,
+                    PIPELINE_QUEUE_SIZE, WATCH_EXPORT_SECONDS, BATCH_RECURSIVE, BATCH_INCLUDE, BATCH_EXCLUDE,
+                    BATCH_READ_ZIPS, WORK_QUEUE_DIR, WORK_QUEUE_POLL_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Finished files are marked done in the manifest in groups of this many, after their rows are stored
+MARK_DONE_EVERY = 500
 
 
 class BatchProcessor:
-    def __init__(self, input_folder, output_excel=None):
+    def __init__(self, input_folder, output_excel=None, workers: int = BATCH_WORKERS, chunk_size: int = BATCH_CHUNK_SIZE,
+                 file_timeout: float = BATCH_FILE_TIMEOUT, engine: str = BATCH_ENGINE, stages: str = PIPELINE_STAGES,
+                 force: bool = False, recursive: bool = BATCH_RECURSIVE, include=None, exclude=None,
+                 archives: bool = BATCH_READ_ZIPS, shard=None):
         self.input_folder = Path(input_folder)
+        # This node's share of the inputs when several nodes split a folder ("i/N" or a Shard; None = all)
+        self.shard = Shard.parse(shard) if isinstance(shard, str) else shard
+        # Which inputs to take: subfolders, include/exclude globs (relative paths), PDFs inside .zip files
+        self.recursive = recursive
+        self.include = BATCH_INCLUDE if include is None else include
+        self.exclude = BATCH_EXCLUDE if exclude is None else exclude
+        self.archives = archives
         self.ocr_processor = OCRProcessor()
         
-        # Use default output path if not specified
+        # Use default output path if not specified (the export format follows the extension)
         if output_excel is None:
-            from config import INFERENCE_OUTPUT_DIR
-            self.output_excel = Path(INFERENCE_OUTPUT_DIR) / "target_results.xlsx"
+            from config import RESULTS_EXCEL_PATH
+            self.output_excel = Path(RESULTS_EXCEL_PATH).with_suffix(get_format().extension)
         else:
             self.output_excel = Path(output_excel)
         
@@ -27,278 +65,411 @@ class BatchProcessor:
         self.pdf_max_pages = None
         self.poppler_path = None
         
+        # Worker processes (0 = one per CPU; 1 = everything in this process), PDFs handed to a worker
+        # per round trip, and the time limit per PDF in seconds (0 = none)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self.file_timeout = file_timeout
+        # "pool" or "pipeline"; the pipeline's stage kinds and sizes, and its metrics after a run
+        if engine not in ("pool", "pipeline"):
+            raise ValueError(f"Unknown batch engine: {engine}")
+        self.engine = engine
+        self.stages = parse_stages(stages)
+        self.pipeline_metrics = None
+        
+        # Per-file progress for resuming an interrupted batch (None when disabled); force reprocesses every file
+        self.manifest = None
+        self.force = force
+        
+        # Per-batch index of page hashes for near-duplicate reuse (None when disabled)
+        self.page_index = None
+        self.routing_policy = None
+        # Raw OCR output kept for reextract.py (None when disabled)
+        self.archive = None
+        # Per-document result rows; output_excel is exported from it at the end of the batch.
+        # A shard appends to its own segment instead, merged later by result_segments.py
+        if self.shard is not None:
+            self.result_store = ResultSegment.for_shard(self.shard)
+        else:
+            self.result_store = ResultStore.from_config()
+        self.result_sink = None
+        
     def get_pdf_files(self):
-        """Get all PDF files from the input folder"""
-        pdf_pattern = self.input_folder / "*.pdf"
-        pdf_files = list(pdf_pattern.glob("*"))
-        return sorted(pdf_files)
+        """PDF files (and PDFs inside zips) under the input folder, yielded as the folder is walked"""
+        return iter_inputs(self.input_folder, recursive=self.recursive, include=self.include, exclude=self.exclude,
+                           archives=self.archives)
+    
+    def process_single_pdf(self, pdf_path):
+        """Process a single PDF file in this process: rasterize, OD on the first page, OCR"""
+        return process_pdf(pdf_path, self.ocr_processor, self.page_index, self.routing_policy, self.archive,
+                           dpi=self.pdf_dpi, max_pages=self.pdf_max_pages, poppler_path=self.poppler_path)
+    
+    def _settings(self):
+        return self.pdf_dpi, self.pdf_max_pages, self.poppler_path, self.file_timeout
     
-    def convert_pdf_to_images(self, pdf_path):
-        """Convert PDF to images"""
+    def _process_here(self, works):
+        """Outcomes (path, content_hash, result, error) of processing the files one by one in this process"""
+        batch_workers.use_state(*self._settings(), ocr_processor=self.ocr_processor, routing_policy=self.routing_policy,
+                                page_index=self.page_index, archive=self.archive, manifest=self.manifest)
+        for work in works:
+            yield process_file(work)
+    
+    def _process_in_pool(self, works, processes: int):
+        """Outcomes of processing the files on a pool of worker processes, in completion order"""
+        context = multiprocessing.get_context(BATCH_START_METHOD)
+        manifest_path = str(self.manifest.path) if self.manifest is not None else None
+        pool = context.Pool(
+            processes=processes,
+            initializer=init_worker,
+            initargs=(*self._settings(), True, manifest_path),
+        )
         try:
-            pages = convert_from_path(
-                str(pdf_path),
-                dpi=self.pdf_dpi,
-                poppler_path=self.poppler_path
-            )
-            
-            if self.pdf_max_pages is not None:
-                pages = pages[:self.pdf_max_pages]
-                
-            # Save pages to temporary directory
-            temp_dir = Path("temp_pages") / pdf_path.stem
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            
-            image_paths = []
-            for i, page in enumerate(pages, start=1):
-                out_path = temp_dir / f"page_{i:03d}.png"
-                page.save(out_path, "PNG")
-                image_paths.append(str(out_path))
-                
-            return image_paths
-            
-        except Exception as e:
-            print(f"Error converting PDF {pdf_path}: {e}")
-            return []
+            yield from pool.imap_unordered(process_file, works, chunksize=self.chunk_size)
+            # close/join rather than terminate, so the workers flush their OCR archive buffers
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
     
-    def process_single_pdf(self, pdf_path):
-        """Process a single PDF file"""
-        print(f"Processing: {pdf_path.name}")
-        
-        # Convert PDF to images
-        image_paths = self.convert_pdf_to_images(pdf_path)
-        
-        if not image_paths:
-            print(f"Failed to convert PDF: {pdf_path.name}")
-            return None
-        
+    def _process_staged(self, works):
+        """Outcomes of running the files through the rasterize → detect → ocr → extract stages, in completion order.
+
+        Thread and async stages share this process's processor, policy, page
+        index and archive; process stages get their own per worker. The
+        per-file timeout is not applied here (it relies on SIGALRM in the
+        thread running the whole file).
+        """
+        settings = self._settings()
+        batch_workers.use_state(*settings, ocr_processor=self.ocr_processor, routing_policy=self.routing_policy,
+                                page_index=self.page_index, archive=self.archive)
+        stages = []
+        for name, fn in (("rasterize", batch_workers.rasterize_stage), ("detect", batch_workers.detect_stage),
+                         ("ocr", batch_workers.ocr_stage), ("extract", batch_workers.extract_stage)):
+            kind, workers = self.stages.get(name, ("thread", 1))
+            initargs = (*settings, False) if kind == PROCESS else ()
+            stages.append(Stage(name, fn, kind, workers, init_worker if kind == PROCESS else None, initargs))
+        pipeline = Pipeline(stages, on_stage=self.manifest.checkpoint if self.manifest is not None else None)
         try:
-            # Process with OCR - we need to get sticker and signature flags from somewhere
-            # For now, we'll use default values
-            sticker_flag = False  # This should come from OD model
-            signature_flag = False  # This should come from OD model
-            
-            results = self.ocr_processor.process_images(image_paths, pdf_path.name, sticker_flag, signature_flag)
-            
-            # Clean up temporary images
-            for img_path in image_paths:
-                try:
-                    os.remove(img_path)
-                except:
-                    pass
-            
-            # Try to remove temp directory
-            try:
-                temp_dir = Path("temp_pages") / pdf_path.stem
-                if temp_dir.exists():
-                    temp_dir.rmdir()
-            except:
-                pass
-                
-            return results
-            
-        except Exception as e:
-            print(f"Error processing PDF {pdf_path.name}: {e}")
-            return None
+            for work in pipeline.run(works):
+                batch_workers.remove_pages(work)
+                yield work.path, work.content_hash, work.result if work.error is None else None, work.error
+        finally:
+            self.pipeline_metrics = pipeline.metrics()
     
-    def save_batch_results_to_excel(self, all_results):
-        """Save all batch results to Excel"""
-        if not all_results:
-            print("No results to save")
-            return
-        
-        # Convert results to ExcelRow objects
-        excel_rows = []
-        for result in all_results:
-            if result is None:
-                continue
-            
-            try:
-                if hasattr(result, 'master_fields'):  # OCRResult object
-                    excel_row = ExcelRow.from_ocr_result(result, result.sticker_flag if hasattr(result, 'sticker_flag') else False)
-                else:  # Failed result dict
-                    excel_row = ExcelRow.from_failed_processing(
-                        result.get('filename', 'Unknown'),
-                        result.get('error_message', 'Unknown error'))
-                excel_rows.append(excel_row)
-            except Exception as e:
-                print(f"Error creating ExcelRow for result: {e}")
-                # Create a failed row
-                excel_row = ExcelRow.from_failed_processing(
-                    result.get('filename', 'Unknown') if isinstance(result, dict) else 'Unknown',
-                    str(e)
-                )
-                excel_rows.append(excel_row)
+    def _outcomes(self, works, size_hint: int = None):
+        """Outcomes for ``works`` (any iterable) from the configured engine; ``size_hint`` caps the pool size"""
+        if self.engine == "pipeline":
+            return self._process_staged(works)
+        processes = self.workers if size_hint is None else min(self.workers, size_hint)
+        if processes > 1:
+            return self._process_in_pool(works, processes)
+        return self._process_here(works)
+    
+    def _open_run(self):
+        self.page_index = PageHashIndex.from_config()
+        self.archive = OCRArchive.from_config()
+        self.routing_policy = RoutingPolicy.from_config()
+        self.result_sink = ResultSink(self.result_store)
+        self.manifest = BatchManifest.from_config(self.shard)
+        if self.shard is not None and self.page_index is not None:
+            self.page_index.path = None  # several nodes would overwrite each other's saved index
+    
+    def _plan(self, inputs, counts: dict):
+        """DocumentWork still to do for ``inputs``: this shard's share of them, less what the manifest has done"""
+        items = self.shard.select(inputs, self.manifest) if self.shard is not None else ((path, "") for path in inputs)
+        if self.manifest is not None:
+            return self.manifest.iter_plan(items, force=self.force, counts=counts)
+        return (DocumentWork(resolve_input(path), content_hash=content_hash) for path, content_hash in items)
+    
+    def _export(self):
+        if self.shard is not None:
+            return  # the segment is the shard's output; see result_segments.py merge
+        self.result_store.export(self.output_excel)
+    
+    def _store_outcome(self, path, content_hash, result, error):
+        """Queue the row for one outcome (the OCRResult or a failed-processing dict) and return it"""
+        if result is None:
+            result = {'filename': Path(path).name, 'error_message': error or 'Processing failed - no result returned'}
+            if self.manifest is not None:
+                self.manifest.mark_failed(path, result['error_message'])
+        # One row per document as it finishes, instead of rewriting the workbook
+        self.result_sink.put(result, content_hash)
+        return result
+    
+    def _mark_done(self, finished: list):
+        """Mark files done in the manifest once their rows are stored; until then a rerun re-stores them"""
+        if self.manifest is not None and finished:
+            self.result_sink.flush()
+            self.manifest.mark_done(finished)
+        finished.clear()
+    
+    def _close_run(self, finished):
+        # Drain the queued rows, then export the workbook once, from the store
+        self._mark_done(finished)
+        self.result_sink.close()
+        self._export()
         
-        try:
-            # Convert rows to dicts - ensure boolean values are strings
-            row_dicts = []
-            for row in excel_rows:
-                row_dict = row.model_dump()
-                
-                # Convert boolean values to strings to avoid Excel TRUE/FALSE
-                for key, value in row_dict.items():
-                    if isinstance(value, bool):
-                        if key == 'has_sticker':
-                            # has_sticker should reflect the OD model result
-                            row_dict[key] = "Yes" if value else "No"
-                        elif key == 'has_signature':
-                            # has_signature should reflect the OCR result
-                            row_dict[key] = "Yes" if value else "No"
-                        elif key == 'has_frito_lay':
-                            # has_frito_lay should reflect the OCR result
-                            row_dict[key] = "Yes" if value else "No"
-                        else:
-                            # For other boolean fields, convert as usual
-                            row_dict[key] = "Yes" if value else "No"
-                
-                row_dicts.append(row_dict)
-            
-            # Check if output file already exists and append to it
-            if self.output_excel.exists():
-                try:
-                    # Read existing data
-                    existing_df = pd.read_excel(self.output_excel)
-                    print(f"Existing file found with {len(existing_df)} rows")
-                    
-                    # Append new data
-                    new_df = pd.DataFrame(row_dicts)
-                    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                    
-                    # Remove duplicates based on filename to avoid processing the same file multiple times
-                    combined_df = combined_df.drop_duplicates(subset=['filename'], keep='last')
-                    
-                    # Save combined data
-                    combined_df.to_excel(self.output_excel, index=False)
-                    print(f"Appended {len(new_df)} new rows to existing file. Total rows: {len(combined_df)}")
-                except Exception as e:
-                    print(f"Error reading existing file, creating new one: {e}")
-                    df = pd.DataFrame(row_dicts)
-                    df.to_excel(self.output_excel, index=False)
-            else:
-                # Create new file
-                df = pd.DataFrame(row_dicts)
-                df.to_excel(self.output_excel, index=False)
-                print(f"Created new file with {len(df)} rows")
-            
-            print(f"Batch results saved to: {self.output_excel}")
-            print(f"Processed {len(excel_rows)} files successfully")
-            
-        except Exception as e:
-            print(f"Error saving batch results to Excel: {e}")
-            # Try to save raw data as fallback
-            try:
-                raw_data = []
-                for row in excel_rows:
-                    row_dict = row.model_dump()
-                    raw_data.append(row_dict)
-                
-                # Use the same append logic for fallback
-                if self.output_excel.exists():
-                    try:
-                        existing_df = pd.read_excel(self.output_excel)
-                        new_df = pd.DataFrame(raw_data)
-                        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                        combined_df = combined_df.drop_duplicates(subset=['filename'], keep='last')
-                        combined_df.to_excel(self.output_excel, index=False)
-                        print(f"Saved raw data to existing file {self.output_excel}")
-                    except Exception as e2:
-                        df = pd.DataFrame(raw_data)
-                        df.to_excel(self.output_excel, index=False)
-                        print(f"Saved raw data to new file {self.output_excel}")
-                else:
-                    df = pd.DataFrame(raw_data)
-                    df.to_excel(self.output_excel, index=False)
-                    print(f"Saved raw data to new file {self.output_excel}")
-            except Exception as e2:
-                print(f"Failed to save even raw data: {e2}")
+        if self.page_index is not None:
+            self.page_index.save()
+        if self.archive is not None:
+            self.archive.close()
     
     def process_batch(self):
         """Process all PDFs in the input folder"""
-        pdf_files = self.get_pdf_files()
+        inputs = iter(self.get_pdf_files())
+        first = next(inputs, None)
         
-        if not pdf_files:
-            print(f"No PDF files found in: {self.input_folder}")
+        if first is None:
+            logger.warning("No PDF files found in: %s", self.input_folder)
             return
         
-        print(f"Found {len(pdf_files)} PDF files to process")
-        print(f"Input folder: {self.input_folder}")
-        print(f"Output Excel: {self.output_excel}")
-        print("-" * 50)
+        logger.info("Processing PDF files", extra={"input_folder": str(self.input_folder), "shard": str(self.shard),
+                                                   "output_excel": str(self.output_excel)})
         
         start_time = time.time()
-        all_results = []
+        self._open_run()
+        report = RoutingReport()
         successful = 0
         failed = 0
         
-        for i, pdf_path in enumerate(pdf_files, 1):
-            print(f"[{i}/{len(pdf_files)}] Processing: {pdf_path.name}")
-            
-            try:
-                result = self.process_single_pdf(pdf_path)
-                if result:
-                    # Add filename to result if it's an OCRResult object
-                    if hasattr(result, 'filename') and not result.filename:
-                        result.filename = pdf_path.name
-                    all_results.append(result)
-                    successful += 1
-                    print(f"✓ Successfully processed: {pdf_path.name}")
-                else:
-                    # Create a failed result entry
-                    failed_result = {
-                        'filename': pdf_path.name,
-                        'error_message': 'Processing failed - no result returned'
-                    }
-                    all_results.append(failed_result)
-                    failed += 1
-                    print(f"✗ Failed to process: {pdf_path.name}")
-                    
-            except Exception as e:
-                print(f"✗ Error processing {pdf_path.name}: {e}")
-                # Create a failed result entry
-                failed_result = {
-                    'filename': pdf_path.name,
-                    'error_message': str(e)
-                }
-                all_results.append(failed_result)
+        # Skip files finished by an earlier run and resume interrupted ones from their last completed stage;
+        # inputs are enumerated and planned lazily, so the first files start while the tree is still being walked
+        counts = {"already_done": 0}
+        works = self._plan(itertools.chain([first], inputs), counts)
+        # Enough work to size the pool: no more worker processes than files in a small batch
+        head = list(itertools.islice(works, self.workers))
+        finished = []
+        
+        # Workers only process; every row goes through this process's single result writer
+        for i, (path, content_hash, result, error) in enumerate(self._outcomes(itertools.chain(head, works), len(head)), 1):
+            name = Path(path).name
+            self._store_outcome(path, content_hash, result, error)
+            if result is not None:
+                successful += 1
+                # Cost/latency report over the documents that produced an OCRResult
+                report.add(result)
+                finished.append(path)
+                logger.info("Successfully processed %d", i, extra={"document": name})
+            else:
                 failed += 1
+                logger.error("Failed to process %d", i, extra={"document": name, "error": error})
+            if len(finished) >= MARK_DONE_EVERY:
+                self._mark_done(finished)
         
-        # Save results to Excel
-        self.save_batch_results_to_excel(all_results)
+        self._close_run(finished)
+        already_done = counts["already_done"]
+        total_files = successful + failed + already_done
+        
+        # Counted from the results, since pages may have been processed in other processes
+        pages_skipped = report.pages_skipped_blank
+        pages_reused = report.pages_reused
         
         # Print summary
         end_time = time.time()
         processing_time = end_time - start_time
         
-        print("-" * 50)
-        print(f"Batch processing completed!")
-        print(f"Total files: {len(pdf_files)}")
-        print(f"Successful: {successful}")
-        print(f"Failed: {failed}")
-        print(f"Processing time: {processing_time:.2f} seconds")
-        print(f"Results saved to: {self.output_excel}")
+        logger.info("Batch processing completed", extra={
+            "total_files": total_files,
+            "successful": successful,
+            "failed": failed,
+            "already_done": already_done,
+            "processing_time": round(processing_time, 2),
+            "workers": max(1, min(self.workers, len(head))),
+            "engine": self.engine,
+            "shard": str(self.shard) if self.shard is not None else None,
+            "pipeline": self.pipeline_metrics,
+            "ocr_calls_avoided_blank": pages_skipped,
+            "pages_reused": pages_reused,
+            "report": report.summary(),
+            "output_file": str(self.output_excel),
+        })
         
         return {
-            'total_files': len(pdf_files),
+            'total_files': total_files,
             'successful': successful,
             'failed': failed,
+            'already_done': already_done,
+            'ocr_calls_avoided': pages_skipped,
+            'pages_reused': pages_reused,
+            'report': report.summary(),
             'processing_time': processing_time,
-            'output_file': str(self.output_excel)
+            'pipeline': self.pipeline_metrics,
+            'output_file': str(self.result_store.path if self.shard is not None else self.output_excel)
         }
-
-
-if __name__ == "__main__":
-    import sys
     
-    if len(sys.argv) < 2:
-        print("Usage: python batch_processor.py <input_folder> [output_excel]")
-        sys.exit(1)
+    def _arrivals(self, watcher, stop):
+        """DocumentWork for every PDF the watcher reports that still needs processing"""
+        for path in watcher.changes(stop):
+            for work in self._plan([path], {}):
+                logger.info("New file queued", extra={"document": work.filename})
+                yield work
+    
+    def _export_periodically(self, stop, interval):
+        while not stop.wait(interval):
+            if self._unexported:
+                self._unexported = False
+                self._export()
+    
+    def _serve(self, works, stop, export_interval, on_outcome):
+        """Store the outcome of each of ``works`` as soon as it finishes, until ``works`` runs out.
+        
+        ``on_outcome(path, content_hash, result, error)`` is called once the row
+        is stored. output_excel is re-exported at most every ``export_interval``
+        seconds, and once more on the way out. Returns (processed, failed).
+        """
+        self._unexported = False
+        exporter = threading.Thread(target=self._export_periodically, args=(stop, export_interval),
+                                    name="serve-export", daemon=True)
+        exporter.start()
+        processed = failed = 0
+        for path, content_hash, result, error in self._outcomes(works):
+            self._store_outcome(path, content_hash, result, error)
+            # Store the row right away so the file's result is visible before it counts as finished
+            self.result_sink.flush()
+            on_outcome(path, content_hash, result, error)
+            if result is not None:
+                processed += 1
+                logger.info("Processed", extra={"document": Path(path).name})
+            else:
+                failed += 1
+                logger.error("Failed to process", extra={"document": Path(path).name, "error": error})
+            self._unexported = True
+        
+        stop.set()
+        exporter.join()
+        self._close_run([])
+        return processed, failed
     
-    input_folder = sys.argv[1]
-    output_excel = sys.argv[2] if len(sys.argv) > 2 else None
+    def watch(self, stop: threading.Event = None, export_interval: float = WATCH_EXPORT_SECONDS):
+        """Process PDFs as they arrive in the input folder until ``stop`` is set.
+        
+        The engine (pool or pipeline) is started once, so worker processes keep
+        the model and OCR clients loaded between arrivals. Each result is in the
+        store as soon as its file is done; output_excel is re-exported at most
+        every ``export_interval`` seconds, and once more on the way out.
+        """
+        stop = stop or threading.Event()
+        watcher = FolderWatcher(self.input_folder)
+        self._open_run()
+        logger.info("Watching for PDFs", extra={"input_folder": str(self.input_folder), "mode": watcher.mode,
+                                                "engine": self.engine, "output_excel": str(self.output_excel)})
+        
+        def mark_done(path, content_hash, result, error):
+            if result is not None and self.manifest is not None:
+                self.manifest.mark_done([path])
+        
+        processed, failed = self._serve(self._arrivals(watcher, stop), stop, export_interval, mark_done)
+        logger.info("Stopped watching", extra={"processed": processed, "failed": failed, "pipeline": self.pipeline_metrics})
+        return {'processed': processed, 'failed': failed, 'output_file': str(self.output_excel)}
     
-    processor = BatchProcessor(input_folder, output_excel)
-    results = processor.process_batch()
+    def _prefetch(self) -> int:
+        """Files to hold leases on at once: as many as the engine can have in progress"""
+        if self.engine == "pipeline":
+            return sum(workers for _, workers in self.stages.values()) + PIPELINE_QUEUE_SIZE
+        return self.workers * self.chunk_size
+    
+    def _claims(self, queue, owner, stop, leases, slots):
+        """DocumentWork for tasks claimed from ``queue``, with at most ``slots`` in progress, until ``stop`` is set"""
+        while not stop.is_set():
+            if not slots.acquire(timeout=1.0):
+                continue
+            tasks = queue.claim(owner)
+            if not tasks:
+                slots.release()
+                stop.wait(WORK_QUEUE_POLL_SECONDS)
+                continue
+            task = tasks[0]
+            work = DocumentWork(resolve_input(task.path), name=task.filename)
+            leases.setdefault(work.path, []).append(task)
+            logger.info("Task claimed", extra={"document": task.filename, "task_id": task.id, "attempt": task.attempts})
+            yield work
+    
+    def _heartbeat(self, queue, stop, leases):
+        while not stop.wait(queue.lease_seconds / 3):
+            tasks = [task for held in list(leases.values()) for task in held]
+            for task in queue.heartbeat(tasks):
+                logger.warning("Lease lost; another worker will process the file",
+                               extra={"document": task.filename, "task_id": task.id})
+    
+    def consume(self, queue, stop: threading.Event = None, export_interval: float = WATCH_EXPORT_SECONDS,
+                owner: str = None):
+        """Process files claimed from the shared work queue until ``stop`` is set.
+        
+        Like watch, but the files come from ``queue`` (work_queue.WorkQueue),
+        which several hosts can consume at once. Leases are renewed while the
+        files are in progress. Each file is completed with its result, or
+        failed back to the queue for a retry, once its row is stored.
+        """
+        stop = stop or threading.Event()
+        owner = owner or default_owner()
+        self._open_run()
+        # Retries may run on another host, so there is no local checkpoint to resume from
+        self.manifest = None
+        leases = {}  # resolved path -> tasks in progress
+        slots = threading.BoundedSemaphore(max(1, self._prefetch()))
+        heartbeat = threading.Thread(target=self._heartbeat, args=(queue, stop, leases),
+                                     name="queue-heartbeat", daemon=True)
+        heartbeat.start()
+        logger.info("Consuming work queue", extra={"queue": str(queue.root), "owner": owner, "engine": self.engine,
+                                                   "output_excel": str(self.output_excel)})
+        
+        def finish(path, content_hash, result, error):
+            held = leases[path]
+            task = held.pop(0)
+            if not held:
+                del leases[path]
+            slots.release()
+            if result is not None:
+                finished = queue.complete(task, result.model_dump(mode="json"), content_hash)
+            else:
+                finished = queue.fail(task, error)
+            if not finished:
+                logger.warning("Lease expired before the file finished; outcome dropped",
+                               extra={"document": task.filename, "task_id": task.id})
+        
+        processed, failed = self._serve(self._claims(queue, owner, stop, leases, slots), stop, export_interval, finish)
+        heartbeat.join()
+        logger.info("Stopped consuming", extra={"processed": processed, "failed": failed, "pipeline": self.pipeline_metrics})
+        return {'processed': processed, 'failed': failed, 'output_file': str(self.output_excel)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR every PDF in a folder and export the results")
+    parser.add_argument("input_folder", nargs="?", help="Folder of PDFs (not needed with --queue)")
+    parser.add_argument("output_file", nargs="?", help="Export path (.xlsx, .csv, .jsonl or .parquet)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE, help="PDFs sent to a worker at a time")
+    parser.add_argument("--timeout", type=float, default=BATCH_FILE_TIMEOUT, help="Seconds allowed per PDF (0 = no limit)")
+    parser.add_argument("--engine", choices=("pool", "pipeline"), default=BATCH_ENGINE,
+                        help="Whole PDFs per worker process, or overlapping rasterize/detect/ocr/extract stages")
+    parser.add_argument("--force", action="store_true", help="Reprocess every file, ignoring the batch manifest")
+    parser.add_argument("--recursive", action="store_true", default=BATCH_RECURSIVE, help="Include subfolders")
+    parser.add_argument("--include", action="append", help="Only inputs matching this glob (relative path; repeatable)")
+    parser.add_argument("--exclude", action="append", help="Skip inputs and folders matching this glob (repeatable)")
+    parser.add_argument("--no-zips", dest="archives", action="store_false", default=BATCH_READ_ZIPS,
+                        help="Ignore PDFs inside .zip archives")
+    parser.add_argument("--shard", help="Process only shard i of N (e.g. 2/4) of the inputs, by content hash; "
+                                        "merge the shards' results with result_segments.py merge")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process PDFs as they arrive")
+    parser.add_argument("--queue", nargs="?", const=WORK_QUEUE_DIR, metavar="DIR",
+                        help="Keep running and process files claimed from the shared work queue (default WORK_QUEUE_DIR)")
+    parser.add_argument("--stages", default=PIPELINE_STAGES, help='Pipeline stages, e.g. "ocr=thread:16,detect=process:2"')
+    args = parser.parse_args()
+    if args.input_folder is None and args.queue is None:
+        parser.error("input_folder is required unless --queue is given")
+    
+    configure_logging()
+    processor = BatchProcessor(args.input_folder or args.queue, args.output_file, workers=args.workers, chunk_size=args.chunk_size,
+                               file_timeout=args.timeout, engine=args.engine, stages=args.stages,
+                               force=args.force, recursive=args.recursive, include=args.include,
+                               exclude=args.exclude, archives=args.archives, shard=args.shard)
+    if args.watch or args.queue:
+        # SIGINT/SIGTERM stop taking new files; the ones in progress finish and the export is written
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        results = processor.consume(WorkQueue(args.queue), stop) if args.queue else processor.watch(stop)
+    else:
+        results = processor.process_batch()
     
     if results:
         print(f"\nBatch processing completed successfully!")
@@ -0,0 +1,38 @@
+# batch_work.py
+"""
+The unit of work of the staged batch engine, kept apart from the workers.
+
+``DocumentWork`` and the ``STAGES`` it goes through are all the batch manifest
+needs to plan and checkpoint a file, so they live here rather than in
+batch_workers.py, which imports the OD model and the OCR client.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+# Stage functions skip what a DocumentWork resumed from the batch manifest already has
+STAGES = ("rasterize", "detect", "ocr", "extract")
+
+
+@dataclass
+class DocumentWork:
+    """A PDF on its way through the staged pipeline"""
+    path: str
+    content_hash: str = ""
+    pages_dir: str = None
+    image_paths: list = None
+    route: "DocumentRoute" = None  # document_pipeline.DocumentRoute
+    pages: list = None  # OCRPage per image, once OCR'd
+    ocr_seconds: float = 0.0
+    result: object = None  # OCRResult
+    error: str = None
+    stage: str = None  # last stage completed, when checkpointed
+    name: str = None  # document name for the result, when not the file's own (e.g. an upload's original name)
+
+    @property
+    def filename(self) -> str:
+        return self.name or Path(self.path).name
+
+    @property
+    def needs_pages(self) -> bool:
+        """Whether a stage still to run reads the page images (not so for work resumed after OCR)"""
+        return self.result is None and (self.route is None or (self.route.decision.run_ocr and self.pages is None))
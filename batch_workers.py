@@ -0,0 +1,240 @@
+# batch_workers.py
+"""
+Worker processes for BatchProcessor.
+
+``init_worker`` runs once in every pool process: it sets up logging, creates
+the process's OCRProcessor (one Vision client), loads the OD model and opens
+the process's own page index and OCR archive. ``process_file`` then runs the
+full rasterize → OD → OCR pipeline for one PDF and returns the outcome to the
+parent, which hands every row to its single ResultSink.
+
+``process_pdf`` is the same pipeline for callers that bring their own
+processor (BatchProcessor's single-process mode).
+
+The ``*_stage`` functions are the same pipeline again, cut into the stages
+of pipeline_engine (rasterize → detect → ocr → extract) around a
+``DocumentWork`` item, for the staged batch engine.
+"""
+import logging
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import cached_property
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+from batch_inputs import input_hash, local_copy
+from batch_work import DocumentWork, STAGES  # noqa: F401 - DocumentWork also re-exported for older checkpoints
+from document_pipeline import (rasterize_pdf, process_document, route_document, complete_result, DocumentRoute,
+                               PDF_DPI, PDF_MAX_PAGES, POPPLER_PATH)
+from log_setup import configure_logging, correlation
+from ocr_archive import OCRArchive
+from page_dedupe import PageHashIndex
+from routing_policy import RoutingPolicy
+
+logger = logging.getLogger(__name__)
+
+# Per-process state set up by init_worker (or use_state in the parent process)
+_worker = None
+
+
+class _WorkerState:
+    """Settings plus the per-process processor, policy, page index and archive, created on first use"""
+
+    manifest = None  # BatchManifest that stage checkpoints go to, if any
+
+    def __init__(self, dpi, max_pages, poppler_path, file_timeout):
+        self.dpi = dpi
+        self.max_pages = max_pages
+        self.poppler_path = poppler_path
+        self.file_timeout = file_timeout
+
+    @cached_property
+    def ocr_processor(self):
+        from ocr_preprocessor import OCRProcessor
+        return OCRProcessor()
+
+    @cached_property
+    def routing_policy(self):
+        return RoutingPolicy.from_config()
+
+    @cached_property
+    def page_index(self):
+        # Each process reuses pages it has seen itself; the persisted index is read but only the parent writes it
+        page_index = PageHashIndex.from_config()
+        if page_index is not None:
+            page_index.path = None
+        return page_index
+
+    @cached_property
+    def archive(self):
+        archive = OCRArchive.from_config()
+        if archive is not None:
+            # Buffered pages go to a part file when the pool shuts the process down
+            Finalize(archive, archive.close, exitpriority=10)
+        return archive
+
+    def preload(self):
+        from yolox_od.inference import load_model
+        load_model()
+        for name in ("ocr_processor", "routing_policy", "page_index", "archive"):
+            getattr(self, name)
+
+
+def init_worker(dpi, max_pages, poppler_path, file_timeout, preload: bool = True, manifest_path: str = None):
+    """Pool initializer: by default load the detector and OCR client right away, once per process"""
+    global _worker
+    configure_logging()
+    _worker = _WorkerState(dpi, max_pages, poppler_path, file_timeout)
+    if manifest_path is not None:
+        from batch_manifest import BatchManifest
+        _worker.manifest = BatchManifest(manifest_path)
+    if preload:
+        _worker.preload()
+    logger.info("Batch worker ready")
+
+
+def use_state(dpi, max_pages, poppler_path, file_timeout, **components):
+    """Set up this process's state from objects the caller already has (thread stages run in the caller's process)"""
+    global _worker
+    _worker = _WorkerState(dpi, max_pages, poppler_path, file_timeout)
+    for name, value in components.items():
+        setattr(_worker, name, value)
+
+
+class FileTimeout(BaseException):
+    """A PDF ran past its time limit.
+
+    A BaseException so the per-page error handling in OCRProcessor does not
+    turn it into one failed page and carry on with the rest of the document.
+    """
+
+
+@contextmanager
+def file_deadline(seconds: float, filename: str):
+    """Raise FileTimeout in the block after ``seconds`` (main thread on POSIX only; otherwise no limit)"""
+    if not seconds or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise FileTimeout(f"Processing {filename} took longer than {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def process_pdf(pdf_path, ocr_processor, page_index=None, routing_policy=None, archive=None, dpi: int = PDF_DPI,
+                max_pages: int = PDF_MAX_PAGES, poppler_path: str = POPPLER_PATH):
+    """Rasterize one PDF into a temporary directory, run OD and OCR over it and return its OCRResult"""
+    pdf_path = Path(pdf_path)
+    with tempfile.TemporaryDirectory(prefix="pages-") as pages_dir:
+        image_paths = rasterize_pdf(pdf_path, pages_dir, dpi=dpi, max_pages=max_pages, poppler_path=poppler_path)
+        if not image_paths:
+            raise ValueError("PDF has no pages")
+        # OD on the first page gives the sticker/signature flags, then OCR every page
+        return process_document(image_paths, pdf_path.name, ocr_processor, page_index, routing_policy, archive)
+
+
+def process_file(work):
+    """Pool task: (path, content_hash, OCRResult or None, error message or None) for one PDF.
+
+    ``work`` is a path, or a DocumentWork resumed from the batch manifest, whose completed stages are not rerun.
+    """
+    if not isinstance(work, DocumentWork):
+        work = DocumentWork(str(work))
+    # One correlation id per document ties its OD/OCR events together
+    with correlation():
+        try:
+            with file_deadline(_worker.file_timeout, work.filename):
+                run_stages(work, _worker.manifest.checkpoint if _worker.manifest is not None else None)
+            return work.path, work.content_hash, work.result, None
+        except FileTimeout as e:
+            logger.error("%s", e, extra={"document": work.filename})
+            return work.path, work.content_hash, None, str(e)
+        except Exception as e:
+            logger.exception("Error processing: %s", e, extra={"document": work.filename})
+            return work.path, work.content_hash, None, str(e) or type(e).__name__
+
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def rasterize_stage(work: DocumentWork) -> DocumentWork:
+    if not work.content_hash:
+        work.content_hash = input_hash(work.path)
+    if not work.needs_pages:
+        return work
+    work.pages_dir = tempfile.mkdtemp(prefix="pages-")
+    # A PDF inside a zip is extracted next to its pages first
+    source = local_copy(work.path, work.pages_dir)
+    if Path(source).suffix.lower() in IMAGE_SUFFIXES:
+        work.image_paths = [source]  # an uploaded image (queued by the app) is its own single page
+        return work
+    work.image_paths = rasterize_pdf(source, work.pages_dir, dpi=_worker.dpi, max_pages=_worker.max_pages,
+                                     poppler_path=_worker.poppler_path)
+    if not work.image_paths:
+        raise ValueError("PDF has no pages")
+    return work
+
+
+def detect_stage(work: DocumentWork) -> DocumentWork:
+    if work.route is not None:
+        return work
+    with correlation():
+        work.route = route_document(work.image_paths, work.filename, _worker.page_index, _worker.routing_policy)
+    return work
+
+
+def ocr_stage(work: DocumentWork) -> DocumentWork:
+    if work.route.decision.run_ocr and work.pages is None and work.result is None:
+        start = time.perf_counter()
+        with correlation():
+            work.pages = _worker.ocr_processor.ocr_pages(work.image_paths, work.filename, _worker.page_index)
+        work.ocr_seconds += time.perf_counter() - start
+    return work
+
+
+def extract_stage(work: DocumentWork) -> DocumentWork:
+    if work.result is not None:
+        return work
+    start = time.perf_counter()
+    route = work.route
+    with correlation():
+        if route.decision.run_ocr:
+            result = _worker.ocr_processor.extract_pages(work.pages, work.filename, route.sticker_flag,
+                                                         route.signature_flag, archive=_worker.archive)
+        else:
+            logger.info("Routing policy skipped OCR: %s", route.decision.reason, extra={"document": work.filename})
+            result = _worker.ocr_processor.skipped_result(work.image_paths, work.filename, route.sticker_flag,
+                                                          route.signature_flag, route.decision.reason)
+    work.ocr_seconds += time.perf_counter() - start
+    work.result = complete_result(result, route, work.ocr_seconds)
+    work.pages = None
+    return work
+
+
+def remove_pages(work: DocumentWork):
+    if work.pages_dir:
+        shutil.rmtree(work.pages_dir, ignore_errors=True)
+        work.pages_dir = None
+
+
+def run_stages(work: DocumentWork, on_stage=None) -> DocumentWork:
+    """Run the stages one after another in this thread; ``on_stage(name, work)`` follows each one"""
+    try:
+        for name, fn in zip(STAGES, (rasterize_stage, detect_stage, ocr_stage, extract_stage)):
+            fn(work)
+            if on_stage is not None:
+                on_stage(name, work)
+    finally:
+        remove_pages(work)
+    return work
@@ -18,6 +18,118 @@ INFERENCE_OUTPUT_DIR = "inference_output"
 ANNOTATED_IMAGES_DIR = "annotated_images"
 TEMP_UPLOAD_DIR = "uploads"
 
+# Resolve "label -> nearest value" from Vision word boxes before falling back to regexes
+SPATIAL_EXTRACTION_ENABLED = os.environ.get("SPATIAL_EXTRACTION_ENABLED", "1") == "1"
+
+# Logging - JSON lines written by a background thread (see log_setup.py)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FILE = os.environ.get("LOG_FILE")  # stderr when unset
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.1"))  # share of per-page DEBUG events kept
+
+# Per-document result rows (SQLite); target_results.xlsx is exported from it on demand (see result_store.py)
+RESULT_STORE_PATH = os.environ.get("RESULT_STORE_PATH", os.path.join(INFERENCE_OUTPUT_DIR, "results.sqlite"))
+RESULTS_EXCEL_PATH = os.environ.get("RESULTS_EXCEL_PATH", os.path.join(INFERENCE_OUTPUT_DIR, "target_results.xlsx"))
+# Sharded batch runs append their rows here, one file per shard, for result_segments.py merge
+RESULT_SEGMENTS_DIR = os.environ.get("RESULT_SEGMENTS_DIR", os.path.join(INFERENCE_OUTPUT_DIR, "segments"))
+# Default export format: xlsx, csv, jsonl or parquet (see result_export.py)
+RESULT_EXPORT_FORMAT = os.environ.get("RESULT_EXPORT_FORMAT", "xlsx")
+# Result rows are written by one thread (see result_sink.py) in batches of this many rows, or after this many seconds
+RESULT_SINK_BATCH_ROWS = int(os.environ.get("RESULT_SINK_BATCH_ROWS", "50"))
+RESULT_SINK_FLUSH_SECONDS = float(os.environ.get("RESULT_SINK_FLUSH_SECONDS", "2.0"))
+
+# Upload jobs (see jobs.py): persisted here, run by this many background workers (plus workers reserved for
+# single-document jobs), at most this many waiting
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", os.path.join(INFERENCE_OUTPUT_DIR, "jobs.sqlite"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_INTERACTIVE_WORKERS = int(os.environ.get("JOB_INTERACTIVE_WORKERS", "1"))  # single-document jobs only
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "100"))
+# Files of an upload job processed at once, and Vision page requests in flight at once (see document_scheduler.py)
+BATCH_DOCUMENT_CONCURRENCY = int(os.environ.get("BATCH_DOCUMENT_CONCURRENCY", "4"))
+BATCH_PAGE_CONCURRENCY = int(os.environ.get("BATCH_PAGE_CONCURRENCY", "8"))
+# Scheduling of those documents and page requests (see document_scheduler.py): share of the workers per priority
+# class when both have work waiting, seconds of waiting that count as one page less when picking the shortest
+# document (0 = no aging), interactive uploads above this many pages are treated as bulk, and the bytes per page
+# a PDF's page count is guessed from
+SCHEDULER_WEIGHTS = {name: float(weight) for name, _, weight in
+                     (p.partition("=") for p in os.environ.get("SCHEDULER_WEIGHTS", "interactive=4,bulk=1").split(",") if p)}
+SCHEDULER_AGING_SECONDS = float(os.environ.get("SCHEDULER_AGING_SECONDS", "2.0"))
+SCHEDULER_INTERACTIVE_MAX_PAGES = int(os.environ.get("SCHEDULER_INTERACTIVE_MAX_PAGES", "10"))
+SCHEDULER_BYTES_PER_PAGE = int(os.environ.get("SCHEDULER_BYTES_PER_PAGE", "150000"))
+# batch_processor.py: worker processes (0 = one per CPU), PDFs per task hand-off, seconds per PDF (0 = no limit)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "0"))
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "1"))
+BATCH_FILE_TIMEOUT = float(os.environ.get("BATCH_FILE_TIMEOUT", "600"))
+# "spawn" keeps torch and the gRPC Vision client out of forked children
+BATCH_START_METHOD = os.environ.get("BATCH_START_METHOD", "spawn")
+# batch_processor.py inputs (see batch_inputs.py): descend into subfolders, globs over the path relative to the
+# input folder (comma-separated; no include globs = every PDF), and read PDFs inside .zip archives
+BATCH_RECURSIVE = os.environ.get("BATCH_RECURSIVE", "0") == "1"
+BATCH_INCLUDE = [g for g in os.environ.get("BATCH_INCLUDE", "").split(",") if g]
+BATCH_EXCLUDE = [g for g in os.environ.get("BATCH_EXCLUDE", "").split(",") if g]
+BATCH_READ_ZIPS = os.environ.get("BATCH_READ_ZIPS", "1") == "1"
+# "pool" (each worker process runs whole PDFs) or "pipeline" (rasterize/detect/ocr/extract stages, see pipeline_engine.py)
+BATCH_ENGINE = os.environ.get("BATCH_ENGINE", "pool")
+# Pipeline engine: items waiting between two stages, and "stage=kind:workers" per stage (kind: thread, process, async)
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "4"))
+PIPELINE_STAGES = os.environ.get("PIPELINE_STAGES", "rasterize=thread:2,detect=thread:1,ocr=thread:8,extract=thread:2")
+# Folder batches record per-file progress here and skip/resume finished work on the next run (see batch_manifest.py)
+BATCH_MANIFEST_ENABLED = os.environ.get("BATCH_MANIFEST_ENABLED", "1") == "1"
+BATCH_MANIFEST_PATH = os.environ.get("BATCH_MANIFEST_PATH", os.path.join(INFERENCE_OUTPUT_DIR, "batch_manifest.sqlite"))
+# batch_processor.py --watch (see folder_watcher.py): seconds a file must stay unchanged before it is processed,
+# polling interval without inotify, full rescan interval with it, and how often new results are exported
+WATCH_SETTLE_SECONDS = float(os.environ.get("WATCH_SETTLE_SECONDS", "2.0"))
+WATCH_POLL_SECONDS = float(os.environ.get("WATCH_POLL_SECONDS", "2.0"))
+WATCH_RESCAN_SECONDS = float(os.environ.get("WATCH_RESCAN_SECONDS", "300"))
+WATCH_USE_INOTIFY = os.environ.get("WATCH_USE_INOTIFY", "1") == "1"
+WATCH_EXPORT_SECONDS = float(os.environ.get("WATCH_EXPORT_SECONDS", "60"))
+# Shared work queue for multi-host processing (see work_queue.py): folder on storage every host mounts at the same path,
+# whether the app hands upload jobs to it instead of processing them itself, seconds a claimed file stays leased
+# without a heartbeat, claims per file before it is dead-lettered, first retry delay (doubling per attempt), idle poll,
+# and how long an upload job waits for a queued file before failing it
+WORK_QUEUE_DIR = os.environ.get("WORK_QUEUE_DIR", os.path.join(INFERENCE_OUTPUT_DIR, "work_queue"))
+WORK_QUEUE_ENABLED = os.environ.get("WORK_QUEUE_ENABLED", "0") == "1"
+WORK_QUEUE_LEASE_SECONDS = float(os.environ.get("WORK_QUEUE_LEASE_SECONDS", "300"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+WORK_QUEUE_RETRY_SECONDS = float(os.environ.get("WORK_QUEUE_RETRY_SECONDS", "30"))
+WORK_QUEUE_POLL_SECONDS = float(os.environ.get("WORK_QUEUE_POLL_SECONDS", "1.0"))
+WORK_QUEUE_WAIT_SECONDS = float(os.environ.get("WORK_QUEUE_WAIT_SECONDS", "21600"))
+# Progress events of finished jobs stay available to /jobs/<id>/events for this long
+JOB_EVENTS_KEEP_SECONDS = float(os.environ.get("JOB_EVENTS_KEEP_SECONDS", "600"))
+
+# Raw OCR output (full text + word boxes per page) kept as Parquet for reextract.py
+OCR_ARCHIVE_ENABLED = os.environ.get("OCR_ARCHIVE_ENABLED", "1") == "1"
+OCR_ARCHIVE_DIR = os.environ.get("OCR_ARCHIVE_DIR", os.path.join(INFERENCE_OUTPUT_DIR, "ocr_archive"))
+OCR_ARCHIVE_PART_ROWS = int(os.environ.get("OCR_ARCHIVE_PART_ROWS", "20000"))  # pages per part file
+
+# Detection-driven routing (evaluated on the first-page OD output)
+# Skip OCR when one of these classes dominates the detected area, e.g. "bad"
+ROUTING_SKIP_DOMINANT_CLASSES = [c for c in os.environ.get("ROUTING_SKIP_DOMINANT_CLASSES", "bad").split(",") if c]
+ROUTING_DOMINANCE_RATIO = float(os.environ.get("ROUTING_DOMINANCE_RATIO", "0.5"))
+# Only OCR documents where one of these classes was detected, e.g. "receipt_outline" (empty = no requirement)
+ROUTING_REQUIRE_CLASSES = [c for c in os.environ.get("ROUTING_REQUIRE_CLASSES", "").split(",") if c]
+# Used for the per-batch cost report
+VISION_COST_PER_1000_PAGES = float(os.environ.get("VISION_COST_PER_1000_PAGES", "1.50"))
+
+# OCR payload encoding (see payload_eval.py to pick settings for a corpus)
+# OCR_PAYLOAD_FORMAT: "original" (send the rendered PNG as-is), "png", "jpeg" or "webp"
+OCR_PAYLOAD_FORMAT = os.environ.get("OCR_PAYLOAD_FORMAT", "original")
+OCR_PAYLOAD_QUALITY = int(os.environ.get("OCR_PAYLOAD_QUALITY", "85"))
+OCR_PAYLOAD_MAX_LONG_EDGE = int(os.environ.get("OCR_PAYLOAD_MAX_LONG_EDGE", "0")) or None  # 0 = keep size
+OCR_PAYLOAD_GRAYSCALE = os.environ.get("OCR_PAYLOAD_GRAYSCALE", "0") == "1"
+
+# Blank/low-information page gate - pages below any threshold skip OCR
+PAGE_GATE_ENABLED = os.environ.get("PAGE_GATE_ENABLED", "1") == "1"
+PAGE_GATE_MIN_INK_RATIO = float(os.environ.get("PAGE_GATE_MIN_INK_RATIO", "0.002"))  # share of dark pixels
+PAGE_GATE_MIN_VARIANCE = float(os.environ.get("PAGE_GATE_MIN_VARIANCE", "25.0"))  # grayscale variance
+PAGE_GATE_MIN_COMPONENTS = int(os.environ.get("PAGE_GATE_MIN_COMPONENTS", "8"))  # connected ink blobs
+
+# Near-duplicate page detection - pages within PAGE_DEDUPE_MAX_DISTANCE bits (pHash and dHash)
+# of an already-processed page, confirmed by a thumbnail comparison, reuse its OCR text and OD detections
+PAGE_DEDUPE_ENABLED = os.environ.get("PAGE_DEDUPE_ENABLED", "1") == "1"
+PAGE_DEDUPE_MAX_DISTANCE = int(os.environ.get("PAGE_DEDUPE_MAX_DISTANCE", "6"))
+PAGE_DEDUPE_MAX_BLOCK_DIFF = float(os.environ.get("PAGE_DEDUPE_MAX_BLOCK_DIFF", "10.0"))  # mean gray levels per 4x4 tile
+PAGE_HASH_INDEX_PATH = os.environ.get("PAGE_HASH_INDEX_PATH")  # e.g. "inference_output/page_hashes.json" to persist
+
 # Ensure output directories exist
 os.makedirs(INFERENCE_OUTPUT_DIR, exist_ok=True)
 os.makedirs(ANNOTATED_IMAGES_DIR, exist_ok=True)
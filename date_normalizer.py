@@ -0,0 +1,109 @@
+# date_normalizer.py
+"""
+Date normalization to MM/DD/YYYY.
+
+Handles every shape the field extractor's DATE_PATTERNS can return:
+MM/DD/YYYY, DD MMM YYYY, MMM DD, YYYY and YYYY/MM/DD, with any of the
+``/ - . space`` separators, abbreviated or full month names and two-digit
+years (read as 20YY). Patterns are compiled once and ``normalize`` is
+LRU-memoized because the same date strings recur across a batch.
+
+A string such as ``25-12-31`` is DD-MM-YY or YY-MM-DD depending on where it
+came from, so ``year_first`` tells ``normalize`` which: the extractor sets it
+when the date matched its YYYY/MM/DD pattern.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+NORMALIZE_CACHE_SIZE = 4096
+
+_MONTH_NUMBERS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+_MONTH = r"(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+
+# 07/04/2025, 7-4-25, 13.04.25, 45-12-31 (which part is the year is decided in _numeric)
+_NUMERIC_RE = re.compile(r"(\d{1,2})[/\-\.](\d{1,2})[/\-\.](\d{4}|\d{2})")
+# 2025-07-04, 2025.7.4
+_YEAR_FIRST_RE = re.compile(r"(\d{4})[/\-\.](\d{1,2})[/\-\.](\d{1,2})")
+# 25-12-31, 25/07/04 when the caller knows the year comes first
+_SHORT_YEAR_FIRST_RE = re.compile(r"(\d{2})[/\-\.](\d{1,2})[/\-\.](\d{1,2})")
+# 04.Jul.2025, 4 Sept 25, 04-July-2025
+_DAY_MONTH_YEAR_RE = re.compile(r"(\d{1,2})[\.\-/\s]" + _MONTH + r"[\.\-/\s](\d{4}|\d{2})", re.IGNORECASE)
+# Jul 4, 2025 / July 04 25
+_MONTH_DAY_YEAR_RE = re.compile(_MONTH + r"\s+(\d{1,2}),?\s+(\d{4}|\d{2})", re.IGNORECASE)
+
+
+def month_to_number(month: str) -> int:
+    """Convert month name to number"""
+    return _MONTH_NUMBERS.get(month[:3].lower(), 1)
+
+
+def _year(year: str) -> str:
+    return year if len(year) == 4 else "20" + year
+
+
+def _format(month: int, day: int, year: str) -> str:
+    return f"{month:02d}/{day:02d}/{_year(year)}"
+
+
+def _numeric(first: str, second: str, third: str):
+    a, b, c = int(first), int(second), int(third)
+    if a > 31:
+        return _format(b, c, first)  # YY/MM/DD - the first part can't be a day
+    if a > 12 and b <= 12:
+        return _format(b, a, third)  # Likely DD/MM/YYYY
+    return _format(a, b, third)  # MM/DD/YYYY
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(date_str: str, year_first: bool = False) -> str:
+    """Convert a date string to MM/DD/YYYY; unrecognised strings are returned unchanged.
+
+    With ``year_first``, an all-numeric date with a two-digit first part is
+    read as YY/MM/DD.
+    """
+    if not date_str:
+        return date_str
+    text = date_str.strip()
+
+    if year_first:
+        match = _SHORT_YEAR_FIRST_RE.fullmatch(text)
+        if match:
+            year, month, day = match.groups()
+            return _format(int(month), int(day), year)
+
+    match = _NUMERIC_RE.fullmatch(text)
+    if match:
+        return _numeric(*match.groups())
+
+    match = _YEAR_FIRST_RE.fullmatch(text)
+    if match:
+        year, month, day = match.groups()
+        return _format(int(month), int(day), year)
+
+    match = _DAY_MONTH_YEAR_RE.fullmatch(text)
+    if match:
+        day, month, year = match.groups()
+        return _format(month_to_number(month), int(day), year)
+
+    match = _MONTH_DAY_YEAR_RE.fullmatch(text)
+    if match:
+        month, day, year = match.groups()
+        return _format(month_to_number(month), int(day), year)
+
+    return date_str
+
+
+def normalize_series(dates: pd.Series) -> pd.Series:
+    """Vectorized normalize for a pandas Series: each distinct value is converted once"""
+    codes, uniques = pd.factorize(dates)
+    # Missing values get code -1, which picks the trailing None and stays missing
+    converted = np.empty(len(uniques) + 1, dtype=object)
+    converted[:-1] = [normalize(value) for value in uniques]
+    converted[-1] = None
+    return pd.Series(converted[codes], index=dates.index, name=dates.name)
@@ -0,0 +1,147 @@
+# document_pipeline.py
+"""
+Shared per-document pipeline: PDF rasterization, OD on the first page and OCR.
+
+Used by the Flask routes so that single uploads and batch uploads go through
+exactly the same steps.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import cv2
+from pdf2image import convert_from_path
+
+from routing_policy import RoutingPolicy, RoutingDecision
+from yolox_od.inference import run_detection
+
+PDF_DPI = int(os.environ.get("PDF_DPI", "200"))
+PDF_MAX_PAGES = os.environ.get("PDF_MAX_PAGES")  # e.g. "10" to cap pages
+PDF_MAX_PAGES = int(PDF_MAX_PAGES) if PDF_MAX_PAGES else None
+POPPLER_PATH = os.environ.get("POPPLER_PATH")
+
+logger = logging.getLogger(__name__)
+
+
+def rasterize_pdf(pdf_path, out_dir, dpi: int = PDF_DPI, max_pages: int = PDF_MAX_PAGES, poppler_path: str = POPPLER_PATH) -> list:
+    """Convert a PDF into page_NNN.png files under out_dir and return their paths"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    pages = convert_from_path(str(pdf_path), dpi=dpi, poppler_path=poppler_path)
+    if max_pages is not None:
+        pages = pages[:max_pages]
+
+    image_paths = []
+    for i, page in enumerate(pages, start=1):
+        out_path = out_dir / f"page_{i:03d}.png"
+        page.save(out_path, "PNG")
+        image_paths.append(str(out_path))
+    return image_paths
+
+
+def detect_document(image_paths: list, filename: str, page_index=None):
+    """Run the OD model on the first page.
+
+    Returns (detections, reused_from) where each detection is a dict with
+    class_name/score/bbox and reused_from names the near-duplicate page whose
+    detections were reused, if any.
+    """
+    if not image_paths:
+        return [], None
+
+    try:
+        first_image = cv2.imread(image_paths[0])
+        if first_image is None:
+            logger.warning("Could not read image for OD model: %s", image_paths[0], extra={"document": filename})
+            return [], None
+
+        page_hash = None
+        if page_index is not None:
+            page_hash = page_index.hash_page(first_image)
+            match = page_index.lookup(page_hash, "detections")
+            if match:
+                logger.info("Reusing OD detections of near-duplicate page %s", match["source"], extra={"document": filename})
+                page_index.reused += 1
+                return list(match["detections"]), match["source"]
+
+        vis_img, detections = run_detection(first_image)
+        logger.info("OD finished", extra={"document": filename, "classes": [d["class_name"] for d in detections]})
+
+        if page_hash is not None:
+            page_index.add(page_hash, f"{filename}#1", detections=detections)
+        return detections, None
+
+    except Exception as e:
+        logger.exception("Error running OD model: %s", e, extra={"document": filename})
+        return [], None
+
+
+@dataclass
+class DocumentRoute:
+    """First-page OD output of a document and the routing decision taken on it"""
+    detections: list
+    reused_from: Optional[str]
+    decision: RoutingDecision
+    od_seconds: float
+
+    @property
+    def detected_classes(self) -> list:
+        return [d["class_name"] for d in self.detections]
+
+    @property
+    def sticker_flag(self) -> bool:
+        return "sticker" in self.detected_classes
+
+    @property
+    def signature_flag(self) -> bool:
+        return "signature" in self.detected_classes
+
+
+def route_document(image_paths: list, filename: str, page_index=None, policy: RoutingPolicy = None,
+                   progress=None) -> DocumentRoute:
+    """OD on the first page, then the routing policy's decision whether to OCR the document"""
+    policy = policy or RoutingPolicy.from_config()
+    od_start = time.perf_counter()
+    detections, reused_from = detect_document(image_paths, filename, page_index)
+    route = DocumentRoute(detections, reused_from, policy.decide(detections), time.perf_counter() - od_start)
+    if progress is not None:
+        progress("detected", classes=route.detected_classes, route=route.decision.route, reused_from=reused_from)
+    return route
+
+
+def complete_result(result, route: DocumentRoute, ocr_seconds: float):
+    """Record the OD outcome and stage timings on a document's OCRResult"""
+    result.detected_classes = route.detected_classes
+    result.detections_reused_from = route.reused_from
+    result.od_seconds = route.od_seconds
+    result.ocr_seconds = ocr_seconds
+    return result
+
+
+def process_document(image_paths: list, filename: str, ocr_processor, page_index=None, policy: RoutingPolicy = None,
+                     archive=None, progress=None, page_pool=None):
+    """Run OD and OCR over a document's page images and return its OCRResult.
+
+    The routing policy looks at the first-page detections and may skip OCR
+    entirely (e.g. when the page is dominated by the ``bad`` class). OCR'd
+    pages are kept in ``archive`` (an OCRArchive) when one is given.
+    ``progress(stage, **fields)``, when given, is told about the "detected"
+    stage and every page's "ocred" and "extracted" stages. ``page_pool`` lets
+    the pages' Vision requests overlap (see document_scheduler).
+    """
+    route = route_document(image_paths, filename, page_index, policy, progress)
+
+    ocr_start = time.perf_counter()
+    if route.decision.run_ocr:
+        result = ocr_processor.process_images(image_paths, filename, route.sticker_flag, route.signature_flag,
+                                              page_index=page_index, archive=archive, progress=progress,
+                                              page_pool=page_pool)
+    else:
+        logger.info("Routing policy skipped OCR: %s", route.decision.reason, extra={"document": filename})
+        result = ocr_processor.skipped_result(image_paths, filename, route.sticker_flag, route.signature_flag,
+                                              route.decision.reason)
+    return complete_result(result, route, time.perf_counter() - ocr_start)
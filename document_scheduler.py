@@ -0,0 +1,267 @@
+# document_scheduler.py
+"""
+Bounded concurrency for documents and their pages, in priority order.
+
+``DocumentScheduler.map`` runs a per-document function over a job's files on
+BATCH_DOCUMENT_CONCURRENCY threads and yields the outcomes in input order, so
+a batch overlaps OD, rasterization and Vision round trips of several files
+without reordering its results. ``page_pool`` (BATCH_PAGE_CONCURRENCY threads)
+is handed to ``OCRProcessor.process_images`` so the Vision requests of a
+document's pages overlap too; it is shared by every document, so the limit is
+on Vision requests in flight across the whole process, not per document.
+Both pools copy the caller's context, so log events keep their correlation id.
+
+Every job shares both pools. Waiting work is therefore picked by priority
+rather than arrival order, so a single upload does not queue behind an
+80-page batch:
+
+- Each document belongs to a class, ``interactive`` or ``bulk``. When both
+  classes have work waiting, they share the workers by SCHEDULER_WEIGHTS
+  (weighted fair queuing on estimated cost). Bulk work therefore keeps
+  moving while uploads are served first.
+- Within a class, the document with the fewest pages goes first
+  (``document_cost``: a guess from the file size, which needs no subprocess
+  on the request path).
+  Every SCHEDULER_AGING_SECONDS of waiting counts as one page less, so a
+  large document is not passed over forever.
+- A document's page requests inherit its class in the page pool.
+
+``metrics()`` reports the queue wait per class, for documents and pages.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import (BATCH_DOCUMENT_CONCURRENCY, BATCH_PAGE_CONCURRENCY, SCHEDULER_WEIGHTS, SCHEDULER_AGING_SECONDS,
+                    SCHEDULER_INTERACTIVE_MAX_PAGES, SCHEDULER_BYTES_PER_PAGE)
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BULK = "interactive", "bulk"
+
+# Class of the work running in this context; page requests a document submits inherit it
+_priority = contextvars.ContextVar("priority", default=BULK)
+
+# Waits kept per class for the percentiles in metrics()
+WAIT_SAMPLES = 1000
+
+
+def document_cost(path, max_pages=None) -> float:
+    """Estimated work for a document, in pages: the file size over SCHEDULER_BYTES_PER_PAGE.
+
+    Costs are taken for every file of a job before any of them is scheduled,
+    and the order is only a guess within a window of 2x the workers anyway, so
+    a stat() is worth it where a pdfinfo run per file is not.
+    """
+    path = Path(path)
+    if path.suffix.lower() != ".pdf":
+        return 1.0
+    try:
+        pages = round(path.stat().st_size / SCHEDULER_BYTES_PER_PAGE)
+    except OSError:
+        pages = 1
+    if max_pages:
+        pages = min(pages, max_pages)
+    return float(max(1, pages))
+
+
+@dataclass
+class _Entry:
+    priority: str
+    cost: float
+    fn: object
+    args: tuple
+    kwargs: dict
+    future: Future = field(default_factory=Future)
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class _WaitStats:
+    def __init__(self):
+        self.started = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=WAIT_SAMPLES)
+
+    def add(self, wait: float):
+        self.started += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.recent.append(wait)
+
+    def summary(self, queued: int) -> dict:
+        recent = sorted(self.recent)
+        return {
+            "queued": queued,
+            "started": self.started,
+            "wait_mean": round(self.total / self.started, 3) if self.started else 0.0,
+            "wait_p95": round(recent[int(0.95 * (len(recent) - 1))], 3) if recent else 0.0,
+            "wait_max": round(self.max, 3),
+        }
+
+
+class _FairQueue:
+    """Waiting entries: weighted fair queuing between classes, shortest first (with aging) within a class"""
+
+    def __init__(self, weights: dict, aging_seconds: float):
+        self.weights = weights
+        self.aging_seconds = aging_seconds
+        self._heaps = {name: [] for name in weights}
+        self._served = dict.fromkeys(weights, 0.0)  # cost started per class, divided by its weight
+        self._waits = {name: _WaitStats() for name in weights}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, entry: _Entry):
+        with self._cond:
+            heap = self._heaps.setdefault(entry.priority, [])
+            self._served.setdefault(entry.priority, 0.0)
+            self._waits.setdefault(entry.priority, _WaitStats())
+            if not heap:
+                # A class that was idle does not bank a share for later: it joins at the others' level
+                busy = [self._served[name] for name, waiting in self._heaps.items() if waiting]
+                if busy:
+                    self._served[entry.priority] = max(self._served[entry.priority], min(busy))
+            # Cost minus waiting time in pages; the "minus now" part is the same for every entry, so it is left out
+            key = entry.cost + (entry.enqueued_at / self.aging_seconds if self.aging_seconds > 0 else 0.0)
+            heapq.heappush(heap, (key, next(self._seq), entry))
+            self._cond.notify()
+
+    def get(self):
+        """The next entry to run, waiting for one; None once closed and empty"""
+        with self._cond:
+            while not any(self._heaps.values()):
+                if self._closed:
+                    return None
+                self._cond.wait()
+            name = min((name for name, waiting in self._heaps.items() if waiting), key=self._served.get)
+            _, _, entry = heapq.heappop(self._heaps[name])
+            self._served[name] += entry.cost / self.weights.get(name, 1.0)
+            self._waits[name].add(time.monotonic() - entry.enqueued_at)
+            return entry
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {name: stats.summary(len(self._heaps[name])) for name, stats in self._waits.items()}
+
+
+class FairExecutor:
+    """Fixed pool of threads that runs submitted calls in _FairQueue order rather than first come, first served"""
+
+    def __init__(self, size: int, name: str, weights: dict = SCHEDULER_WEIGHTS,
+                 aging_seconds: float = SCHEDULER_AGING_SECONDS):
+        self.size = size
+        self._queue = _FairQueue(weights, aging_seconds)
+        self._threads = [threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True) for i in range(size)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority: str = None, cost: float = 1.0, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) in ``priority``'s class (default: the class of the calling work)"""
+        entry = _Entry(priority or _priority.get(), cost, fn, args, kwargs)
+        self._queue.put(entry)
+        return entry.future
+
+    def _worker(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            if not entry.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = entry.context.run(self._call, entry)
+            except BaseException as e:
+                entry.future.set_exception(e)
+            else:
+                entry.future.set_result(result)
+
+    @staticmethod
+    def _call(entry: _Entry):
+        _priority.set(entry.priority)
+        return entry.fn(*entry.args, **entry.kwargs)
+
+    def metrics(self) -> dict:
+        """Per class: entries waiting, entries started, and their queue wait in seconds (mean, p95, max)"""
+        return self._queue.metrics()
+
+    def shutdown(self, wait: bool = True):
+        """Stop once the queued calls have run"""
+        self._queue.close()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class PagePool(FairExecutor):
+    """Thread pool for per-page Vision requests; ``size`` is also how far ahead a document submits pages"""
+
+    def __init__(self, size: int, weights: dict = SCHEDULER_WEIGHTS, aging_seconds: float = SCHEDULER_AGING_SECONDS):
+        super().__init__(size, "ocr-page", weights, aging_seconds)
+
+
+class DocumentScheduler:
+    """Runs documents on a bounded, priority-ordered thread pool and hands back their outcomes in order"""
+
+    def __init__(self, documents: int = BATCH_DOCUMENT_CONCURRENCY, pages: int = BATCH_PAGE_CONCURRENCY,
+                 weights: dict = SCHEDULER_WEIGHTS, aging_seconds: float = SCHEDULER_AGING_SECONDS,
+                 interactive_max_pages: int = SCHEDULER_INTERACTIVE_MAX_PAGES):
+        self.documents = max(1, documents)
+        self.interactive_max_pages = interactive_max_pages
+        self.page_pool = PagePool(pages, weights, aging_seconds) if pages > 1 else None
+        self._pool = FairExecutor(self.documents, "document", weights, aging_seconds)
+
+    @classmethod
+    def from_config(cls):
+        return cls(BATCH_DOCUMENT_CONCURRENCY, BATCH_PAGE_CONCURRENCY)
+
+    def map(self, fn, items, priority: str = BULK, cost=None):
+        """Yield (item, result, error) for fn(item) over ``items``, in input order.
+
+        At most twice ``documents`` items are submitted ahead of the one being
+        yielded, so a long input list is not turned into futures all at once
+        and one slow document does not leave the other workers idle.
+        ``cost(item)`` estimates an item's pages (see document_cost); items
+        cost one page each without it. An interactive item over
+        ``interactive_max_pages`` is scheduled as bulk.
+        """
+        window = deque()
+        for item in items:
+            item_cost = cost(item) if cost is not None else 1.0
+            item_priority = BULK if priority == INTERACTIVE and item_cost > self.interactive_max_pages else priority
+            window.append((item, self._pool.submit(fn, item, priority=item_priority, cost=item_cost)))
+            if len(window) >= 2 * self.documents:
+                yield self._outcome(*window.popleft())
+        while window:
+            yield self._outcome(*window.popleft())
+
+    @staticmethod
+    def _outcome(item, future):
+        try:
+            return item, future.result(), None
+        except Exception as e:
+            return item, None, e
+
+    def metrics(self) -> dict:
+        """Queue wait per priority class, for documents and for page requests"""
+        return {"documents": self._pool.metrics(),
+                "pages": self.page_pool.metrics() if self.page_pool is not None else None}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        if self.page_pool is not None:
+            self.page_pool.shutdown(wait=True)
@@ -0,0 +1,267 @@
+# field_extractor.py
+"""
+Single-pass invoice field extraction.
+
+All patterns are compiled once at import. Each extraction walks the OCR text
+once to build a keyword -> line index (INVOICE/DOCUMENT/STORE/TOTAL/QTY/FRITO
+...), and every field regex then starts searching at the first line that
+contains its keyword instead of rescanning the whole text. Results are
+identical to running ``re.search`` over the full text.
+
+When Vision word boxes are available, spatial_extractor resolves labelled
+values from the page layout first and the regexes fill in the rest.
+"""
+import re
+
+from config import SPATIAL_EXTRACTION_ENABLED
+from date_normalizer import normalize
+from models import InvoiceFields
+
+_FLAGS = re.IGNORECASE
+
+_MONTHS = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+
+# (keywords, pattern): a pattern can only match on or after the first line containing one of its keywords
+INVOICE_PATTERNS = [
+    (("DOCUMENT",), re.compile(r"\bDOCUMENT\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b", _FLAGS)),  # Document first
+    (("INVOICE",), re.compile(r"\bINVOICE\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b(?!\s+DATE)", _FLAGS)),  # Avoid matching "Invoice Date"
+    (("INV",), re.compile(r"\bINV\s*(?:NO\.?|#)?\s*[:\-]?\s*([A-Z0-9\-]+)\b", _FLAGS)),
+]
+
+# Store patterns - only match "Store Number: 2516" format
+STORE_PATTERNS = [
+    (("STORE",), re.compile(r"\bSTORE\s*(?:NUMBER|NO\.?)\s*[:\-]?\s*([A-Z0-9\-]{2,})\b", _FLAGS)),
+]
+
+# Date patterns - prioritize MM/DD/YYYY format; shared by invoice and sticker dates
+DATE_PATTERNS = [
+    re.compile(r"\b(?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])[/\-\.](?:20)?\d{2}\b", _FLAGS),  # MM/DD/YYYY
+    re.compile(r"\b(?:0?[1-9]|[12][0-9]|3[01])[\.\-/\s]" + _MONTHS + r"[\.\-/\s](?:20)?\d{2}\b", _FLAGS),  # DD/MMM/YYYY
+    re.compile(r"\b" + _MONTHS + r"\s+(?:0?[1-9]|[12][0-9]|3[01]),?\s+(?:20)?\d{2}\b", _FLAGS),  # MMM DD, YYYY
+    re.compile(r"\b(?:20)?\d{2}[/\-\.](?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])\b", _FLAGS),  # YYYY/MM/DD
+]
+# Dates it matches are read year first (see date_normalizer.normalize)
+_YEAR_FIRST_PATTERN = DATE_PATTERNS[3]
+
+_NUMBER = r"([-]?[0-9,]+(?:\.[0-9]+)?)"
+QTY_PATTERNS = [
+    (("TOTAL",), re.compile(r"\bTOTAL\s*(?:QTY|QUANTITY)\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),
+    (("QTY", "QUANTITY"), re.compile(r"\b(?:QTY|QUANTITY)\s*TOTAL\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),
+    (("TOTAL",), re.compile(r"\bTOTAL\s*[:\-]?\s*" + _NUMBER + r"\s*(?:QTY|QUANTITY)\b", _FLAGS)),
+    (("TOTAL",), re.compile(r"\bTOTAL\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),
+    (("QTY", "QUANTITY"), re.compile(r"\b(?:QTY|QUANTITY)\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),
+    (("AMOUNT",), re.compile(r"\bAMOUNT\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),
+    (("TOTAL",), re.compile(r"\bTOTAL\s*EACHES\s*SOLD\s*[:\-]?\s*" + _NUMBER + r"\b", _FLAGS)),  # "TOTAL EACHES SOLD: 80"
+]
+QTY_LINE_KEYWORDS = ("QTY", "QUANTITY", "TOTAL", "AMOUNT")
+QTY_LINE_RE = re.compile(r"\b(QTY|QUANTITY|TOTAL|AMOUNT)\b", _FLAGS)
+
+FRITO_LAY_RE = re.compile(r"\bFRITO\s*LAY\b", _FLAGS)
+
+KEYWORDS = ("DOCUMENT", "INVOICE", "INV", "STORE", "TOTAL", "QTY", "QUANTITY", "AMOUNT", "FRITO")
+
+# Dates are converted to MM/DD/YYYY by the memoized date_normalizer
+convert_date_format = normalize
+
+
+class LineIndex:
+    """Keyword -> line index built in one pass over the OCR text.
+
+    ``offsets`` maps each keyword to the character offset of the first line
+    containing it (case-insensitively); ``qty_lines`` holds the stripped lines
+    that mention a quantity keyword, in order.
+    """
+    __slots__ = ("offsets", "qty_lines")
+
+    def __init__(self, full_text: str):
+        offsets = {}
+        qty_lines = []
+        pos = 0
+        for raw in full_text.splitlines(True):
+            # upper() maps every character re.IGNORECASE equates with A-Z onto that letter,
+            # except U+0130 (dotted capital I), which re also matches against "i"
+            upper = raw.upper()
+            if "İ" in upper:
+                upper = upper.replace("İ", "I")
+
+            if len(offsets) < len(KEYWORDS):
+                for kw in KEYWORDS:
+                    if kw not in offsets and kw in upper:
+                        offsets[kw] = pos
+
+            if "QTY" in upper or "QUANTITY" in upper or "TOTAL" in upper or "AMOUNT" in upper:
+                line = raw.strip()
+                if line and QTY_LINE_RE.search(line):
+                    qty_lines.append((line, upper))
+            pos += len(raw)
+
+        self.offsets = offsets
+        self.qty_lines = qty_lines
+
+    def start_of(self, keywords):
+        """Offset to start searching for a pattern anchored on one of keywords, or None"""
+        starts = [self.offsets[kw] for kw in keywords if kw in self.offsets]
+        return min(starts) if starts else None
+
+
+def _group(m):
+    return m.group(1) if m.lastindex else m.group(0)
+
+
+def first_keyword_match(patterns, text: str, index: LineIndex):
+    """First pattern (in priority order) that matches anywhere in text"""
+    for keywords, pattern in patterns:
+        start = index.start_of(keywords)
+        if start is None:
+            continue
+        m = pattern.search(text, start)
+        if m:
+            return _group(m)
+    return None
+
+
+def find_date(full_text: str):
+    """(first date in the text, whether it matched the year-first pattern), or (None, False)"""
+    for pattern in DATE_PATTERNS:
+        m = pattern.search(full_text)
+        if m:
+            return m.group(0), pattern is _YEAR_FIRST_PATTERN
+    return None, False
+
+
+def first_date(full_text: str):
+    return find_date(full_text)[0]
+
+
+def _parse_quantity(candidate: str):
+    try:
+        # Remove commas and convert to float
+        return float(candidate.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def extract_quantity(full_text: str, index: LineIndex):
+    # First try to find quantity in lines containing quantity keywords
+    for line, upper in index.qty_lines:
+        for keywords, pattern in QTY_PATTERNS:
+            if not any(kw in upper for kw in keywords):
+                continue
+            m = pattern.search(line)
+            if m:
+                qty = _parse_quantity(_group(m))
+                if qty is not None:
+                    return qty
+                break
+
+    # If no quantity found in specific lines, search the entire text
+    candidate = first_keyword_match(QTY_PATTERNS, full_text, index)
+    if candidate:
+        return _parse_quantity(candidate)
+    return None
+
+
+def extract_fields(full_text: str, signature_flag: bool, has_sticker: bool = False, convert_date=convert_date_format,
+                   words: list = None) -> InvoiceFields:
+    """Extract invoice fields from OCR text in a single indexed pass.
+
+    When Vision word boxes are given, label/value pairs resolved from the page
+    layout take precedence and the regex path only fills the fields without a
+    spatial match.
+    """
+    spatial = {}
+    if words and SPATIAL_EXTRACTION_ENABLED:
+        from spatial_extractor import SpatialExtractor
+        spatial = SpatialExtractor(words).extract()
+
+    index = LineIndex(full_text)
+
+    invoice_number = spatial.get("invoice_number") or first_keyword_match(INVOICE_PATTERNS, full_text, index)
+    store_number = spatial.get("store_number") or first_keyword_match(STORE_PATTERNS, full_text, index)
+
+    # Invoice and sticker dates use the same patterns, so the first date serves both
+    first, year_first = find_date(full_text)
+    if first:
+        first = convert_date(first, year_first=year_first)
+    invoice_date = convert_date(spatial["invoice_date"]) if "invoice_date" in spatial else first
+
+    # Only extract sticker date if OD model detected a sticker
+    sticker_date = first if has_sticker else None
+
+    total_qty = spatial["total_quantity"] if "total_quantity" in spatial else extract_quantity(full_text, index)
+
+    # Check for Frito-Lay presence
+    start = index.start_of(("FRITO",))
+    has_frito_lay = start is not None and FRITO_LAY_RE.search(full_text, start) is not None
+
+    return InvoiceFields(
+        invoice_number=invoice_number,
+        store_number=store_number,
+        invoice_date=invoice_date,
+        sticker_date=sticker_date,
+        total_quantity=total_qty,
+        has_frito_lay=has_frito_lay,
+        has_signature=signature_flag,
+        has_sticker=has_sticker,
+        # Determine validity based on sticker presence
+        is_valid="Valid" if has_sticker else "Invalid"
+    )
+
+
+def empty_fields(signature_flag: bool, sticker_flag: bool) -> InvoiceFields:
+    """Fields for a page that produced no text (blank, skipped or failed)"""
+    return InvoiceFields(has_signature=signature_flag, has_sticker=sticker_flag)
+
+
+def combine_fields(all_fields: list) -> InvoiceFields:
+    """Combine fields from multiple pages, prioritizing non-None values"""
+    if not all_fields:
+        return InvoiceFields()
+
+    # Start with a copy of the first set of fields (the pages' fields stay as extracted)
+    combined = all_fields[0].model_copy()
+
+    # Update with non-None values from other pages
+    for fields in all_fields[1:]:
+        if fields.invoice_number and not combined.invoice_number:
+            combined.invoice_number = fields.invoice_number
+        if fields.store_number and not combined.store_number:
+            combined.store_number = fields.store_number
+        if fields.invoice_date and not combined.invoice_date:
+            combined.invoice_date = fields.invoice_date
+        if fields.sticker_date and not combined.sticker_date:
+            combined.sticker_date = fields.sticker_date
+        if fields.total_quantity is not None and combined.total_quantity is None:
+            combined.total_quantity = fields.total_quantity
+        if fields.has_frito_lay and not combined.has_frito_lay:
+            combined.has_frito_lay = fields.has_frito_lay
+        if fields.has_signature and not combined.has_signature:
+            combined.has_signature = fields.has_signature
+        if fields.has_sticker and not combined.has_sticker:
+            combined.has_sticker = fields.has_sticker
+
+    return combined
+
+
+def found_fields(fields: InvoiceFields) -> list:
+    """Get list of fields that were successfully extracted"""
+    found = []
+    if fields.invoice_number:
+        found.append('invoice_number')
+    if fields.store_number:
+        found.append('store_number')
+    if fields.invoice_date:
+        found.append('invoice_date')
+    if fields.sticker_date and fields.sticker_date != "Not Available":
+        found.append('sticker_date')
+    if fields.total_quantity is not None:
+        found.append('total_quantity')
+    if fields.has_frito_lay:
+        found.append('has_frito_lay')
+    if fields.has_signature:
+        found.append('has_signature')
+    if fields.has_sticker:
+        found.append('has_sticker')
+    if fields.is_valid:
+        found.append('is_valid')
+    return found
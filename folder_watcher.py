@@ -0,0 +1,174 @@
+# folder_watcher.py
+"""
+Watches a folder for PDFs that are new or have changed.
+
+On Linux the watcher uses inotify (through libc, no extra package). It
+polls the folder instead when inotify is not available, or when
+WATCH_USE_INOTIFY is off. Network shares need polling, because inotify
+only sees writes made by the local kernel. Even with inotify, the folder is
+rescanned every WATCH_RESCAN_SECONDS, in case events were lost.
+
+A file is handed out only once its size and mtime have not changed for
+WATCH_SETTLE_SECONDS. A scan that is still being copied into the share is
+therefore not picked up half-written. Files already in the folder at start
+are reported too. The batch manifest then skips those that were processed
+before.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+
+from config import WATCH_SETTLE_SECONDS, WATCH_POLL_SECONDS, WATCH_RESCAN_SECONDS, WATCH_USE_INOTIFY
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event bits
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x2, 0x4, 0x8, 0x80, 0x100
+IN_Q_OVERFLOW = 0x4000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (followed by the name)
+
+
+class _Inotify:
+    """Non-blocking inotify watch on one directory"""
+
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def read(self, timeout: float):
+        """Names of changed files within ``timeout`` seconds; None in the list means events were lost"""
+        if not select.select([self.fd], [], [], max(0.0, timeout))[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                names.append(None)
+            elif length:
+                names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Yields PDFs in ``folder`` as they arrive or change, once they have stopped growing"""
+
+    def __init__(self, folder, pattern: str = "*.pdf", settle_seconds: float = WATCH_SETTLE_SECONDS,
+                 poll_seconds: float = WATCH_POLL_SECONDS, rescan_seconds: float = WATCH_RESCAN_SECONDS,
+                 use_inotify: bool = WATCH_USE_INOTIFY):
+        self.folder = Path(folder)
+        self.pattern = pattern  # matched against lower-cased file names
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.rescan_seconds = rescan_seconds
+        self._known = {}    # path -> (size, mtime) when it was last handed out
+        self._pending = {}  # path -> ((size, mtime), monotonic time it last changed)
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(self.folder)
+            except (OSError, AttributeError) as e:
+                logger.warning("inotify unavailable (%s), polling %s instead", e, self.folder)
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def changes(self, stop: threading.Event):
+        """Yield paths of new or changed PDFs until ``stop`` is set"""
+        interval = self.rescan_seconds if self._inotify is not None else self.poll_seconds
+        self._scan()
+        next_scan = time.monotonic() + interval
+        try:
+            while not stop.is_set():
+                yield from self._ready()
+                now = time.monotonic()
+                wake = min([next_scan] + [since + self.settle_seconds for _, since in self._pending.values()])
+                timeout = min(max(0.0, wake - now), 1.0)  # wake at least once a second to notice stop
+                if self._inotify is not None:
+                    for name in self._inotify.read(timeout):
+                        if name is None:
+                            next_scan = 0  # the kernel dropped events: rescan
+                        elif fnmatch(name.lower(), self.pattern):
+                            self._note(str(self.folder / name))
+                else:
+                    stop.wait(timeout)
+                if time.monotonic() >= next_scan:
+                    self._scan()
+                    next_scan = time.monotonic() + interval
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _scan(self):
+        seen = set()
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if fnmatch(entry.name.lower(), self.pattern) and entry.is_file():
+                    seen.add(entry.path)
+                    stat = entry.stat()
+                    self._note(entry.path, (stat.st_size, stat.st_mtime))
+        for path in self._known.keys() - seen:
+            del self._known[path]  # deleted, so a new file of that name counts as new
+
+    def _note(self, path: str, signature=None):
+        """Track a possibly changed file; its settle time restarts whenever size or mtime move"""
+        if signature is None:
+            signature = self._signature(path)
+            if signature is None:
+                self._pending.pop(path, None)
+                return
+        if signature == self._known.get(path):
+            return
+        pending = self._pending.get(path)
+        if pending is None or pending[0] != signature:
+            self._pending[path] = (signature, time.monotonic())
+
+    def _ready(self):
+        now = time.monotonic()
+        for path, (signature, since) in list(self._pending.items()):
+            if now - since < self.settle_seconds:
+                continue
+            current = self._signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature or current[0] == 0:
+                self._pending[path] = (current, now)  # still being written (or created but still empty)
+            else:
+                del self._pending[path]
+                self._known[path] = signature
+                yield path
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
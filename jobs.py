@@ -0,0 +1,364 @@
+# jobs.py
+"""
+Background processing jobs.
+
+Upload routes save the files and call ``JobManager.submit``, which records the
+job in SQLite and returns its id straight away. A fixed pool of JOB_WORKERS
+threads picks jobs off the queue and calls the ``run_job`` function given to
+the manager. Single-document jobs have their own queue and
+JOB_INTERACTIVE_WORKERS threads, so they never wait for batch jobs to finish.
+``run_job`` reports per-file progress through ``Job.file_started``,
+``Job.file_done`` and ``Job.file_failed``. Jobs and their per-file state live
+in JOB_DB_PATH, so jobs that were queued or running when the process stopped
+are picked up again - skipping files that already finished - when the next
+manager starts.
+
+While a job runs, ``Job.emit`` publishes stage events (file started/done,
+and whatever ``run_job`` reports - rasterized, detected, ocred, extracted,
+written) to ``JobManager.events``, an in-memory log that the
+``/jobs/<id>/events`` Server-Sent Events stream follows. Events are kept
+for JOB_EVENTS_KEEP_SECONDS after the job finishes so clients can reconnect
+with Last-Event-ID; they are not persisted.
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from config import JOB_DB_PATH, JOB_WORKERS, JOB_INTERACTIVE_WORKERS, JOB_MAX_QUEUED, JOB_EVENTS_KEEP_SECONDS
+from log_setup import correlation, get_correlation_id
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# Kind of the single-document upload jobs, which have their own workers
+INTERACTIVE_KIND = "document"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    summary TEXT,
+    correlation_id TEXT
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class QueueFull(Exception):
+    """Raised by submit when JOB_MAX_QUEUED jobs are already waiting"""
+
+
+class JobEvents:
+    """Per-job event logs that any number of readers can follow while the job runs"""
+
+    def __init__(self, keep_seconds: float = JOB_EVENTS_KEEP_SECONDS):
+        self.keep_seconds = keep_seconds
+        self._cond = threading.Condition()
+        self._events = {}  # job id -> [(event id, name, data)]
+        self._finished = {}  # job id -> time.monotonic() when its last event was published
+
+    def publish(self, job_id: str, name: str, data: dict):
+        with self._cond:
+            events = self._events.setdefault(job_id, [])
+            events.append((len(events) + 1, name, data))
+            self._cond.notify_all()
+
+    def finish(self, job_id: str):
+        """No more events for this job; drop logs of jobs that finished more than keep_seconds ago"""
+        now = time.monotonic()
+        with self._cond:
+            self._finished[job_id] = now
+            for old_id, finished_at in list(self._finished.items()):
+                if now - finished_at > self.keep_seconds:
+                    del self._finished[old_id]
+                    self._events.pop(old_id, None)
+            self._cond.notify_all()
+
+    def last_id(self, job_id: str) -> int:
+        with self._cond:
+            return len(self._events.get(job_id, ()))
+
+    def follow(self, job_id: str, after: int = 0, timeout: float = 15.0):
+        """Yield (id, name, data) for events after ``after`` as they arrive, and None after ``timeout`` idle seconds.
+
+        Stops once the job has finished and every event has been yielded.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._events.get(job_id, ())) > after or job_id in self._finished, timeout)
+                pending = self._events.get(job_id, [])[after:]
+                finished = job_id in self._finished
+            if pending:
+                yield from pending
+                after = pending[-1][0]
+            elif finished:
+                return
+            else:
+                yield None
+
+
+@dataclass
+class JobFile:
+    index: int
+    filename: str
+    path: str
+    status: str = QUEUED
+    error: Optional[str] = None
+    result: Optional[dict] = None
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str
+    created_at: float
+    files: list = field(default_factory=list)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    summary: Optional[dict] = None
+    correlation_id: Optional[str] = None
+    manager: Optional["JobManager"] = field(default=None, repr=False)
+
+    def pending_files(self) -> list:
+        """Files that have not finished yet (all of them, unless the job is resuming after a restart)"""
+        return [f for f in self.files if f.status not in (DONE, FAILED)]
+
+    def emit(self, name: str, **data):
+        """Publish a progress event to readers of this job's event stream"""
+        self.manager.events.publish(self.id, name, data)
+
+    def file_started(self, job_file: JobFile):
+        job_file.status = RUNNING
+        self.manager._update_file(self.id, job_file)
+        self.emit("file_started", file=job_file.index, filename=job_file.filename)
+
+    def file_done(self, job_file: JobFile, result: dict):
+        job_file.status, job_file.result, job_file.error = DONE, result, None
+        self.manager._update_file(self.id, job_file)
+        self.emit("file_done", file=job_file.index, filename=job_file.filename, progress=self.progress())
+
+    def file_failed(self, job_file: JobFile, error: str, result: dict = None):
+        job_file.status, job_file.result, job_file.error = FAILED, result, error
+        self.manager._update_file(self.id, job_file)
+        self.emit("file_failed", file=job_file.index, filename=job_file.filename, error=error, progress=self.progress())
+
+    def progress(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for f in self.files:
+            counts[f.status] += 1
+        return {"total": len(self.files), "done": counts[DONE], "failed": counts[FAILED],
+                "running": counts[RUNNING], "queued": counts[QUEUED]}
+
+    def to_dict(self, include_results: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "progress": self.progress(),
+            "summary": self.summary,
+            "files": [
+                {"filename": f.filename, "status": f.status, "error": f.error,
+                 **({"result": f.result} if include_results else {})}
+                for f in self.files
+            ],
+        }
+        return data
+
+
+class JobManager:
+    """SQLite-backed job queue served by a fixed pool of worker threads"""
+
+    def __init__(self, run_job: Callable, path=JOB_DB_PATH, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED,
+                 interactive_workers: int = JOB_INTERACTIVE_WORKERS, interactive_kinds=(INTERACTIVE_KIND,)):
+        self.run_job = run_job
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_queued = max_queued
+        self.events = JobEvents()
+        self._queue = queue.Queue()
+        # Jobs of these kinds go to their own queue and workers (0 = share the main queue)
+        self.interactive_kinds = set(interactive_kinds) if interactive_workers > 0 else set()
+        self._interactive_queue = queue.Queue()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+        self._recover()
+        self._threads = [
+            threading.Thread(target=self._worker, args=(self._queue,), name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ] + [
+            threading.Thread(target=self._worker, args=(self._interactive_queue,), name=f"job-interactive-{i}",
+                             daemon=True)
+            for i in range(interactive_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _execute(self, sql: str, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, files: list, job_id: str = None) -> str:
+        """Record a job for ``files`` (a list of (filename, saved path)) and queue it; returns the job id"""
+        if self.queued() >= self.max_queued:
+            raise QueueFull(f"{self.queued()} jobs are already queued")
+        job_id = job_id or uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, status, created_at, correlation_id) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, time.time(), get_correlation_id()),
+                )
+                conn.executemany(
+                    "INSERT INTO job_files (job_id, idx, filename, path, status) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, i, filename, str(path), QUEUED) for i, (filename, path) in enumerate(files)],
+                )
+        finally:
+            conn.close()
+        self._queue_for(kind).put(job_id)
+        logger.info("Job queued", extra={"job_id": job_id, "kind": kind, "files": len(files)})
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, kind, status, created_at, started_at, finished_at, error, summary, correlation_id "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            files = conn.execute(
+                "SELECT idx, filename, path, status, error, result FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return Job(
+            id=row[0], kind=row[1], status=row[2], created_at=row[3], started_at=row[4], finished_at=row[5],
+            error=row[6], summary=json.loads(row[7]) if row[7] else None, correlation_id=row[8],
+            files=[JobFile(idx, filename, path, status, error, json.loads(result) if result else None)
+                   for idx, filename, path, status, error, result in files],
+            manager=self,
+        )
+
+    def recent(self, limit: int = 50) -> list:
+        conn = self._connect()
+        try:
+            ids = [row[0] for row in conn.execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))]
+        finally:
+            conn.close()
+        return [self.get(job_id) for job_id in ids]
+
+    def queued(self) -> int:
+        return self._queue.qsize() + self._interactive_queue.qsize()
+
+    def _queue_for(self, kind: str) -> queue.Queue:
+        return self._interactive_queue if kind in self.interactive_kinds else self._queue
+
+    def _update_file(self, job_id: str, job_file: JobFile):
+        self._execute(
+            "UPDATE job_files SET status = ?, error = ?, result = ? WHERE job_id = ? AND idx = ?",
+            (job_file.status, job_file.error, json.dumps(job_file.result, default=str) if job_file.result is not None else None,
+             job_id, job_file.index),
+        )
+
+    def _recover(self):
+        """Queue again the jobs a previous process left queued or running"""
+        conn = self._connect()
+        try:
+            with conn:
+                # A file that was mid-processing starts over
+                conn.execute(
+                    "UPDATE job_files SET status = ? WHERE status = ? AND job_id IN (SELECT id FROM jobs WHERE status IN (?, ?))",
+                    (QUEUED, RUNNING, QUEUED, RUNNING),
+                )
+                ids = conn.execute(
+                    "SELECT id, kind FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)).fetchall()
+        finally:
+            conn.close()
+        for job_id, kind in ids:
+            self._queue_for(kind).put(job_id)
+        if ids:
+            logger.info("Resuming %d unfinished job(s)", len(ids))
+
+    def _worker(self, jobs: queue.Queue):
+        while True:
+            job_id = jobs.get()
+            try:
+                job = self.get(job_id)
+                if job is not None:
+                    self._run(job)
+            except Exception as e:
+                logger.exception("Job worker error: %s", e, extra={"job_id": job_id})
+            finally:
+                jobs.task_done()
+
+    def _run(self, job: Job):
+        # Keep the correlation id of the submitting request so the job's log events join up with it
+        with correlation(job.correlation_id):
+            job.status, job.started_at = RUNNING, job.started_at or time.time()
+            self._execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, job.started_at, job.id))
+            logger.info("Job started", extra={"job_id": job.id, "kind": job.kind, "files": len(job.files)})
+            job.emit("job_started", progress=job.progress())
+            try:
+                summary = self.run_job(job)
+                job.status, job.error = DONE, None
+            except Exception as e:
+                logger.exception("Job failed: %s", e, extra={"job_id": job.id})
+                summary, job.status, job.error = None, FAILED, str(e)
+            job.finished_at = time.time()
+            self._execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, summary = ? WHERE id = ?",
+                (job.status, job.finished_at, job.error, json.dumps(summary, default=str) if summary is not None else None, job.id),
+            )
+            logger.info("Job finished", extra={"job_id": job.id, "status": job.status, "progress": job.progress(),
+                                               "seconds": round(job.finished_at - job.started_at, 2)})
+            job.emit("job_finished", status=job.status, error=job.error, progress=job.progress(), summary=summary)
+            self.events.finish(job.id)
+
+    def join(self):
+        """Block until every queued job has run (tests and command-line use)"""
+        self._queue.join()
+        self._interactive_queue.join()
@@ -0,0 +1,133 @@
+# log_setup.py
+"""
+Structured, non-blocking logging.
+
+Modules log through ``logging.getLogger(__name__)``. ``configure_logging``
+puts a QueueHandler on the root logger so request threads only enqueue
+records; a QueueListener thread formats them as JSON lines and writes them
+to LOG_FILE (or stderr). DEBUG records (per-page events) are sampled at
+LOG_DEBUG_SAMPLE_RATE, and every record carries the correlation id of the
+request or document it belongs to.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import LOG_LEVEL, LOG_FILE, LOG_DEBUG_SAMPLE_RATE
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via ``extra=`` and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName", "correlation_id"}
+
+_listener = None
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+
+def set_correlation_id(correlation_id: str = None):
+    """Set the correlation id for the current context and return a token for reset_correlation_id"""
+    return _correlation_id.set(correlation_id or new_correlation_id())
+
+
+def reset_correlation_id(token):
+    _correlation_id.reset(token)
+
+
+@contextmanager
+def correlation(correlation_id: str = None):
+    """Run a block under its own correlation id (a new one unless given)"""
+    token = set_correlation_id(correlation_id)
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the correlation id and sample DEBUG records.
+
+    Runs in the calling thread, before the record is queued, so the context
+    variable is still visible.
+    """
+
+    def __init__(self, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0 and random.random() >= self.debug_sample_rate:
+            return False
+        record.correlation_id = _correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, correlation_id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        correlation_id = getattr(record, "correlation_id", None)
+        if correlation_id:
+            entry["correlation_id"] = correlation_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting (and the JSON encoding) to the listener thread"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        # Merge args and render tracebacks now: they may not be safe to touch from another thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: str = LOG_LEVEL, log_file: str = LOG_FILE, debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+    """Install the queue handler on the root logger (idempotent)"""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None:
+        return
+
+    target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler()
+    target.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(ContextFilter(debug_sample_rate))
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
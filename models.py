@@ -1,8 +1,71 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 import re
 
+# sticker_date placeholder for documents where the OD model found no sticker
+NOT_AVAILABLE = "Not Available"
+
+# One alternation instead of three separate searches: DD-MMM-YY(YY), MM/DD/YY(YY), YYYY-MM-DD
+_DATE_RE = re.compile(
+    r'\d{1,2}[\.\-/\s](?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[\.\-/\s](?:20)?\d{2}'
+    r'|\d{1,2}[\-/\.]\d{1,2}[\-/\.](?:20)?\d{2}'
+    r'|\d{4}[\-/\.]\d{1,2}[\-/\.]\d{1,2}',
+    re.IGNORECASE)
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+_SPECIAL_QUANTITIES = frozenset(['N/A', 'NA', 'NONE', 'NOT AVAILABLE'])
+
+
+# Cleaning rules applied by the InvoiceFields validators.
+# Each checks the already-clean case (int, float, digit-only string) first, which is the common one.
+def clean_identifier(v):
+    """Convert string to integer for invoice and store numbers"""
+    if type(v) is int:
+        return v
+    if isinstance(v, str):
+        if v.isdigit() and v.isascii():
+            return int(v)
+        # Keep only the digits (drops hyphens, '#', letters, whitespace)
+        cleaned = _NON_DIGIT_RE.sub('', v)
+        return int(cleaned) if cleaned else None
+    if isinstance(v, int):
+        return v
+    return None
+
+
+def clean_date(v):
+    """Validate date format"""
+    if not isinstance(v, str):
+        return v
+    v = v.strip()
+    if not v:
+        return None
+    if v == NOT_AVAILABLE:
+        return v
+    # Basic date validation - check if it looks like a date
+    return v if _DATE_RE.search(v) else None
+
+
+def clean_quantity(v):
+    """Validate quantity is a valid number (including negative) or preserve special values like 'N/A'"""
+    if type(v) is float:
+        return abs(v)
+    if isinstance(v, str):
+        v = v.strip()
+        if not v:
+            return None
+        # Check if it's a special value like 'N/A', 'NA', etc.
+        if v.upper() in _SPECIAL_QUANTITIES:
+            return v  # Preserve the original string value
+        # Try to convert to float for numeric validation
+        try:
+            return abs(float(v))  # Negative numbers become absolute values
+        except ValueError:
+            return None
+    if isinstance(v, (int, float)):
+        return float(abs(v))
+    return None
+
 
 class InvoiceFields(BaseModel):
     """Model for extracted invoice fields from OCR"""
@@ -16,75 +79,23 @@ class InvoiceFields(BaseModel):
     has_sticker: bool = Field(False, description="Whether sticker was detected")
     is_valid: str = Field("Invalid", description="Whether the document is valid or invalid")
 
-    @validator('invoice_number', 'store_number', pre=True)
+    @field_validator('invoice_number', 'store_number', mode='before')
+    @classmethod
     def validate_and_convert_to_integer(cls, v):
         """Convert string to integer for invoice and store numbers"""
-        if v is None or v == "" or (isinstance(v, str) and v.strip() == ""):
-            return None
-        if isinstance(v, str):
-            # Remove any non-digit characters except hyphens, then remove hyphens
-            cleaned = re.sub(r'[^0-9\-]', '', v)
-            cleaned = cleaned.replace('-', '')  # Remove hyphens
-            if cleaned:
-                try:
-                    return int(cleaned)
-                except ValueError:
-                    pass
-        elif isinstance(v, int):
-            return v
-        return None
+        return clean_identifier(v)
 
-    @validator('invoice_date', 'sticker_date')
-    def validate_date_fields(cls, v): 
-        """Validate date format"""
-        if v is None or v == "" or (isinstance(v, str) and v.strip() == ""):
-            return None
-        
-        if isinstance(v, str):
-            v = v.strip()
-            if not v:
-                return None
-            
-            # Basic date validation - check if it looks like a date
-            date_patterns = [
-                r'\d{1,2}[\.\-/\s](?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[\.\-/\s](?:20)?\d{2}',
-                r'\d{1,2}[\-/\.]\d{1,2}[\-/\.](?:20)?\d{2}',
-                r'\d{4}[\-/\.]\d{1,2}[\-/\.]\d{1,2}'
-            ]
-            
-            is_valid_date = any(re.search(pattern, v, re.IGNORECASE) for pattern in date_patterns)
-            if not is_valid_date:
-                return None
-            return v
-        return v
+    @field_validator('invoice_date', 'sticker_date')
+    @classmethod
+    def validate_date_fields(cls, v):
+        """Validate date format ("Not Available" is kept as-is)"""
+        return clean_date(v)
 
-    @validator('total_quantity')
+    @field_validator('total_quantity')
+    @classmethod
     def validate_quantity(cls, v):
         """Validate quantity is a valid number (including negative) or preserve special values like 'N/A'"""
-        if v is None or v == "" or (isinstance(v, str) and v.strip() == ""):
-            return None
-        
-        if isinstance(v, str):
-            v = v.strip()
-            if not v:
-                return None
-            # Check if it's a special value like 'N/A', 'NA', etc.
-            if v.upper() in ['N/A', 'NA', 'NONE', 'NOT AVAILABLE']:
-                return v  # Preserve the original string value
-            
-            # Try to convert to float for numeric validation
-            try:
-                v_float = float(v)
-                # Convert negative numbers to absolute values
-                v_float = abs(v_float)
-                return v_float
-            except ValueError:
-                return None
-        elif isinstance(v, (int, float)):
-            # Convert negative numbers to absolute values
-            v = abs(v)
-            return float(v)
-        return None
+        return clean_quantity(v)
 
 
 class PageResult(BaseModel):
@@ -92,6 +103,10 @@ class PageResult(BaseModel):
     page: int = Field(..., description="Page number")
     page_fields: InvoiceFields = Field(..., description="Fields extracted from this page")
     updates_applied: Dict[str, str] = Field(..., description="Which fields were updated from this page")
+    ocr_skipped: bool = Field(False, description="Whether OCR was skipped for this page")
+    skip_reason: Optional[str] = Field(None, description="Why OCR was skipped for this page")
+    content_stats: Optional[Dict[str, float]] = Field(None, description="Page content gate measurements")
+    duplicate_of: Optional[str] = Field(None, description="Page whose OCR text was reused (e.g. 'file.pdf#2')")
 
 
 class OCRResult(BaseModel):
@@ -103,6 +118,15 @@ class OCRResult(BaseModel):
     page_details: List[PageResult] = Field(..., description="Detailed results for each page")
     processing_status: str = Field("Success", description="Processing status")
     error_message: str = Field("", description="Error message if processing failed")
+    pages_skipped: int = Field(0, description="Number of pages that skipped OCR")
+    pages_reused: int = Field(0, description="Number of pages that reused OCR text from a near-duplicate page")
+    detections_reused_from: Optional[str] = Field(None, description="Page whose OD detections were reused")
+    detected_classes: List[str] = Field(default_factory=list, description="Classes detected by the OD model on the first page")
+    route: str = Field("ocr", description="Routing outcome from the OD-driven policy ('ocr' or 'skip_ocr')")
+    route_reason: Optional[str] = Field(None, description="Why the routing policy skipped OCR")
+    ocr_calls: int = Field(0, description="Number of Vision API calls made")
+    od_seconds: float = Field(0.0, description="Time spent in object detection")
+    ocr_seconds: float = Field(0.0, description="Time spent in OCR and field extraction")
     sticker_flag: Optional[bool] = Field(None, description="Sticker detection flag from Object Detection model")
     signature_flag: Optional[bool] = Field(None, description="Signature detection flag from Object Detection model")
 
@@ -124,7 +148,7 @@ class ExcelRow(BaseModel):
 
     @classmethod
     def from_ocr_result(cls, result: OCRResult, sticker_flag: bool):
-        """Create ExcelRow from OCRResult"""
+        """Create ExcelRow from OCRResult (ExcelRow has no Python validators, so this validation is cheap)"""
         return cls(
             filename=result.filename,
             invoice_number=result.master_fields.invoice_number,
@@ -0,0 +1,184 @@
+# ocr_archive.py
+"""
+Columnar archive of raw OCR output.
+
+Every OCR'd page is stored with its full text and Vision word boxes, the OD
+flags of its document and the document-level fields extracted at the time, so
+that reextract.py can rerun the current extraction engine over historic
+documents without calling Vision again.
+
+The archive is a directory of zstd-compressed Parquet part files. All pages of
+a document are written to the same part file, which makes a part file the
+unit of work for parallel re-extraction.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import OCR_ARCHIVE_ENABLED, OCR_ARCHIVE_DIR, OCR_ARCHIVE_PART_ROWS
+from spatial_extractor import Word
+
+logger = logging.getLogger(__name__)
+
+# Document-level fields derived from OCR text (has_signature/has_sticker come from the OD flags)
+ARCHIVED_FIELDS = ["invoice_number", "store_number", "invoice_date", "sticker_date", "total_quantity", "has_frito_lay"]
+
+SCHEMA = pa.schema([
+    ("document_id", pa.string()),
+    ("filename", pa.string()),
+    ("archived_at", pa.float64()),
+    ("page", pa.int32()),
+    ("sticker_flag", pa.bool_()),
+    ("signature_flag", pa.bool_()),
+    ("full_text", pa.string()),
+    ("word_text", pa.list_(pa.string())),
+    ("word_boxes", pa.list_(pa.int32())),  # x0, y0, x1, y1 per word
+    ("duplicate_of", pa.string()),
+    ("invoice_number", pa.int64()),
+    ("store_number", pa.int64()),
+    ("invoice_date", pa.string()),
+    ("sticker_date", pa.string()),
+    ("total_quantity", pa.string()),  # float or special values such as "N/A"
+    ("has_frito_lay", pa.bool_()),
+])
+
+# Columns reextract needs (everything but the bookkeeping ones)
+READ_COLUMNS = [name for name in SCHEMA.names if name != "duplicate_of"]
+
+
+def field_values(fields) -> dict:
+    """Archived representation of the document-level fields of an InvoiceFields"""
+    values = {name: getattr(fields, name) for name in ARCHIVED_FIELDS}
+    if values["total_quantity"] is not None:
+        values["total_quantity"] = str(values["total_quantity"])
+    return values
+
+
+def words_from_columns(word_text, word_boxes) -> list:
+    """Rebuild Word tuples from the archived word_text/word_boxes lists"""
+    if not word_text:
+        return []
+    return [
+        Word(text, word_boxes[i], word_boxes[i + 1], word_boxes[i + 2], word_boxes[i + 3])
+        for text, i in zip(word_text, range(0, len(word_boxes), 4))
+    ]
+
+
+class OCRArchive:
+    """Append-only Parquet archive of per-page OCR output"""
+
+    def __init__(self, root=OCR_ARCHIVE_DIR, part_rows: int = OCR_ARCHIVE_PART_ROWS):
+        self.root = Path(root)
+        self.part_rows = part_rows
+        self.parts_written = 0
+        self._columns = {name: [] for name in SCHEMA.names}
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        """Archive configured from config.py, or None when archiving is disabled"""
+        if not OCR_ARCHIVE_ENABLED:
+            return None
+        return cls()
+
+    def add_document(self, result, pages: list):
+        """Buffer the OCR'd pages of one document.
+
+        ``pages`` is a list of (page, full_text, words, duplicate_of) tuples;
+        ``result`` is the document's OCRResult.
+        """
+        if not pages:
+            return
+        document_id = uuid.uuid4().hex
+        archived_at = time.time()
+        fields = field_values(result.master_fields)
+
+        with self._lock:
+            columns = self._columns
+            for page, full_text, words, duplicate_of in pages:
+                columns["document_id"].append(document_id)
+                columns["filename"].append(result.filename)
+                columns["archived_at"].append(archived_at)
+                columns["page"].append(page)
+                columns["sticker_flag"].append(bool(result.sticker_flag))
+                columns["signature_flag"].append(bool(result.signature_flag))
+                columns["full_text"].append(full_text)
+                columns["word_text"].append([w.text for w in words])
+                columns["word_boxes"].append([int(c) for w in words for c in (w.x0, w.y0, w.x1, w.y1)])
+                columns["duplicate_of"].append(duplicate_of)
+                for name, value in fields.items():
+                    columns[name].append(value)
+            self._rows += len(pages)
+
+            # Only flush at document boundaries so a document never spans part files
+            if self._rows >= self.part_rows:
+                self._flush_locked()
+
+    def flush(self):
+        """Write buffered pages to a new part file"""
+        with self._lock:
+            self._flush_locked()
+
+    close = flush
+
+    def _flush_locked(self):
+        if not self._rows:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        table = pa.table(self._columns, schema=SCHEMA)
+        name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = self.root / f".{name}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        # Readers never see a half-written part file
+        os.replace(tmp_path, self.root / name)
+
+        logger.info("Archived OCR text for %d page(s) to %s", self._rows, self.root / name)
+        self.parts_written += 1
+        self._columns = {name: [] for name in SCHEMA.names}
+        self._rows = 0
+
+
+def part_files(root=OCR_ARCHIVE_DIR) -> list:
+    """Part files of an archive, oldest first"""
+    root = Path(root)
+    if not root.exists():
+        return []
+    return sorted(str(p) for p in root.glob("part-*.parquet"))
+
+
+def iter_documents(path: str):
+    """Yield one dict per archived document in a part file.
+
+    Each dict carries document_id, filename, archived_at, sticker_flag,
+    signature_flag, the archived ``fields`` and ``pages`` as
+    (page, full_text, words) tuples in page order.
+    """
+    data = pq.read_table(path, columns=READ_COLUMNS).to_pydict()
+    ids = data["document_id"]
+    n = len(ids)
+    start = 0
+    while start < n:
+        end = start
+        while end < n and ids[end] == ids[start]:
+            end += 1
+        pages = sorted((
+            (data["page"][i], data["full_text"][i], words_from_columns(data["word_text"][i], data["word_boxes"][i]))
+            for i in range(start, end)
+        ), key=lambda page: page[0])
+        yield {
+            "document_id": ids[start],
+            "filename": data["filename"][start],
+            "archived_at": data["archived_at"][start],
+            "sticker_flag": data["sticker_flag"][start],
+            "signature_flag": data["signature_flag"][start],
+            "fields": {name: data[name][start] for name in ARCHIVED_FIELDS},
+            "pages": pages,
+        }
+        start = end
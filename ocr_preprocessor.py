@@ -6,428 +6,317 @@ import re
 import cv2
 import numpy as np
 import io
+import logging
 import os
-import pandas as pd
-from datetime import datetime
-import openpyxl
-from openpyxl.styles import Alignment
-from pathlib import Path
-from config import SERVICE_ACCOUNT_PATH, INFERENCE_OUTPUT_DIR
-from models import InvoiceFields, PageResult, OCRResult, ExcelRow
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+from config import SERVICE_ACCOUNT_PATH
+from models import InvoiceFields, PageResult, OCRResult, NOT_AVAILABLE
+from payload_encoder import PayloadEncoder
+from page_gate import PageContentGate
+from field_extractor import extract_fields, convert_date_format, empty_fields, combine_fields, found_fields
+from date_normalizer import month_to_number
+from spatial_extractor import words_from_annotations
+
+logger = logging.getLogger(__name__)
 
 # Initialize client with credentials
 credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH)
 client = vision.ImageAnnotatorClient(credentials=credentials)
 
+@dataclass(slots=True)
+class OCRPage:
+    """One page after its OCR step (gate, near-duplicate lookup, Vision request), before field extraction"""
+    page: int
+    image_path: str
+    skip_reason: Optional[str] = None
+    content_stats: object = None
+    full_text: Optional[str] = None
+    words: list = None
+    duplicate_of: Optional[str] = None
+    ocr_called: bool = False
+    error: Optional[str] = None
+    # Only while the Vision request is in flight
+    page_hash: tuple = None
+    ocr: Optional[Future] = None
+
+
 class OCRProcessor:
-    def __init__(self):
+    def __init__(self, payload_encoder: PayloadEncoder = None, page_gate: PageContentGate = None):
         self.client = vision.ImageAnnotatorClient(credentials=credentials)
+        self.payload_encoder = payload_encoder or PayloadEncoder.from_config()
+        self.page_gate = page_gate or PageContentGate.from_config()
+        # Bytes read from disk vs bytes actually uploaded to Vision
+        self.payload_bytes_in = 0
+        self.payload_bytes_out = 0
+        self._payload_lock = threading.Lock()
 
-    def extract_invoice_fields(self, full_text: str, signature_flag: bool, has_sticker: bool = False, is_valid: str = "Invalid") -> InvoiceFields:
-        lines = [line.strip() for line in full_text.splitlines() if line.strip()]
+    def extract_invoice_fields(self, full_text: str, signature_flag: bool, has_sticker: bool = False, is_valid: str = "Invalid",
+                               words: list = None) -> InvoiceFields:
+        """Extract invoice fields from OCR text, using Vision word boxes when given (see field_extractor)"""
+        return extract_fields(full_text, signature_flag, has_sticker, convert_date=self._convert_date_format, words=words)
 
-        def first_match(patterns, text, flags=re.IGNORECASE):
-            for p in patterns:
-                m = re.search(p, text, flags)
-                if m:
-                    return m.group(1) if m.lastindex else m.group(0)
-            return None
-
-        # Improved invoice number patterns - more specific to avoid false matches
-        invoice_patterns = [
-            r"\bDOCUMENT\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b",  # Document first
-            r"\bINVOICE\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b(?!\s+DATE)",  # Avoid matching "Invoice Date"
-            r"\bINV\s*(?:NO\.?|#)?\s*[:\-]?\s*([A-Z0-9\-]+)\b",
-        ]
-        invoice_number = first_match(invoice_patterns, full_text)
+    def _convert_date_format(self, date_str: str, year_first: bool = False) -> str:
+        """Convert various date formats to MM/DD/YYYY"""
+        return convert_date_format(date_str, year_first=year_first)
 
-        # Store patterns - only match "Store Number: 2516" format
-        store_patterns = [
-            r"\bSTORE\s*(?:NUMBER|NO\.?)\s*[:\-]?\s*([A-Z0-9\-]{2,})\b",
-        ]
-        store_number = first_match(store_patterns, full_text)
+    def _month_to_number(self, month: str) -> int:
+        """Convert month name to number"""
+        return month_to_number(month)
 
-        # Improved date patterns - prioritize MM/DD/YYYY format
-        invoice_date_patterns = [
-            r"\b(?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])[/\-\.](?:20)?\d{2}\b",  # MM/DD/YYYY
-            r"\b(?:0?[1-9]|[12][0-9]|3[01])[\.\-/\s](?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[\.\-/\s](?:20)?\d{2}\b",  # DD/MMM/YYYY
-            r"\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+(?:0?[1-9]|[12][0-9]|3[01]),?\s+(?:20)?\d{2}\b",  # MMM DD, YYYY
-            r"\b(?:20)?\d{2}[/\-\.](?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])\b",  # YYYY/MM/DD
-        ]
+    def _detect_text(self, image_path: str, page_image=None):
+        """Send one page to Vision and return its text annotations"""
+        # Read and (optionally) re-encode the page for upload
+        content = self.payload_encoder.encode_file(image_path, page_image)
+        with self._payload_lock:
+            self.payload_bytes_in += os.path.getsize(image_path)
+            self.payload_bytes_out += len(content)
         
-        invoice_date = None
-        for pattern in invoice_date_patterns:
-            match = re.search(pattern, full_text, flags=re.IGNORECASE)
-            if match:
-                invoice_date = match.group(0)
-                # Convert DD.MMM.YYYY format to MM/DD/YYYY format
-                invoice_date = self._convert_date_format(invoice_date)
-                break
-
-        # Enhanced sticker date pattern to match the same formats as invoice_date
-        # Only extract sticker date if OD model detected a sticker
-        sticker_date = None
-        if has_sticker:
-            sticker_date_patterns = [
-                r"\b(?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])[/\-\.](?:20)?\d{2}\b",  # MM/DD/YYYY
-                r"\b(?:0?[1-9]|[12][0-9]|3[01])[\.\-/\s](?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[\.\-/\s](?:20)?\d{2}\b",  # DD/MMM/YYYY
-                r"\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+(?:0?[1-9]|[12][0-9]|3[01]),?\s+(?:20)?\d{2}\b",  # MMM DD, YYYY
-                r"\b(?:20)?\d{2}[/\-\.](?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])\b",  # YYYY/MM/DD
-            ]
-            
-            for pattern in sticker_date_patterns:
-                match = re.search(pattern, full_text, flags=re.IGNORECASE)
-                if match:
-                    sticker_date = match.group(0)
-                    # Convert sticker date format as well
-                    sticker_date = self._convert_date_format(sticker_date)
-                    break
-
-        # Improved quantity patterns
-        total_qty = None
-        total_qty_patterns = [
-            r"\bTOTAL\s*(?:QTY|QUANTITY)\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
-            r"\b(?:QTY|QUANTITY)\s*TOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
-            r"\bTOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\s*(?:QTY|QUANTITY)\b",
-            r"\bTOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
-            r"\b(?:QTY|QUANTITY)\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
-            r"\bAMOUNT\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
-            r"\bTOTAL\s*EACHES\s*SOLD\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",  # Handle "TOTAL EACHES SOLD: 80"
-        ]
+        # Create image object
+        image = vision.Image(content=content)
         
-        # First try to find quantity in lines containing quantity keywords
-        for line in lines:
-            if re.search(r"\b(QTY|QUANTITY|TOTAL|AMOUNT)\b", line, re.IGNORECASE):
-                candidate = first_match(total_qty_patterns, line)
-                if candidate:
-                    try:
-                        # Remove commas and convert to float
-                        total_qty = float(candidate.replace(',', ''))
-                        break
-                    except ValueError:
-                        continue
-
-        # If no quantity found in specific lines, search the entire text
-        if total_qty is None:
-            candidate = first_match(total_qty_patterns, full_text)
-            if candidate:
-                try:
-                    total_qty = float(candidate.replace(',', ''))
-                except ValueError:
-                    pass
-
-        # Check for Frito-Lay presence
-        has_frito_lay = bool(re.search(r"\bFRITO\s*LAY\b", full_text, re.IGNORECASE))
-
-        # Check for signature presence (from OCR text)
-        has_signature = signature_flag
-
-        # Check for sticker presence (from OD model)
-        has_sticker = has_sticker
-
-        # Determine validity based on sticker presence
-        is_valid = "Valid" if has_sticker else "Invalid"
-
-        return InvoiceFields(
-            invoice_number=invoice_number,
-            store_number=store_number,
-            invoice_date=invoice_date,
-            sticker_date=sticker_date,
-            total_quantity=total_qty,
-            has_frito_lay=has_frito_lay,
-            has_signature=has_signature,
-            has_sticker=has_sticker,
-            is_valid=is_valid
-        )
-
-    def _convert_date_format(self, date_str: str) -> str:
-        """Convert various date formats to MM/DD/YYYY"""
-        if not date_str:
-            return date_str
-
-        # Handle DD.MMM.YYYY format (e.g., "04.Jul.2025")
-        dd_mmm_yyyy_pattern = r"(\d{1,2})\.(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.(\d{4})"
-        match = re.match(dd_mmm_yyyy_pattern, date_str, re.IGNORECASE)
-        if match:
-            day, month, year = match.groups()
-            month_num = self._month_to_number(month)
-            print(f"DD.MMM.YYYY pattern matched: day={day}, month={month}, year={year}")
-            result = f"{month_num:02d}/{int(day):02d}/{year}"
-            print(f"DD.MMM.YYYY conversion result: {result}")
-            return result
-
-        # Handle MM/DD/YYYY format
-        mm_dd_yyyy_pattern = r"(\d{1,2})/(\d{1,2})/(\d{4})"
-        match = re.match(mm_dd_yyyy_pattern, date_str)
-        if match:
-            month, day, year = match.groups()
-            # Check if this might actually be DD/MM/YYYY
-            if int(month) > 12 and int(day) <= 12:
-                # This is likely DD/MM/YYYY, convert to MM/DD/YYYY
-                result = f"{int(day):02d}/{int(month):02d}/{year}"
-            else:
-                # This is MM/DD/YYYY, ensure two-digit format
-                result = f"{int(month):02d}/{int(day):02d}/{year}"
-            print(f"MM/DD/YYYY pattern matched: month={month}, day={day}, year={year}")
-            print(f"MM/DD/YYYY formatting result: {result}")
-            return result
+        # Perform OCR
+        response = self.client.text_detection(image=image)
+        
+        if response.error.message:
+            raise Exception(
+                '{}\nFor more info on error messages, check: '
+                'https://cloud.google.com/apis/design/errors'.format(
+                    response.error.message))
+        
+        return response.text_annotations
 
-        # Handle DD/MM/YYYY format
-        dd_mm_yyyy_pattern = r"(\d{1,2})/(\d{1,2})/(\d{4})"
-        match = re.match(dd_mm_yyyy_pattern, date_str)
-        if match:
-            day, month, year = match.groups()
-            # Check if this might actually be MM/DD/YYYY
-            if int(day) > 12 and int(month) <= 12:
-                # This is likely MM/DD/YYYY, convert to DD/MM/YYYY
-                result = f"{int(month):02d}/{int(day):02d}/{year}"
-            else:
-                # This is DD/MM/YYYY, convert to MM/DD/YYYY
-                result = f"{int(month):02d}/{int(day):02d}/{year}"
-            print(f"DD/MM/YYYY pattern matched: day={day}, month={month}, year={year}")
-            print(f"DD/MM/YYYY formatting result: {result}")
-            return result
+    def process_images(self, image_paths: list, filename: str, sticker_flag: bool = False, signature_flag: bool = False,
+                       page_index=None, archive=None, progress=None, page_pool=None) -> OCRResult:
+        """Process multiple images and return combined results.
 
-        # Handle YYYY-MM-DD format
-        yyyy_mm_dd_pattern = r"(\d{4})-(\d{1,2})-(\d{1,2})"
-        match = re.match(yyyy_mm_dd_pattern, date_str)
-        if match:
-            year, month, day = match.groups()
-            result = f"{int(month):02d}/{int(day):02d}/{year}"
-            print(f"YYYY-MM-DD pattern matched: year={year}, month={month}, day={day}")
-            print(f"YYYY-MM-DD formatting result: {result}")
-            return result
+        ``page_index`` is an optional per-batch PageHashIndex used to reuse OCR text of near-duplicate pages.
+        ``archive`` is an optional OCRArchive that keeps the raw OCR output for later re-extraction.
+        ``progress`` is an optional ``progress(stage, **fields)`` callback told when each page is OCR'd and extracted.
+        ``page_pool`` is an optional PagePool (see document_scheduler): up to ``page_pool.size`` pages have their
+        Vision request in flight at once.
+        """
+        pages = self.ocr_pages(image_paths, filename, page_index=page_index, progress=progress, page_pool=page_pool)
+        return self.extract_pages(pages, filename, sticker_flag, signature_flag, archive=archive, progress=progress)
 
-        # If no pattern matches, return as is
-        print(f"Date conversion: {date_str} -> {date_str}")
-        return date_str
+    def ocr_pages(self, image_paths: list, filename: str, page_index=None, progress=None, page_pool=None) -> list:
+        """OCR step of process_images: an OCRPage per image, in page order.
 
-    def _month_to_number(self, month: str) -> int:
-        """Convert month name to number"""
-        month_map = {
-            'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-            'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-        }
-        return month_map.get(month.lower(), 1)
+        Blank pages are gated out and near-duplicates reuse earlier text; the
+        remaining pages go to Vision, up to ``page_pool.size`` at once when a
+        pool is given (otherwise one after the other).
+        """
+        logger.info("OCR started", extra={"document": filename, "pages": len(image_paths)})
+        pages = []
+        # Pages whose Vision request may still be running, in page order
+        window = page_pool.size if page_pool is not None else 0
+        in_flight = deque()
+        for i, image_path in enumerate(image_paths):
+            in_flight.append(self._start_page(i + 1, image_path, page_index, page_pool))
+            while len(in_flight) > window:
+                pages.append(self._finish_page(in_flight.popleft(), filename, page_index, progress))
+        while in_flight:
+            pages.append(self._finish_page(in_flight.popleft(), filename, page_index, progress))
+        return pages
 
-    def process_images(self, image_paths: list, filename: str, sticker_flag: bool = False, signature_flag: bool = False) -> OCRResult:
-        """Process multiple images and return combined results"""
-        print(f"process_images called with {len(image_paths)} images, filename: {filename}, sticker_flag: {sticker_flag}, signature_flag: {signature_flag}")
+    def extract_pages(self, pages: list, filename: str, sticker_flag: bool = False, signature_flag: bool = False,
+                      archive=None, progress=None) -> OCRResult:
+        """Extraction step of process_images: fields per OCRPage, combined into the document's OCRResult"""
         all_fields = []
         page_results = []
+        pages_skipped = 0
+        pages_reused = 0
+        ocr_calls = 0
+        # (page, full_text, words, duplicate_of) for the OCR archive; full_text is None when OCR did not run
+        archived_pages = []
         
-        for i, image_path in enumerate(image_paths):
+        for ocr_page in pages:
+            i = ocr_page.page - 1
+            ocr_calls += ocr_page.ocr_called
+            if ocr_page.error is not None:
+                # The OCR step failed for this page (and logged why)
+                all_fields.append(self._empty_fields(signature_flag, sticker_flag))
+                page_results.append(PageResult(page=i + 1, page_fields=all_fields[-1], updates_applied={}))
+                archived_pages.append((i + 1, None, [], None))
+                continue
             try:
-                # Read image
-                with open(image_path, 'rb') as image_file:
-                    content = image_file.read()
-                
-                # Create image object
-                image = vision.Image(content=content)
-                
-                # Perform OCR
-                response = self.client.text_detection(image=image)
-                
-                if response.error.message:
-                    raise Exception(
-                        '{}\nFor more info on error messages, check: '
-                        'https://cloud.google.com/apis/design/errors'.format(
-                            response.error.message))
-                
-                # Extract text
-                texts = response.text_annotations
-                if texts:
-                    full_text = texts[0].description
-                    
+                # Blank backs / separator sheets were not sent to Vision
+                if ocr_page.skip_reason:
+                    skipped_fields = self._empty_fields(signature_flag, sticker_flag)
+                    all_fields.append(skipped_fields)
+                    page_results.append(PageResult(
+                        page=i + 1,
+                        page_fields=skipped_fields,
+                        updates_applied={},
+                        ocr_skipped=True,
+                        skip_reason=ocr_page.skip_reason,
+                        content_stats=ocr_page.content_stats.to_dict()
+                    ))
+                    pages_skipped += 1
+                    archived_pages.append((i + 1, None, [], None))
+                    continue
+
+                full_text, words, duplicate_of = ocr_page.full_text, ocr_page.words, ocr_page.duplicate_of
+                pages_reused += duplicate_of is not None
+                archived_pages.append((i + 1, full_text, words, duplicate_of))
+
+                if full_text:
                     # Extract fields for this page
-                    page_fields = self.extract_invoice_fields(full_text, signature_flag, sticker_flag)
+                    page_fields = self.extract_invoice_fields(full_text, signature_flag, sticker_flag, words=words)
                     all_fields.append(page_fields)
                     
                     # Create page result
-                    page_result = PageResult(
-                        page=i + 1,
-                        page_fields=page_fields,
-                        updates_applied={}  # You can add update tracking here
-                    )
-                    page_results.append(page_result)
+                    page_results.append(PageResult(page=i + 1, page_fields=page_fields, updates_applied={},
+                                                   duplicate_of=duplicate_of))
                     
                 else:
                     # No text found
-                    empty_fields = InvoiceFields(
-                        invoice_number=None,
-                        store_number=None,
-                        invoice_date=None,
-                        sticker_date=None,
-                        total_quantity=None,
-                        has_frito_lay=False,
-                        has_signature=signature_flag,
-                        has_sticker=sticker_flag,
-                        is_valid="Invalid"
-                    )
-                    all_fields.append(empty_fields)
-                    
-                    page_result = PageResult(
-                        page=i + 1,
-                        page_fields=empty_fields,
-                        updates_applied={}
-                    )
-                    page_results.append(page_result)
+                    no_text_fields = self._empty_fields(signature_flag, sticker_flag)
+                    all_fields.append(no_text_fields)
+                    page_results.append(PageResult(page=i + 1, page_fields=no_text_fields, updates_applied={},
+                                                   duplicate_of=duplicate_of))
+                
+                if progress is not None:
+                    progress("extracted", page=i + 1, fields_found=self._get_found_fields(all_fields[-1]))
                     
             except Exception as e:
-                print(f"Error processing image {image_path}: {e}")
+                logger.error("Error processing image %s: %s", ocr_page.image_path, e, extra={"document": filename, "page": i + 1})
+                if not archived_pages or archived_pages[-1][0] != i + 1:
+                    archived_pages.append((i + 1, None, [], None))
                 # Create error page result
-                error_fields = InvoiceFields(
-                    invoice_number=None,
-                    store_number=None,
-                    invoice_date=None,
-                    sticker_date=None,
-                    total_quantity=None,
-                    has_frito_lay=False,
-                    has_signature=signature_flag,
-                    has_sticker=sticker_flag,
-                    is_valid="Invalid"
-                )
+                error_fields = self._empty_fields(signature_flag, sticker_flag)
                 all_fields.append(error_fields)
-                
-                page_result = PageResult(
-                    page=i + 1,
-                    page_fields=error_fields,
-                    updates_applied={}
-                )
-                page_results.append(page_result)
+                page_results.append(PageResult(page=i + 1, page_fields=error_fields, updates_applied={}))
         
         # Combine fields from all pages
         master_fields = self._combine_fields(all_fields)
         
         # Set sticker_date to "Not Available" if no sticker detected
         if not sticker_flag:
-            master_fields.sticker_date = "Not Available"
+            master_fields.sticker_date = NOT_AVAILABLE
         
         # Create final result
         result = OCRResult(
             filename=filename,
-            total_pages=len(image_paths),
+            total_pages=len(pages),
             master_fields=master_fields,
             fields_found=self._get_found_fields(master_fields),
             page_details=page_results,
             processing_status="Success",
             error_message="",
+            pages_skipped=pages_skipped,
+            pages_reused=pages_reused,
+            ocr_calls=ocr_calls,
             sticker_flag=sticker_flag,
             signature_flag=signature_flag
         )
         
-        print(f"OCRResult created successfully: {result.filename}, status: {result.processing_status}")
-        print(f"Master fields: {result.master_fields}")
+        if archive is not None:
+            archive.add_document(result, archived_pages)
+        
+        logger.info("OCR finished", extra={"document": result.filename, "status": result.processing_status,
+                                           "ocr_calls": ocr_calls, "pages_skipped": pages_skipped,
+                                           "pages_reused": pages_reused, "fields_found": result.fields_found,
+                                           "sticker_flag": sticker_flag, "signature_flag": signature_flag})
         
         return result
 
-    def _combine_fields(self, all_fields: list) -> InvoiceFields:
-        """Combine fields from multiple pages, prioritizing non-None values"""
-        if not all_fields:
-            return InvoiceFields()
-        
-        # Start with the first set of fields
-        combined = all_fields[0]
-        
-        # Update with non-None values from other pages
-        for fields in all_fields[1:]:
-            if fields.invoice_number and not combined.invoice_number:
-                combined.invoice_number = fields.invoice_number
-            if fields.store_number and not combined.store_number:
-                combined.store_number = fields.store_number
-            if fields.invoice_date and not combined.invoice_date:
-                combined.invoice_date = fields.invoice_date
-            if fields.sticker_date and not combined.sticker_date:
-                combined.sticker_date = fields.sticker_date
-            if fields.total_quantity is not None and combined.total_quantity is None:
-                combined.total_quantity = fields.total_quantity
-            if fields.has_frito_lay and not combined.has_frito_lay:
-                combined.has_frito_lay = fields.has_frito_lay
-            if fields.has_signature and not combined.has_signature:
-                combined.has_signature = fields.has_signature
-            if fields.has_sticker and not combined.has_sticker:
-                combined.has_sticker = fields.has_sticker
-        
-        return combined
+    def _start_page(self, page: int, image_path, page_index, page_pool) -> OCRPage:
+        """Decode the page, gate it and look it up in the page index; submit its Vision request if it still needs one"""
+        ocr_page = OCRPage(page, str(image_path))
+        try:
+            # Decode once - the content gate and the payload encoder share the pixels
+            page_image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
 
-    def _get_found_fields(self, fields: InvoiceFields) -> list:
-        """Get list of fields that were successfully extracted"""
-        found = []
-        if fields.invoice_number:
-            found.append('invoice_number')
-        if fields.store_number:
-            found.append('store_number')
-        if fields.invoice_date:
-            found.append('invoice_date')
-        if fields.sticker_date and fields.sticker_date != "Not Available":
-            found.append('sticker_date')
-        if fields.total_quantity is not None:
-            found.append('total_quantity')
-        if fields.has_frito_lay:
-            found.append('has_frito_lay')
-        if fields.has_signature:
-            found.append('has_signature')
-        if fields.has_sticker:
-            found.append('has_sticker')
-        if fields.is_valid:
-            found.append('is_valid')
-        return found
+            if page_image is not None:
+                ocr_page.skip_reason, ocr_page.content_stats = self.page_gate.check(page_image)
+                if ocr_page.skip_reason:
+                    return ocr_page
 
-    def save_to_excel(self, result: OCRResult, filename: str, sticker_flag: bool):
-        """Save OCR results to Excel file"""
-        try:
-            # Create output directory if it doesn't exist
-            output_dir = Path(INFERENCE_OUTPUT_DIR)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Use consistent filename
-            excel_path = output_dir / "target_results.xlsx"
-            
-            # Create Excel row
-            excel_row = ExcelRow.from_ocr_result(result, sticker_flag)
-            
-            # Convert to dictionary
-            row_dict = excel_row.model_dump()
-            
-            # Convert boolean values to strings to avoid Excel TRUE/FALSE
-            for key, value in row_dict.items():
-                if isinstance(value, bool):
-                    if key == 'has_sticker':
-                        row_dict[key] = "Yes" if value else "No"
-                    elif key == 'has_signature':
-                        row_dict[key] = "Yes" if value else "No"
-                    elif key == 'has_frito_lay':
-                        row_dict[key] = "Yes" if value else "No"
-                    else:
-                        row_dict[key] = "Yes" if value else "No"
-            
-            # Check if file exists
-            if excel_path.exists():
+            # Reuse the OCR text of a near-duplicate page processed earlier in this batch
+            if page_index is not None and page_image is not None:
+                ocr_page.page_hash = page_index.hash_page(page_image)
+                match = page_index.lookup(ocr_page.page_hash, "full_text")
+                if match:
+                    ocr_page.full_text = match["full_text"]
+                    ocr_page.words = match.get("words") or []
+                    ocr_page.duplicate_of = match["source"]
+                    page_index.reused += 1
+                    return ocr_page
+
+            ocr_page.ocr_called = True
+            if page_pool is not None:
+                ocr_page.ocr = page_pool.submit(self._detect_text, image_path, page_image)
+            else:
+                ocr_page.ocr = Future()
                 try:
-                    # Read existing data
-                    existing_df = pd.read_excel(excel_path)
-                    
-                    # Append new data
-                    new_df = pd.DataFrame([row_dict])
-                    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                    
-                    # Remove duplicates based on filename
-                    combined_df = combined_df.drop_duplicates(subset=['filename'], keep='last')
-                    
-                    # Save combined data
-                    combined_df.to_excel(excel_path, index=False)
-                    print(f"Data for {filename} successfully saved to {excel_path}")
-                    
+                    ocr_page.ocr.set_result(self._detect_text(image_path, page_image))
                 except Exception as e:
-                    print(f"Error reading existing file, creating new one: {e}")
-                    df = pd.DataFrame([row_dict])
-                    df.to_excel(excel_path, index=False)
-                    print(f"Created new file with data for {filename}")
-            else:
-                # Create new file
-                df = pd.DataFrame([row_dict])
-                df.to_excel(excel_path, index=False)
-                print(f"Created new file with data for {filename}")
-                
+                    ocr_page.ocr.set_exception(e)
+        except Exception as e:
+            ocr_page.error = str(e) or type(e).__name__
+        return ocr_page
+
+    def _finish_page(self, ocr_page: OCRPage, filename: str, page_index, progress) -> OCRPage:
+        """Wait for the page's Vision request and record its text in the page index"""
+        page = ocr_page.page
+        try:
+            if ocr_page.error is not None:
+                pass
+            elif ocr_page.skip_reason:
+                logger.debug("Skipping OCR for page: %s", ocr_page.skip_reason, extra={"document": filename, "page": page})
+            elif ocr_page.duplicate_of is not None:
+                logger.debug("Reusing OCR text of near-duplicate page %s", ocr_page.duplicate_of,
+                             extra={"document": filename, "page": page})
+            elif ocr_page.ocr is not None:
+                texts = ocr_page.ocr.result()
+                ocr_page.full_text = texts[0].description if texts else ""
+                # Per-word boxes feed the layout-aware extraction
+                ocr_page.words = words_from_annotations(texts) if texts else []
+                if ocr_page.page_hash is not None:
+                    page_index.add(ocr_page.page_hash, f"{filename}#{page}", full_text=ocr_page.full_text,
+                                   words=ocr_page.words)
         except Exception as e:
-            print(f"Error saving to Excel: {e}")
+            ocr_page.error = str(e) or type(e).__name__
+        if ocr_page.error is not None:
+            logger.error("Error processing image %s: %s", ocr_page.image_path, ocr_page.error,
+                         extra={"document": filename, "page": page})
+        ocr_page.ocr = ocr_page.page_hash = None
+        if progress is not None and ocr_page.error is None:
+            progress("ocred", page=page, skipped=ocr_page.skip_reason, duplicate_of=ocr_page.duplicate_of)
+        return ocr_page
+
+    def skipped_result(self, image_paths: list, filename: str, sticker_flag: bool, signature_flag: bool,
+                       reason: str) -> OCRResult:
+        """Result for a document the routing policy decided not to OCR"""
+        master_fields = self._empty_fields(signature_flag, sticker_flag)
+        if not sticker_flag:
+            master_fields.sticker_date = NOT_AVAILABLE
+        return OCRResult(
+            filename=filename,
+            total_pages=len(image_paths),
+            master_fields=master_fields,
+            fields_found=self._get_found_fields(master_fields),
+            page_details=[],
+            processing_status="Skipped",
+            error_message=f"OCR skipped: {reason}",
+            route="skip_ocr",
+            route_reason=reason,
+            sticker_flag=sticker_flag,
+            signature_flag=signature_flag
+        )
+
+    def _empty_fields(self, signature_flag: bool, sticker_flag: bool) -> InvoiceFields:
+        """Fields for a page that produced no text (blank, skipped or failed)"""
+        return empty_fields(signature_flag, sticker_flag)
+
+    def _combine_fields(self, all_fields: list) -> InvoiceFields:
+        """Combine fields from multiple pages, prioritizing non-None values"""
+        return combine_fields(all_fields)
+
+    def _get_found_fields(self, fields) -> list:
+        """Get list of fields that were successfully extracted"""
+        return found_fields(fields)
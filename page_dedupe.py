@@ -0,0 +1,176 @@
+# page_dedupe.py
+
+import base64
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import PAGE_DEDUPE_ENABLED, PAGE_DEDUPE_MAX_DISTANCE, PAGE_DEDUPE_MAX_BLOCK_DIFF, PAGE_HASH_INDEX_PATH
+
+# Thumbnail used to confirm hash matches (width, height) and the block size compared
+THUMB_SIZE = (192, 256)
+THUMB_BLOCK = 4
+
+
+def _gray(image: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """Difference hash: compares horizontally adjacent pixels of a tiny grayscale page"""
+    small = cv2.resize(_gray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def phash(image: np.ndarray, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """Perceptual hash: sign of the low-frequency DCT coefficients against their median"""
+    size = hash_size * highfreq_factor
+    small = cv2.resize(_gray(image), (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    bits = (low > np.median(low)).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def thumbnail(image: np.ndarray) -> np.ndarray:
+    return cv2.resize(_gray(image), THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def max_block_diff(a: np.ndarray, b: np.ndarray, block: int = THUMB_BLOCK) -> float:
+    """Largest mean absolute difference over block x block tiles of two thumbnails"""
+    h, w = a.shape
+    diff = cv2.absdiff(a, b).astype(np.float32)
+    return float(diff.reshape(h // block, block, w // block, block).mean(axis=(1, 3)).max())
+
+
+def _pack_thumb(thumb: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(thumb.tobytes())).decode("ascii")
+
+
+def _unpack_thumb(data: str) -> np.ndarray:
+    w, h = THUMB_SIZE
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=np.uint8).reshape(h, w)
+
+
+class PageHashIndex:
+    """Index of already-processed pages keyed by perceptual hashes.
+
+    Each entry remembers where the page came from (``"file.pdf#2"``) plus any
+    results recorded for it - the raw OCR text and/or the OD detections - so a
+    near-duplicate page can reuse them instead of calling Vision/YOLOX again.
+
+    pHash/dHash only select candidates: pages built from the same template can
+    hash identically while differing in the invoice number, so every candidate
+    is confirmed by comparing small thumbnails block by block.
+
+    Entries are keyed by source and page content: two different pages that
+    share a source name (same basename in two folders, a file that changed
+    since the index was saved) get an entry each, and only the same page's
+    OD and OCR results are merged into one entry.
+
+    Candidates are found through pHash bands rather than a scan of every
+    entry: the 64 bits are cut into ``max_distance + 1`` bands, and a hash
+    within ``max_distance`` bits of another matches it exactly in at least
+    one band.
+    """
+
+    def __init__(self, max_distance: int = 6, max_block_diff: float = 10.0, path: str = None):
+        self.max_distance = max_distance
+        self.max_block_diff = max_block_diff
+        self.path = Path(path) if path else None
+        self.entries = []
+        self._by_source = {}  # source -> entries of the different pages seen under that name
+        self._bands = {}  # (band, bits) -> entries
+        self._lock = threading.Lock()
+        self.reused = 0
+
+        if self.path and self.path.exists():
+            self.load()
+
+    @classmethod
+    def from_config(cls):
+        """Return a per-batch index, or None when page dedupe is disabled"""
+        if not PAGE_DEDUPE_ENABLED:
+            return None
+        return cls(max_distance=PAGE_DEDUPE_MAX_DISTANCE, max_block_diff=PAGE_DEDUPE_MAX_BLOCK_DIFF,
+                   path=PAGE_HASH_INDEX_PATH)
+
+    @staticmethod
+    def hash_page(image: np.ndarray) -> tuple:
+        """Return the (phash, dhash, thumbnail) tuple of a decoded page"""
+        return phash(image), dhash(image), thumbnail(image)
+
+    def lookup(self, page_hash: tuple, field: str):
+        """Return the closest confirmed duplicate holding ``field``, or None"""
+        p, d, thumb = page_hash
+        candidates = []
+        with self._lock:
+            seen = set()
+            for band in self._band_keys(p):
+                for entry in self._bands.get(band, ()):
+                    if id(entry) in seen or field not in entry:
+                        continue
+                    seen.add(id(entry))
+                    distance = max(hamming(p, entry["phash"]), hamming(d, entry["dhash"]))
+                    if distance <= self.max_distance:
+                        candidates.append((distance, entry))
+
+        for _, entry in sorted(candidates, key=lambda c: c[0]):
+            if max_block_diff(thumb, entry["thumb"]) <= self.max_block_diff:
+                return entry
+        return None
+
+    def _band_keys(self, p: int) -> list:
+        bands = min(self.max_distance + 1, 64)
+        width = -(-64 // bands)
+        return [(i, (p >> (i * width)) & ((1 << width) - 1)) for i in range(bands)]
+
+    def _index(self, entry: dict):
+        self._by_source.setdefault(entry["source"], []).append(entry)
+        for band in self._band_keys(entry["phash"]):
+            self._bands.setdefault(band, []).append(entry)
+
+    def add(self, page_hash: tuple, source: str, **payload):
+        """Record results for a page; repeated calls for the same page of the same source merge the payload"""
+        p, d, thumb = page_hash
+        with self._lock:
+            entry = next((e for e in self._by_source.get(source, ())
+                          if e["phash"] == p and e["dhash"] == d and np.array_equal(e["thumb"], thumb)), None)
+            if entry is None:
+                entry = {"source": source, "phash": p, "dhash": d, "thumb": thumb}
+                self.entries.append(entry)
+                self._index(entry)
+            entry.update(payload)
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("entries", [])
+        for entry in entries:
+            entry["thumb"] = _unpack_thumb(entry["thumb"])
+        with self._lock:
+            self.entries = entries
+            self._by_source, self._bands = {}, {}
+            for entry in self.entries:
+                self._index(entry)
+
+    def save(self):
+        """Persist the index to ``path`` (no-op for in-memory indexes)"""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with self._lock:
+            entries = [dict(entry, thumb=_pack_thumb(entry["thumb"])) for entry in self.entries]
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"max_distance": self.max_distance, "entries": entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,102 @@
+# page_gate.py
+
+import threading
+from dataclasses import dataclass, asdict
+
+import cv2
+import numpy as np
+
+from config import (
+    PAGE_GATE_ENABLED,
+    PAGE_GATE_MIN_INK_RATIO,
+    PAGE_GATE_MIN_VARIANCE,
+    PAGE_GATE_MIN_COMPONENTS,
+)
+
+
+@dataclass
+class PageContentStats:
+    """Cheap content measurements for a single page"""
+    ink_ratio: float
+    variance: float
+    components: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class PageContentGate:
+    """Decide whether a decoded page carries enough content to be worth an OCR call.
+
+    Blank backs and separator sheets are rejected when the share of ink pixels,
+    the grayscale variance or the number of connected ink blobs falls below the
+    configured thresholds.
+    """
+
+    def __init__(self, enabled: bool = True, min_ink_ratio: float = 0.002, min_variance: float = 25.0,
+                 min_components: int = 8, ink_threshold: int = 160, min_component_area: int = 4,
+                 analysis_long_edge: int = 1000):
+        self.enabled = enabled
+        self.min_ink_ratio = min_ink_ratio
+        self.min_variance = min_variance
+        self.min_components = min_components
+        self.ink_threshold = ink_threshold
+        self.min_component_area = min_component_area
+        self.analysis_long_edge = analysis_long_edge
+
+        # Number of pages rejected, i.e. Vision calls avoided; check() runs on the page pool's threads
+        self.ocr_calls_avoided = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            enabled=PAGE_GATE_ENABLED,
+            min_ink_ratio=PAGE_GATE_MIN_INK_RATIO,
+            min_variance=PAGE_GATE_MIN_VARIANCE,
+            min_components=PAGE_GATE_MIN_COMPONENTS,
+        )
+
+    def analyze(self, image: np.ndarray) -> PageContentStats:
+        """Measure ink ratio, variance and connected components of a BGR or grayscale page"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        # Work on a small copy - the statistics don't need full resolution
+        h, w = gray.shape[:2]
+        long_edge = max(h, w)
+        if long_edge > self.analysis_long_edge:
+            scale = self.analysis_long_edge / float(long_edge)
+            gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        ink = gray < self.ink_threshold
+        ink_ratio = float(np.count_nonzero(ink)) / ink.size
+        variance = float(gray.var())
+
+        # Count ink blobs large enough not to be scanner speckle
+        components = 0
+        if ink_ratio > 0:
+            n, _, stats, _ = cv2.connectedComponentsWithStats(ink.astype(np.uint8), connectivity=8)
+            components = int(np.count_nonzero(stats[1:, cv2.CC_STAT_AREA] >= self.min_component_area))
+
+        return PageContentStats(ink_ratio=ink_ratio, variance=variance, components=components)
+
+    def skip_reason(self, stats: PageContentStats):
+        """Return why a page should be skipped, or None if it should be OCR'd"""
+        if stats.ink_ratio < self.min_ink_ratio:
+            return f"ink ratio {stats.ink_ratio:.4f} below {self.min_ink_ratio}"
+        if stats.variance < self.min_variance:
+            return f"variance {stats.variance:.1f} below {self.min_variance}"
+        if stats.components < self.min_components:
+            return f"{stats.components} connected components below {self.min_components}"
+        return None
+
+    def check(self, image: np.ndarray):
+        """Analyze a page and return (skip_reason, stats); skip_reason is None for pages to OCR"""
+        if not self.enabled:
+            return None, None
+        stats = self.analyze(image)
+        reason = self.skip_reason(stats)
+        if reason:
+            with self._lock:
+                self.ocr_calls_avoided += 1
+        return reason, stats
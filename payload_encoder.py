@@ -0,0 +1,109 @@
+# payload_encoder.py
+
+import cv2
+import numpy as np
+
+from config import (
+    OCR_PAYLOAD_FORMAT,
+    OCR_PAYLOAD_QUALITY,
+    OCR_PAYLOAD_MAX_LONG_EDGE,
+    OCR_PAYLOAD_GRAYSCALE,
+)
+
+# Extension handed to cv2.imencode for each supported payload format
+ENCODE_EXTS = {
+    "png": ".png",
+    "jpeg": ".jpg",
+    "jpg": ".jpg",
+    "webp": ".webp",
+}
+
+
+class PayloadEncoder:
+    """Shrink rendered pages before they are uploaded to Vision.
+
+    The encoder optionally converts to grayscale, downscales so the long edge
+    is at most ``max_long_edge`` pixels and re-encodes as PNG/JPEG/WebP.
+    ``fmt="original"`` sends the file bytes untouched.
+    """
+
+    def __init__(self, fmt: str = "original", quality: int = 85, max_long_edge: int = None, grayscale: bool = False):
+        fmt = (fmt or "original").lower()
+        if fmt != "original" and fmt not in ENCODE_EXTS:
+            raise ValueError(f"Unsupported payload format: {fmt}")
+        self.fmt = fmt
+        self.quality = int(quality)
+        self.max_long_edge = int(max_long_edge) if max_long_edge else None
+        self.grayscale = bool(grayscale)
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            fmt=OCR_PAYLOAD_FORMAT,
+            quality=OCR_PAYLOAD_QUALITY,
+            max_long_edge=OCR_PAYLOAD_MAX_LONG_EDGE,
+            grayscale=OCR_PAYLOAD_GRAYSCALE,
+        )
+
+    @classmethod
+    def from_spec(cls, spec: str):
+        """Build an encoder from a ``format[:quality[:long_edge[:gray|color]]]`` string"""
+        parts = spec.split(":")
+        fmt = parts[0]
+        quality = int(parts[1]) if len(parts) > 1 and parts[1] else 85
+        long_edge = int(parts[2]) if len(parts) > 2 and parts[2] else None
+        grayscale = len(parts) > 3 and parts[3].lower() in ("gray", "grey", "grayscale")
+        return cls(fmt=fmt, quality=quality, max_long_edge=long_edge, grayscale=grayscale)
+
+    @property
+    def is_passthrough(self) -> bool:
+        return self.fmt == "original"
+
+    def describe(self) -> str:
+        if self.is_passthrough:
+            return "original"
+        return f"{self.fmt}:{self.quality}:{self.max_long_edge or ''}:{'gray' if self.grayscale else 'color'}"
+
+    def prepare(self, image: np.ndarray) -> np.ndarray:
+        """Apply grayscale conversion and downscaling to a decoded BGR page"""
+        if self.grayscale and image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        if self.max_long_edge:
+            h, w = image.shape[:2]
+            long_edge = max(h, w)
+            if long_edge > self.max_long_edge:
+                scale = self.max_long_edge / float(long_edge)
+                new_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+                image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def encode(self, image: np.ndarray) -> bytes:
+        """Encode a decoded BGR page into the configured payload format"""
+        if self.is_passthrough:
+            ok, buf = cv2.imencode(".png", image)
+        else:
+            ext = ENCODE_EXTS[self.fmt]
+            if ext == ".jpg":
+                params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+            elif ext == ".webp":
+                params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+            else:
+                params = [cv2.IMWRITE_PNG_COMPRESSION, 3]
+            ok, buf = cv2.imencode(ext, self.prepare(image), params)
+
+        if not ok:
+            raise ValueError(f"Failed to encode page as {self.fmt}")
+        return buf.tobytes()
+
+    def encode_file(self, image_path: str, image: np.ndarray = None) -> bytes:
+        """Return the payload for an image on disk, reusing ``image`` if it is already decoded"""
+        if self.is_passthrough:
+            with open(image_path, 'rb') as image_file:
+                return image_file.read()
+
+        if image is None:
+            image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        return self.encode(image)
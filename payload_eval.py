@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of OCR payload encodings.
+
+Each page in the sample corpus is OCR'd once as the original render (the
+baseline) and once per candidate setting. The report shows how many bytes each
+setting saves and how often its extracted fields agree with the baseline.
+
+Usage:
+  python payload_eval.py <corpus_folder> \
+    --setting jpeg:85::gray --setting jpeg:75:1700:gray --setting webp:80:2000:color \
+    [--csv payload_eval.csv] [--limit 50]
+
+Settings use the format ``format:quality:long_edge:gray|color``.
+"""
+import argparse
+import csv
+import os
+import tempfile
+from pathlib import Path
+
+from google.cloud import vision
+from pdf2image import convert_from_path
+
+from ocr_preprocessor import OCRProcessor
+from payload_encoder import PayloadEncoder
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+
+# Fields derived purely from OCR text (the flags come from the OD model)
+COMPARED_FIELDS = ["invoice_number", "store_number", "invoice_date", "sticker_date", "total_quantity", "has_frito_lay"]
+
+
+def collect_pages(corpus_folder: Path, temp_dir: str, dpi: int, limit: int = None):
+    """Return image paths for the corpus, rasterizing any PDFs into temp_dir"""
+    pages = []
+    for path in sorted(corpus_folder.iterdir()):
+        ext = path.suffix.lower()
+        if ext in IMAGE_EXTS:
+            pages.append(str(path))
+        elif ext == ".pdf":
+            for i, page in enumerate(convert_from_path(str(path), dpi=dpi, poppler_path=os.environ.get("POPPLER_PATH")), start=1):
+                out_path = os.path.join(temp_dir, f"{path.stem}_page_{i:03d}.png")
+                page.save(out_path, "PNG")
+                pages.append(out_path)
+        if limit and len(pages) >= limit:
+            return pages[:limit]
+    return pages
+
+
+def ocr_fields(processor: OCRProcessor, content: bytes) -> dict:
+    response = processor.client.text_detection(image=vision.Image(content=content))
+    if response.error.message:
+        raise Exception(response.error.message)
+    full_text = response.text_annotations[0].description if response.text_annotations else ""
+    fields = processor.extract_invoice_fields(full_text, False, has_sticker=True)
+    return {name: getattr(fields, name) for name in COMPARED_FIELDS}
+
+
+def evaluate(corpus_folder: str, specs: list, dpi: int = 200, limit: int = None) -> list:
+    processor = OCRProcessor(payload_encoder=PayloadEncoder())
+    encoders = [PayloadEncoder.from_spec(spec) for spec in specs]
+    stats = {
+        enc.describe(): {"bytes_in": 0, "bytes_out": 0, "fields": 0, "agree": 0, "pages_agree": 0, "pages": 0}
+        for enc in encoders
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pages = collect_pages(Path(corpus_folder), temp_dir, dpi, limit)
+        print(f"Evaluating {len(encoders)} setting(s) on {len(pages)} page(s)")
+
+        for page_path in pages:
+            with open(page_path, "rb") as image_file:
+                original = image_file.read()
+            baseline = ocr_fields(processor, original)
+
+            for enc in encoders:
+                payload = enc.encode_file(page_path)
+                candidate = ocr_fields(processor, payload)
+                agree = sum(1 for name in COMPARED_FIELDS if candidate[name] == baseline[name])
+
+                s = stats[enc.describe()]
+                s["bytes_in"] += len(original)
+                s["bytes_out"] += len(payload)
+                s["fields"] += len(COMPARED_FIELDS)
+                s["agree"] += agree
+                s["pages"] += 1
+                s["pages_agree"] += int(agree == len(COMPARED_FIELDS))
+
+    report = []
+    for setting, s in stats.items():
+        pages = s["pages"] or 1
+        report.append({
+            "setting": setting,
+            "pages": s["pages"],
+            "avg_bytes_in": s["bytes_in"] // pages,
+            "avg_bytes_out": s["bytes_out"] // pages,
+            "bytes_saved_pct": round(100.0 * (1 - s["bytes_out"] / s["bytes_in"]), 1) if s["bytes_in"] else 0.0,
+            "field_agreement_pct": round(100.0 * s["agree"] / s["fields"], 1) if s["fields"] else 0.0,
+            "page_agreement_pct": round(100.0 * s["pages_agree"] / pages, 1),
+        })
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compare OCR payload encodings on a sample corpus")
+    p.add_argument("corpus", help="Folder of sample PDFs/images")
+    p.add_argument("--setting", action="append", dest="settings", required=True,
+                   help="Encoding to evaluate, e.g. jpeg:80:1700:gray (repeatable)")
+    p.add_argument("--dpi", type=int, default=200, help="DPI used to rasterize PDFs")
+    p.add_argument("--limit", type=int, default=None, help="Maximum number of pages to evaluate")
+    p.add_argument("--csv", default=None, help="Optional path to write the report as CSV")
+    args = p.parse_args()
+
+    report = evaluate(args.corpus, args.settings, dpi=args.dpi, limit=args.limit)
+
+    header = f"{'setting':<28}{'pages':>7}{'avg in':>12}{'avg out':>12}{'saved %':>9}{'fields %':>10}{'pages %':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in report:
+        print(f"{row['setting']:<28}{row['pages']:>7}{row['avg_bytes_in']:>12}{row['avg_bytes_out']:>12}"
+              f"{row['bytes_saved_pct']:>9}{row['field_agreement_pct']:>10}{row['page_agreement_pct']:>9}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(report[0].keys()))
+            writer.writeheader()
+            writer.writerows(report)
+        print(f"Report written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# pipeline_engine.py
+"""
+Staged pipeline with bounded queues between the stages.
+
+Each ``Stage`` has its own workers - threads, processes or asyncio tasks - and
+reads from a queue holding at most ``queue_size`` items. A stage whose
+downstream queue is full blocks until there is room, so a fast stage
+cannot run ahead of a slow one and the number of items in flight (and the
+memory they hold) stays bounded however many inputs there are. Different
+items sit in different stages at the same time: one document is being
+rasterized while another is in OD and others wait on Vision.
+
+Items are objects with an ``error`` attribute. When a stage raises, the
+item's ``error`` is set and the later stages pass it through untouched,
+except those created with ``always=True`` (e.g. the one that writes results).
+``on_stage(name, item)``, when given, is called in this process after every
+stage an item completes (e.g. to checkpoint it).
+
+Per stage, ``metrics()`` reports busy time, time starved waiting for input,
+time blocked on a full downstream queue, and utilization
+(busy / (workers × wall time)). The stage with the highest utilization is
+the bottleneck, and the one to give more workers.
+"""
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_STAGES, BATCH_START_METHOD
+
+logger = logging.getLogger(__name__)
+
+THREAD, PROCESS, ASYNC = "thread", "process", "async"
+
+_END = object()
+
+
+def parse_stages(spec: str = PIPELINE_STAGES) -> dict:
+    """``"rasterize=thread:2,ocr=async:16"`` -> {"rasterize": ("thread", 2), "ocr": ("async", 16)}"""
+    stages = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, setting = part.partition("=")
+        kind, _, workers = setting.partition(":")
+        if kind not in (THREAD, PROCESS, ASYNC):
+            raise ValueError(f"Stage {name!r}: unknown kind {kind!r}")
+        stages[name.strip()] = (kind, int(workers or 1))
+    return stages
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable  # item -> item; a coroutine function for async stages, picklable for process stages
+    kind: str = THREAD
+    workers: int = 1
+    initializer: Callable = None  # process stages: run once in every worker process
+    initargs: tuple = ()
+    always: bool = False  # also run for items that failed in an earlier stage
+
+
+@dataclass
+class StageMetrics:
+    workers: int
+    items: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    starved_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    max_queue: int = 0
+    started: float = None
+    finished: float = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, busy: float = 0.0, starved: float = 0.0, blocked: float = 0.0, items: int = 0, errors: int = 0):
+        with self._lock:
+            self.busy_seconds += busy
+            self.starved_seconds += starved
+            self.blocked_seconds += blocked
+            self.items += items
+            self.errors += errors
+
+    def summary(self) -> dict:
+        wall = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        capacity = wall * self.workers
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "starved_seconds": round(self.starved_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            "max_queue": self.max_queue,
+        }
+
+
+class Pipeline:
+    """Runs items through a list of stages; ``run`` yields what comes out of the last stage"""
+
+    def __init__(self, stages: list, queue_size: int = PIPELINE_QUEUE_SIZE, on_stage: Callable = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        for stage in stages:
+            if stage.kind not in (THREAD, PROCESS, ASYNC):
+                raise ValueError(f"Stage {stage.name!r}: unknown kind {stage.kind!r}")
+            if stage.workers < 1:
+                raise ValueError(f"Stage {stage.name!r}: needs at least one worker")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.on_stage = on_stage
+        self._metrics = {stage.name: StageMetrics(stage.workers) for stage in stages}
+        self.started = None
+        self.finished = None
+
+    def run(self, items):
+        """Feed ``items`` through every stage and yield the finished items in completion order"""
+        self.started = time.monotonic()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-feed", daemon=True)]
+        executors = []
+        for i, stage in enumerate(self.stages):
+            metrics = self._metrics[stage.name]
+            metrics.started = time.monotonic()
+            remaining = [stage.workers]
+            if stage.kind == ASYNC:
+                target, args, count = self._async_stage, (stage, queues[i], queues[i + 1], remaining), 1
+            else:
+                executor = None
+                if stage.kind == PROCESS:
+                    executor = ProcessPoolExecutor(stage.workers, mp_context=multiprocessing.get_context(BATCH_START_METHOD),
+                                                   initializer=stage.initializer, initargs=stage.initargs)
+                    executors.append(executor)
+                target, args, count = self._worker, (stage, queues[i], queues[i + 1], remaining, executor), stage.workers
+            for n in range(count):
+                threads.append(threading.Thread(target=contextvars.copy_context().run, args=(target, *args),
+                                                name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            out = queues[-1]
+            while True:
+                item = out.get()
+                if item is _END:
+                    break
+                yield item
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+            self.finished = time.monotonic()
+            logger.info("Pipeline finished", extra={"seconds": round(self.finished - self.started, 2),
+                                                    "stages": self.metrics()})
+
+    def metrics(self) -> dict:
+        """Per-stage counters and utilization, plus the bottleneck (the busiest stage)"""
+        stages = {name: metrics.summary() for name, metrics in self._metrics.items()}
+        busiest = max(stages, key=lambda name: stages[name]["utilization"])
+        return {"stages": stages, "bottleneck": busiest}
+
+    @staticmethod
+    def _feed(items, out: queue.Queue):
+        try:
+            for item in items:
+                out.put(item)
+        except Exception as e:
+            logger.exception("Pipeline input failed: %s", e)
+        finally:
+            out.put(_END)
+
+    def _stage_done(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: list):
+        inbox.put(_END)  # let the stage's other workers see the end too
+        metrics = self._metrics[stage.name]
+        with metrics._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            metrics.finished = time.monotonic()
+            outbox.put(_END)
+
+    def _take(self, stage: Stage, inbox: queue.Queue):
+        metrics = self._metrics[stage.name]
+        metrics.max_queue = max(metrics.max_queue, inbox.qsize())
+        wait_start = time.perf_counter()
+        item = inbox.get()
+        metrics.add(starved=time.perf_counter() - wait_start)
+        return item
+
+    def _give(self, stage: Stage, outbox: queue.Queue, item):
+        block_start = time.perf_counter()
+        outbox.put(item)
+        self._metrics[stage.name].add(blocked=time.perf_counter() - block_start)
+
+    def _skip(self, stage: Stage, item) -> bool:
+        return getattr(item, "error", None) is not None and not stage.always
+
+    def _failed(self, stage: Stage, item, error: BaseException):
+        logger.error("Stage %s failed: %s", stage.name, error, extra={"stage": stage.name})
+        if getattr(item, "error", None) is None:
+            item.error = str(error) or type(error).__name__
+        return item
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: list, executor):
+        metrics = self._metrics[stage.name]
+        while True:
+            item = self._take(stage, inbox)
+            if item is _END:
+                self._stage_done(stage, inbox, outbox, remaining)
+                return
+            if not self._skip(stage, item):
+                start = time.perf_counter()
+                try:
+                    item = executor.submit(stage.fn, item).result() if executor is not None else stage.fn(item)
+                    if self.on_stage is not None:
+                        self.on_stage(stage.name, item)
+                    metrics.add(busy=time.perf_counter() - start, items=1)
+                except Exception as e:
+                    metrics.add(busy=time.perf_counter() - start, items=1, errors=1)
+                    item = self._failed(stage, item, e)
+            self._give(stage, outbox, item)
+
+    def _async_stage(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: list):
+        """One event loop with up to ``workers`` items in flight.
+
+        A single thread reads the inbox, and only when a slot is free. Sync
+        functions (and the blocking hand-over to the next stage) run on the
+        stage's own ``workers`` threads. So ``async:N`` is N-way whatever the
+        function, without a thread parked in ``inbox.get()`` per idle slot.
+        """
+        metrics = self._metrics[stage.name]
+        reader = ThreadPoolExecutor(1, thread_name_prefix=f"pipeline-{stage.name}-take")
+        executor = ThreadPoolExecutor(stage.workers, thread_name_prefix=f"pipeline-{stage.name}")
+
+        def in_thread(pool, fn, *args):
+            return asyncio.get_running_loop().run_in_executor(pool, contextvars.copy_context().run, fn, *args)
+
+        async def handle(item, slots: asyncio.Semaphore):
+            try:
+                if not self._skip(stage, item):
+                    start = time.perf_counter()
+                    try:
+                        if asyncio.iscoroutinefunction(stage.fn):
+                            item = await stage.fn(item)
+                        else:
+                            item = await in_thread(executor, stage.fn, item)
+                        if self.on_stage is not None:
+                            await in_thread(executor, self.on_stage, stage.name, item)
+                        metrics.add(busy=time.perf_counter() - start, items=1)
+                    except Exception as e:
+                        metrics.add(busy=time.perf_counter() - start, items=1, errors=1)
+                        item = self._failed(stage, item, e)
+                await in_thread(executor, self._give, stage, outbox, item)
+            finally:
+                slots.release()
+
+        async def main():
+            slots = asyncio.Semaphore(stage.workers)
+            running = set()
+            while True:
+                await slots.acquire()
+                item = await in_thread(reader, self._take, stage, inbox)
+                if item is _END:
+                    break
+                task = asyncio.create_task(handle(item, slots))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            await asyncio.gather(*running)
+
+        try:
+            asyncio.run(main())
+        finally:
+            reader.shutdown(wait=True)
+            executor.shutdown(wait=True)
+        remaining[0] = 1
+        self._stage_done(stage, inbox, outbox, remaining)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Re-run the current field extraction over the OCR archive without calling Vision.
+
+Part files of the archive are spread over worker processes. For every
+filename the most recently archived document wins. The output is a new results
+table plus a diff of the fields whose value changed since they were archived.
+
+Usage:
+  python reextract.py [--archive inference_output/ocr_archive] \
+    [--out inference_output/reextracted.parquet] [--diff inference_output/reextract_diff.csv] [--workers N]
+
+The results table is written as Parquet, CSV or Excel depending on the --out extension.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from config import INFERENCE_OUTPUT_DIR, OCR_ARCHIVE_DIR
+from field_extractor import extract_fields, empty_fields, combine_fields
+from models import NOT_AVAILABLE
+from ocr_archive import ARCHIVED_FIELDS, field_values, iter_documents, part_files
+
+DIFF_COLUMNS = ["filename", "document_id", "field", "old_value", "new_value"]
+
+
+def reextract_document(doc: dict):
+    """Return (results row, changed fields) for one archived document"""
+    sticker_flag = doc["sticker_flag"]
+    signature_flag = doc["signature_flag"]
+
+    all_fields = []
+    for _, full_text, words in doc["pages"]:
+        if full_text:
+            all_fields.append(extract_fields(full_text, signature_flag, sticker_flag, words=words))
+        else:
+            all_fields.append(empty_fields(signature_flag, sticker_flag))
+    master_fields = combine_fields(all_fields)
+    if not sticker_flag:
+        master_fields.sticker_date = NOT_AVAILABLE
+
+    new_values = field_values(master_fields)
+    changes = [
+        (name, doc["fields"][name], new_values[name])
+        for name in ARCHIVED_FIELDS
+        if doc["fields"][name] != new_values[name]
+    ]
+
+    row = {"filename": doc["filename"], "document_id": doc["document_id"], "archived_at": doc["archived_at"]}
+    row.update(master_fields.model_dump())
+    row["has_sticker"] = sticker_flag
+    return row, changes
+
+
+def reextract_part(path: str):
+    """Re-extract every document in one part file (runs in a worker process)"""
+    rows = []
+    changes = []
+    pages = 0
+    for doc in iter_documents(path):
+        row, changed = reextract_document(doc)
+        rows.append(row)
+        changes.append(changed)
+        pages += len(doc["pages"])
+    return rows, changes, pages
+
+
+def reextract(archive_dir: str, out_path: str, diff_path: str, workers: int = None) -> dict:
+    parts = part_files(archive_dir)
+    if not parts:
+        print(f"No archived OCR output found in: {archive_dir}")
+        return {"documents": 0, "pages": 0, "changed_documents": 0}
+
+    print(f"Re-extracting {len(parts)} part file(s) from {archive_dir} with {workers or os.cpu_count()} worker(s)")
+    start_time = time.time()
+
+    # filename -> (row, changes) of its most recently archived document
+    latest = {}
+    pages = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rows, changes, part_pages in pool.map(reextract_part, parts):
+            pages += part_pages
+            for row, changed in zip(rows, changes):
+                current = latest.get(row["filename"])
+                if current is None or row["archived_at"] >= current[0]["archived_at"]:
+                    latest[row["filename"]] = (row, changed)
+
+    elapsed = time.time() - start_time
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame([row for row, _ in latest.values()])
+    if not df.empty:
+        # Keep the identifiers integer-typed despite missing values
+        df["invoice_number"] = df["invoice_number"].astype("Int64")
+        df["store_number"] = df["store_number"].astype("Int64")
+    if out_path.suffix == ".csv":
+        df.to_csv(out_path, index=False)
+    elif out_path.suffix == ".xlsx":
+        df.to_excel(out_path, index=False)
+    else:
+        df.to_parquet(out_path, index=False)
+
+    changed_by_field = {}
+    changed_documents = 0
+    diff_path = Path(diff_path)
+    diff_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(diff_path, "w", newline="") as diff_file:
+        writer = csv.writer(diff_file)
+        writer.writerow(DIFF_COLUMNS)
+        for row, changed in latest.values():
+            if changed:
+                changed_documents += 1
+            for name, old, new in changed:
+                writer.writerow([row["filename"], row["document_id"], name, old, new])
+                changed_by_field[name] = changed_by_field.get(name, 0) + 1
+
+    summary = {
+        "documents": len(latest),
+        "pages": pages,
+        "changed_documents": changed_documents,
+        "changed_fields": changed_by_field,
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(pages / elapsed, 1) if elapsed else 0.0,
+        "output_file": str(out_path),
+        "diff_file": str(diff_path),
+    }
+    print(f"Re-extracted {pages} page(s) / {len(latest)} document(s) in {elapsed:.2f}s ({summary['pages_per_sec']} pages/sec)")
+    print(f"Changed documents: {changed_documents}, changed fields: {changed_by_field}")
+    print(f"Results saved to: {out_path}")
+    print(f"Diff saved to: {diff_path}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run field extraction over archived OCR output")
+    parser.add_argument("--archive", default=OCR_ARCHIVE_DIR, help="OCR archive directory")
+    parser.add_argument("--out", default=os.path.join(INFERENCE_OUTPUT_DIR, "reextracted.parquet"),
+                        help="New results table (.parquet, .csv or .xlsx)")
+    parser.add_argument("--diff", default=os.path.join(INFERENCE_OUTPUT_DIR, "reextract_diff.csv"),
+                        help="CSV of changed fields")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    reextract(args.archive, args.out, args.diff, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# result_export.py
+"""
+Output formats for result exports.
+
+Every format shares one row mapping (``export_values``: the 12 ExcelRow
+columns, booleans as Yes/No) and writes incrementally: each writer takes an
+iterator of rows and yields bytes as it goes, so a download can stream and a
+file export never holds the result set in memory.
+
+Built in: xlsx, csv, jsonl and parquet. ``register_format`` adds another.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import RESULT_EXPORT_FORMAT
+from models import ExcelRow
+from xlsx_writer import XLSX_MIMETYPE, ChunkBuffer, iter_xlsx
+
+COLUMNS = list(ExcelRow.model_fields)
+BOOL_COLUMNS = [name for name in COLUMNS if ExcelRow.model_fields[name].annotation is bool]
+_BOOL_INDEXES = [COLUMNS.index(name) for name in BOOL_COLUMNS]
+
+# Rows per CSV/JSONL chunk and per Parquet row group
+CHUNK_ROWS = 5000
+
+
+def export_values(values) -> tuple:
+    """Map one row (values in COLUMNS order) to its exported form: booleans become Yes/No"""
+    values = list(values)
+    for i in _BOOL_INDEXES:
+        values[i] = "Yes" if values[i] else "No"
+    return tuple(values)
+
+
+def row_values(row: ExcelRow) -> tuple:
+    """Values of an ExcelRow in COLUMNS order"""
+    return tuple(getattr(row, name) for name in COLUMNS)
+
+
+def _batches(rows, size: int = CHUNK_ROWS):
+    batch = []
+    for values in rows:
+        batch.append(values)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+def iter_jsonl(rows):
+    for batch in _batches(rows):
+        yield "".join(json.dumps(dict(zip(COLUMNS, values)), ensure_ascii=False) + "\n" for values in batch).encode("utf-8")
+
+
+# Identifiers stay integers; total_quantity mixes floats and values such as "N/A", so it is a string like the rest
+PARQUET_SCHEMA = pa.schema([
+    (name, pa.int64() if ExcelRow.model_fields[name].annotation == Optional[int] else pa.string())
+    for name in COLUMNS
+])
+
+
+def iter_parquet(rows):
+    buffer = ChunkBuffer()
+    writer = pq.ParquetWriter(buffer, PARQUET_SCHEMA, compression="zstd")
+    try:
+        for batch in _batches(rows):
+            columns = list(zip(*batch))
+            arrays = [
+                pa.array(column if field.type == pa.int64() else [None if v is None else str(v) for v in column], type=field.type)
+                for field, column in zip(PARQUET_SCHEMA, columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=PARQUET_SCHEMA))
+            yield buffer.drain()
+    finally:
+        writer.close()
+    yield buffer.drain()
+
+
+def iter_excel(rows):
+    return iter_xlsx(COLUMNS, rows)
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    name: str
+    extension: str
+    mimetype: str
+    writer: Callable  # iterator of export_values rows -> iterator of bytes
+
+
+FORMATS = {}
+
+
+def register_format(export_format: ExportFormat):
+    FORMATS[export_format.name] = export_format
+
+
+register_format(ExportFormat("xlsx", ".xlsx", XLSX_MIMETYPE, iter_excel))
+register_format(ExportFormat("csv", ".csv", "text/csv", iter_csv))
+register_format(ExportFormat("jsonl", ".jsonl", "application/x-ndjson", iter_jsonl))
+register_format(ExportFormat("parquet", ".parquet", "application/vnd.apache.parquet", iter_parquet))
+
+
+def get_format(name: str = None) -> ExportFormat:
+    """Format by name (default RESULT_EXPORT_FORMAT); ValueError for unknown names"""
+    name = (name or RESULT_EXPORT_FORMAT).lower().lstrip(".")
+    if name == "excel":
+        name = "xlsx"
+    if name not in FORMATS:
+        raise ValueError(f"Unknown export format {name!r}; expected one of {', '.join(sorted(FORMATS))}")
+    return FORMATS[name]
+
+
+def format_for_path(path) -> ExportFormat:
+    """Format matching a file's extension"""
+    suffix = Path(path).suffix.lower()
+    for export_format in FORMATS.values():
+        if export_format.extension == suffix:
+            return export_format
+    return get_format(suffix)
+
+
+def iter_export(rows, export_format: ExportFormat):
+    """Bytes of an export of ``rows`` (values in COLUMNS order) in the given format"""
+    return export_format.writer(export_values(values) for values in rows)
@@ -0,0 +1,137 @@
+# result_segments.py
+"""
+Result segments written by sharded batch runs, and the merge into the store.
+
+A shard (``batch_processor.py --shard i/N``) does not write the shared SQLite
+store: SQLite locking is not reliable across machines on a network
+filesystem. Instead, every shard appends its rows to its own segment,
+``RESULT_SEGMENTS_DIR/results.shard-i-of-N.jsonl``. Each line is one JSON
+row: ``{"content_hash", "stored_at", "values"}``, with values in COLUMNS
+order. The shard's ResultSink appends a batch at a time and fsyncs it.
+
+``merge_segments`` (``python result_segments.py merge``) reads every segment
+from the byte offset it reached last time, in chunks, and adds the rows to
+the ResultStore. For each filename, only a row at least as new as the one
+already stored is kept. The new offsets are committed in the same
+transaction as the rows. A merge therefore reads each line once in total,
+can be repeated as often as needed, and can run while shards are still
+writing: a line still being written has no newline yet and waits for the
+next merge.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from config import RESULT_SEGMENTS_DIR, RESULT_STORE_PATH, RESULTS_EXCEL_PATH
+from log_setup import configure_logging
+from result_export import row_values
+from result_store import ResultStore
+
+logger = logging.getLogger(__name__)
+
+# Segment lines read per merge transaction
+MERGE_CHUNK_LINES = 5000
+
+
+class ResultSegment:
+    """Append-only JSON-lines file of one shard's result rows (a ResultSink target, like ResultStore)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def for_shard(cls, shard, directory=RESULT_SEGMENTS_DIR):
+        return cls(Path(directory) / f"results.{shard.label}.jsonl")
+
+    def add_many(self, items):
+        """Append (ExcelRow, content_hash) pairs as one write, synced to disk before returning"""
+        now = time.time()
+        lines = "".join(
+            json.dumps({"content_hash": content_hash or "", "stored_at": now, "values": row_values(row)}) + "\n"
+            for row, content_hash in items
+        ).encode("utf-8")
+        if not lines:
+            return
+        with open(self.path, "ab+") as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = b"\n" + lines  # close a line cut off when an earlier run died mid-write
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_chunks(path: Path, offset: int, chunk_lines: int = MERGE_CHUNK_LINES):
+    """Yield (rows, offset after them) for complete lines from ``offset`` on"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        rows = []
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # still being written
+            offset += len(line)
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping damaged line in %s at byte %d", path, offset - len(line))
+                    continue
+                rows.append((record["content_hash"], record["stored_at"], *record["values"]))
+            if len(rows) >= chunk_lines:
+                yield rows, offset
+                rows = []
+        yield rows, offset
+
+
+def merge_segments(store: ResultStore, directory=RESULT_SEGMENTS_DIR) -> int:
+    """Add the rows shards have written since the last merge to ``store``; returns the rows merged"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    offsets = store.segment_offsets()
+    merged = read = 0
+    for path in sorted(directory.glob("*.jsonl")):
+        key = path.name
+        for rows, offset in _read_chunks(path, offsets.get(key, 0)):
+            if offset == offsets.get(key, 0):
+                break
+            # Filename-level dedupe within the chunk; the store keeps only rows newer than what it has
+            newest = {}
+            for values in rows:
+                current = newest.get(values[2])
+                if current is None or values[1] >= current[1]:
+                    newest[values[2]] = values
+            merged += store.merge_rows(list(newest.values()), {key: offset})
+            offsets[key] = offset
+            read += len(rows)
+    logger.info("Merged %d of %d new segment row(s) into %s", merged, read, store.path,
+                extra={"segments": str(directory)})
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard result segments")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("merge", help="Merge new segment rows into the store and export it")
+    merge.add_argument("--segments", default=RESULT_SEGMENTS_DIR, help="Folder holding the shard segments")
+    merge.add_argument("--store", default=RESULT_STORE_PATH, help="SQLite result store to merge into")
+    merge.add_argument("--export", default=RESULTS_EXCEL_PATH,
+                       help="File to write after merging; the format follows the extension ('' to skip)")
+    args = parser.parse_args()
+
+    configure_logging()
+    store = ResultStore(args.store)
+    merged = merge_segments(store, args.segments)
+    print(f"Merged {merged} rows from {args.segments}")
+    if args.export:
+        rows = store.export(args.export)
+        print(f"Exported {rows} rows to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# result_sink.py
+"""
+Single writer for result rows.
+
+Request threads and batch loops hand finished results to ``ResultSink.put``,
+which only converts them to ExcelRows and enqueues them. One writer thread
+drains the queue and inserts into the ResultStore in batches - every
+RESULT_SINK_BATCH_ROWS rows or RESULT_SINK_FLUSH_SECONDS seconds, whichever
+comes first. Each batch is written under an exclusive lock file next to the
+store, so several app workers or batch runs on one host never interleave
+writes. ``flush()`` blocks until everything queued so far is stored, and
+``close()`` (also registered with atexit) drains the queue before exit.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: rely on SQLite's own locking
+    fcntl = None
+
+from config import RESULT_SINK_BATCH_ROWS, RESULT_SINK_FLUSH_SECONDS
+from result_store import excel_row
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ResultSink:
+    """Queue-fed writer thread that owns all inserts into a ResultStore"""
+
+    def __init__(self, store, batch_rows: int = RESULT_SINK_BATCH_ROWS, flush_interval: float = RESULT_SINK_FLUSH_SECONDS):
+        self.store = store
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.lock_path = store.path.with_name(store.path.name + ".lock")
+        self.rows_written = 0
+        self.batches_written = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, result, content_hash: str = ""):
+        """Queue the row for an OCRResult or failed-processing dict"""
+        if self._closed:
+            raise RuntimeError("ResultSink is closed")
+        self._queue.put((excel_row(result), content_hash))
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every row queued before this call is stored; False if that failed or timed out"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        done.ok = False
+        self._queue.put(done)
+        return done.wait(timeout) and done.ok
+
+    def close(self):
+        """Store everything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, pending: list):
+        if not pending:
+            return
+        try:
+            with self._file_lock():
+                self.store.add_many(pending)
+        except Exception as e:
+            # Keep the rows and retry with the next batch
+            logger.exception("Error writing %d result row(s): %s", len(pending), e)
+            return
+        self.rows_written += len(pending)
+        self.batches_written += 1
+        pending.clear()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) < self.batch_rows:
+                    continue
+            self._write(pending)
+            deadline = time.monotonic() + self.flush_interval if pending else None
+            if isinstance(item, threading.Event):
+                item.ok = not pending
+                item.set()
+            elif item is _STOP:
+                if pending:
+                    logger.error("Dropping %d result row(s) that could not be written", len(pending))
+                return
@@ -0,0 +1,254 @@
+# result_store.py
+"""
+Append-only store of per-document results.
+
+Every processed document adds one row to a SQLite table; inserting costs the
+same whether the store holds ten rows or a million. A unique index on
+(filename, content_hash) means re-processing the same file replaces its row,
+while a changed file under the same name is kept as a new row. The latest row
+of each filename is the current result.
+
+The Excel workbook (target_results.xlsx) is no longer read and rewritten per
+document; it is an export generated on demand by ``export``
+(``python result_store.py --export``) or streamed by ``iter_export``
+(``/results/export`` in the app), in any format from result_export.py. Both
+read rows from a cursor into an incremental writer, so memory stays flat for
+any row count.
+"""
+import argparse
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from config import RESULT_STORE_PATH, RESULTS_EXCEL_PATH
+from models import ExcelRow
+from result_export import COLUMNS, BOOL_COLUMNS, ExportFormat, format_for_path, get_format, iter_export, row_values
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    stored_at REAL NOT NULL,
+    invoice_number INTEGER,
+    store_number INTEGER,
+    invoice_date TEXT,
+    sticker_date TEXT,
+    total_quantity,  -- float, or special values such as 'N/A'
+    has_frito_lay INTEGER NOT NULL DEFAULT 0,
+    has_signature INTEGER NOT NULL DEFAULT 0,
+    has_sticker INTEGER NOT NULL DEFAULT 0,
+    is_valid TEXT,
+    processing_status TEXT,
+    error_message TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS results_file_content ON results (filename, content_hash);
+-- How far each shard segment has been merged in (see result_segments.py)
+CREATE TABLE IF NOT EXISTS segment_offsets (
+    segment TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+_INSERT = (
+    f"INSERT OR REPLACE INTO results (content_hash, stored_at, {', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})"
+)
+
+# SQLite returns the bare columns of the row holding MAX(seq), i.e. the latest row per filename
+_LATEST = f"SELECT MAX(seq), {', '.join(COLUMNS)} FROM results GROUP BY filename ORDER BY 1"
+
+
+def file_hash(path) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def excel_row(result) -> ExcelRow:
+    """ExcelRow for an OCRResult, or for a failed-processing dict with filename/error_message"""
+    if hasattr(result, 'master_fields'):
+        return ExcelRow.from_ocr_result(result, result.sticker_flag if hasattr(result, 'sticker_flag') else False)
+    return ExcelRow.from_failed_processing(result.get('filename', 'Unknown'), result.get('error_message', 'Unknown error'))
+
+
+class ResultStore:
+    """SQLite-backed result rows keyed by filename and content hash"""
+
+    def __init__(self, path=RESULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @classmethod
+    def from_config(cls):
+        """Store at RESULT_STORE_PATH; rows of an existing target_results.xlsx are imported on first use"""
+        is_new = not Path(RESULT_STORE_PATH).exists()
+        store = cls()
+        if is_new and Path(RESULTS_EXCEL_PATH).exists():
+            store.import_excel(RESULTS_EXCEL_PATH)
+        return store
+
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to share between request threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, row: ExcelRow, content_hash: str = ""):
+        """Insert (or replace, for the same filename and content) one result row"""
+        self.add_many([(row, content_hash)])
+
+    def add_result(self, result, content_hash: str = ""):
+        """Insert the row for an OCRResult or failed-processing dict"""
+        self.add(excel_row(result), content_hash)
+
+    def add_many(self, items):
+        """Insert (ExcelRow, content_hash) pairs in one transaction"""
+        now = time.time()
+        params = [
+            (content_hash or "", now, *row_values(row))
+            for row, content_hash in items
+        ]
+        if not params:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(_INSERT, params)
+        finally:
+            conn.close()
+        logger.debug("Stored %d result row(s)", len(params), extra={"store": str(self.path)})
+
+    def segment_offsets(self) -> dict:
+        """Bytes of each shard segment already merged in"""
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT segment, offset FROM segment_offsets").fetchall())
+        finally:
+            conn.close()
+
+    def merge_rows(self, params: list, offsets: dict) -> int:
+        """Insert (content_hash, stored_at, *values) rows that are at least as new as the filename's current row.
+
+        The segments' new ``offsets`` are saved in the same transaction, so a
+        merge that stops part way neither loses nor repeats rows. Returns the
+        number of rows inserted.
+        """
+        conn = self._connect()
+        merged = 0
+        try:
+            with conn:
+                for values in params:
+                    latest = conn.execute("SELECT MAX(stored_at) FROM results WHERE filename = ?",
+                                          (values[2],)).fetchone()[0]
+                    if latest is None or values[1] >= latest:
+                        conn.execute(_INSERT, values)
+                        merged += 1
+                conn.executemany("INSERT OR REPLACE INTO segment_offsets (segment, offset) VALUES (?, ?)",
+                                 offsets.items())
+        finally:
+            conn.close()
+        return merged
+
+    def latest(self) -> pd.DataFrame:
+        """Current result per filename, in the order the results were stored"""
+        conn = self._connect()
+        try:
+            df = pd.read_sql_query(_LATEST, conn)
+        finally:
+            conn.close()
+        df = df.drop(columns=df.columns[0])
+        for name in BOOL_COLUMNS:
+            df[name] = df[name].astype(bool)
+        return df
+
+    def iter_latest(self, batch_size: int = 1000):
+        """Yield the current row per filename as tuples in COLUMNS order (booleans as 0/1), without loading them all"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(_LATEST)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield row[1:]
+        finally:
+            conn.close()
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(DISTINCT filename) FROM results").fetchone()[0]
+        finally:
+            conn.close()
+
+    def export(self, path=RESULTS_EXCEL_PATH, export_format: ExportFormat = None) -> int:
+        """Write the current results to ``path`` (format from its extension unless given); returns the row count"""
+        export_format = export_format or format_for_path(path)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        rows = 0
+
+        def counted():
+            nonlocal rows
+            for rows, values in enumerate(self.iter_latest(), 1):
+                yield values
+
+        with open(tmp_path, "wb") as f:
+            for chunk in iter_export(counted(), export_format):
+                f.write(chunk)
+        tmp_path.replace(path)
+        logger.info("Exported %d result rows to %s", rows, path, extra={"format": export_format.name})
+        return rows
+
+    def iter_export(self, export_format: ExportFormat = None):
+        """Bytes of an export (default format from config), produced while the rows are read"""
+        return iter_export(self.iter_latest(), export_format or get_format())
+
+    def import_excel(self, path) -> int:
+        """Load rows from a workbook written by the old read-modify-write path"""
+        # Only empty cells are missing; "N/A" is a valid total_quantity
+        df = pd.read_excel(path, keep_default_na=False, na_values=[""])
+        rows = []
+        for record in df.to_dict("records"):
+            # Empty cells come back as NaN; dropping them leaves the ExcelRow defaults
+            values = {name: record[name] for name in COLUMNS if name in record and not pd.isna(record[name])}
+            if "filename" not in values:
+                continue
+            for name in BOOL_COLUMNS:
+                values[name] = values.get(name) in (True, "Yes")
+            rows.append((ExcelRow(**values), ""))
+        self.add_many(rows)
+        logger.info("Imported %d result rows from %s", len(rows), path)
+        return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the result store")
+    parser.add_argument("--store", default=RESULT_STORE_PATH, help="SQLite result store")
+    parser.add_argument("--export", default=RESULTS_EXCEL_PATH,
+                        help="File to write; the format follows the extension (.xlsx, .csv, .jsonl, .parquet)")
+    parser.add_argument("--format", help="Export format, overriding the extension")
+    args = parser.parse_args()
+    export_format = get_format(args.format) if args.format else None
+    rows = ResultStore(args.store).export(args.export, export_format)
+    print(f"Exported {rows} rows to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
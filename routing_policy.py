@@ -0,0 +1,128 @@
+# routing_policy.py
+
+from dataclasses import dataclass
+
+from config import (
+    ROUTING_SKIP_DOMINANT_CLASSES,
+    ROUTING_DOMINANCE_RATIO,
+    ROUTING_REQUIRE_CLASSES,
+    VISION_COST_PER_1000_PAGES,
+)
+
+ROUTE_OCR = "ocr"
+ROUTE_SKIP = "skip_ocr"
+
+
+@dataclass
+class RoutingDecision:
+    route: str
+    reason: str = None
+
+    @property
+    def run_ocr(self) -> bool:
+        return self.route == ROUTE_OCR
+
+
+def class_shares(detections: list) -> dict:
+    """Share of score-weighted box area held by each detected class"""
+    weights = {}
+    for det in detections:
+        x0, y0, x1, y1 = det["bbox"]
+        area = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+        weights[det["class_name"]] = weights.get(det["class_name"], 0.0) + area * det.get("score", 1.0)
+
+    total = sum(weights.values())
+    if total <= 0:
+        return {name: 0.0 for name in weights}
+    return {name: w / total for name, w in weights.items()}
+
+
+class RoutingPolicy:
+    """Decide from the first-page OD output whether a document is worth OCR'ing.
+
+    - ``skip_dominant``: skip OCR when one of these classes holds at least
+      ``dominance_ratio`` of the detected (score-weighted) box area, e.g. ``bad``.
+    - ``require_any``: only OCR documents where at least one of these classes
+      was detected, e.g. ``receipt_outline``. Empty means no requirement.
+    """
+
+    def __init__(self, skip_dominant=("bad",), dominance_ratio: float = 0.5, require_any=()):
+        self.skip_dominant = tuple(skip_dominant)
+        self.dominance_ratio = dominance_ratio
+        self.require_any = tuple(require_any)
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            skip_dominant=ROUTING_SKIP_DOMINANT_CLASSES,
+            dominance_ratio=ROUTING_DOMINANCE_RATIO,
+            require_any=ROUTING_REQUIRE_CLASSES,
+        )
+
+    def decide(self, detections: list) -> RoutingDecision:
+        shares = class_shares(detections)
+
+        for name in self.skip_dominant:
+            share = shares.get(name, 0.0)
+            if share >= self.dominance_ratio:
+                return RoutingDecision(ROUTE_SKIP, f"'{name}' dominates the page ({share:.0%} of detected area)")
+
+        if self.require_any and not any(name in shares for name in self.require_any):
+            return RoutingDecision(ROUTE_SKIP, f"none of {', '.join(self.require_any)} detected")
+
+        return RoutingDecision(ROUTE_OCR)
+
+
+class RoutingReport:
+    """Aggregate routing outcomes, OCR/OD call counts and stage latency for a batch"""
+
+    def __init__(self, cost_per_1000_pages: float = VISION_COST_PER_1000_PAGES):
+        self.cost_per_1000_pages = cost_per_1000_pages
+        self.documents = 0
+        self.pages = 0
+        self.routes = {}
+        self.ocr_calls = 0
+        self.pages_skipped_by_route = 0
+        self.pages_skipped_blank = 0
+        self.pages_reused = 0
+        self.od_calls = 0
+        self.od_reused = 0
+        self.od_seconds = 0.0
+        self.ocr_seconds = 0.0
+
+    def add(self, result):
+        """Fold one OCRResult into the report"""
+        self.documents += 1
+        self.pages += result.total_pages
+        self.routes[result.route] = self.routes.get(result.route, 0) + 1
+        self.ocr_calls += result.ocr_calls
+        self.pages_skipped_blank += result.pages_skipped
+        self.pages_reused += result.pages_reused
+        if result.route == ROUTE_SKIP:
+            self.pages_skipped_by_route += result.total_pages
+        if result.detections_reused_from:
+            self.od_reused += 1
+        elif result.od_seconds:
+            self.od_calls += 1
+        self.od_seconds += result.od_seconds or 0.0
+        self.ocr_seconds += result.ocr_seconds or 0.0
+
+    def summary(self) -> dict:
+        ocr_calls_avoided = self.pages_skipped_by_route + self.pages_skipped_blank + self.pages_reused
+        return {
+            "documents": self.documents,
+            "pages": self.pages,
+            "routes": dict(self.routes),
+            "ocr_calls": self.ocr_calls,
+            "ocr_calls_avoided": ocr_calls_avoided,
+            "ocr_calls_avoided_by_route": self.pages_skipped_by_route,
+            "ocr_calls_avoided_blank": self.pages_skipped_blank,
+            "ocr_calls_avoided_duplicate": self.pages_reused,
+            "od_calls": self.od_calls,
+            "od_reused": self.od_reused,
+            "od_seconds": round(self.od_seconds, 3),
+            "ocr_seconds": round(self.ocr_seconds, 3),
+            "avg_seconds_per_document": round((self.od_seconds + self.ocr_seconds) / self.documents, 3) if self.documents else 0.0,
+            "estimated_ocr_cost": round(self.ocr_calls * self.cost_per_1000_pages / 1000.0, 4),
+            "estimated_ocr_savings": round(ocr_calls_avoided * self.cost_per_1000_pages / 1000.0, 4),
+        }
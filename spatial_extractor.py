@@ -0,0 +1,213 @@
+# spatial_extractor.py
+"""
+Layout-aware key/value extraction from Vision word boxes.
+
+Words are bucketed into a uniform grid so that, for a label such as
+"STORE NUMBER", the nearest value to the right on the same row (or, failing
+that, just below the label) can be found by looking at a handful of cells
+rather than scanning the page.
+"""
+import re
+from collections import namedtuple
+
+from field_extractor import DATE_PATTERNS
+
+Word = namedtuple("Word", ["text", "x0", "y0", "x1", "y1"])
+
+# Labels per field, in priority order (mirrors the regex priority in field_extractor)
+LABELS = {
+    "invoice_number": [
+        ("DOCUMENT", "NO"), ("DOCUMENT", "NUMBER"), ("DOCUMENT", "#"), ("DOCUMENT",),
+        ("INVOICE", "NO"), ("INVOICE", "NUMBER"), ("INVOICE", "#"), ("INVOICE",),
+        ("INV", "NO"), ("INV", "#"), ("INV",),
+    ],
+    "store_number": [("STORE", "NUMBER"), ("STORE", "NO"), ("STORE", "#")],
+    "invoice_date": [("INVOICE", "DATE"), ("DOCUMENT", "DATE"), ("DELIVERY", "DATE"), ("DATE",)],
+    "total_quantity": [
+        ("TOTAL", "QTY"), ("TOTAL", "QUANTITY"), ("QTY", "TOTAL"), ("QUANTITY", "TOTAL"),
+        ("TOTAL", "EACHES", "SOLD"),
+    ],
+}
+
+_IDENTIFIER_RE = re.compile(r"[A-Z0-9\-]*[0-9][A-Z0-9\-]*", re.IGNORECASE)
+_QUANTITY_RE = re.compile(r"-?[0-9][0-9,]*(?:\.[0-9]+)?")
+_PUNCT_ONLY_RE = re.compile(r"^[\W_]+$")
+
+# How far to look for a value, in multiples of the label height
+_MAX_RIGHT = 40.0
+_MAX_BELOW = 3.0
+
+
+def normalize_token(text: str) -> str:
+    token = text.upper()
+    if len(token) > 1:
+        token = token.rstrip(":.")
+    return token
+
+
+def words_from_annotations(text_annotations) -> list:
+    """Convert Vision text_annotations (skipping the full-text entry) into Words"""
+    words = []
+    for annotation in list(text_annotations)[1:]:
+        vertices = annotation.bounding_poly.vertices
+        if not vertices:
+            continue
+        xs = [v.x for v in vertices]
+        ys = [v.y for v in vertices]
+        words.append(Word(annotation.description, min(xs), min(ys), max(xs), max(ys)))
+    return words
+
+
+class WordGrid:
+    """Uniform grid over word boxes for fast neighbourhood queries"""
+
+    def __init__(self, words: list, cell: int = None):
+        self.words = words
+        heights = sorted(w.y1 - w.y0 for w in words) or [20]
+        self.line_height = max(1, heights[len(heights) // 2])
+        self.cell = cell or self.line_height * 4
+        self.cells = {}
+        for i, w in enumerate(words):
+            for cx in range(int(w.x0) // self.cell, int(w.x1) // self.cell + 1):
+                for cy in range(int(w.y0) // self.cell, int(w.y1) // self.cell + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def query(self, x0, y0, x1, y1):
+        """Indexes of words whose cell overlaps the rectangle"""
+        found = set()
+        for cx in range(int(x0) // self.cell, int(x1) // self.cell + 1):
+            for cy in range(int(y0) // self.cell, int(y1) // self.cell + 1):
+                found.update(self.cells.get((cx, cy), ()))
+        return found
+
+
+class SpatialExtractor:
+    """Resolve "label → nearest value to the right/below" for invoice fields on one page"""
+
+    def __init__(self, words: list):
+        self.words = [w if isinstance(w, Word) else Word._make(w) for w in words]
+        self.tokens = [normalize_token(w.text) for w in self.words]
+        self.grid = WordGrid(self.words)
+
+        # token -> word indexes in reading order (top to bottom, left to right)
+        self.by_token = {}
+        for i in sorted(range(len(self.words)), key=lambda i: (self.words[i].y0, self.words[i].x0)):
+            self.by_token.setdefault(self.tokens[i], []).append(i)
+
+    # --- geometry helpers -------------------------------------------------
+
+    def _right_of(self, box, limit: int = None):
+        """Words on the same row to the right of box, nearest first"""
+        x0, y0, x1, y1 = box
+        h = max(1, y1 - y0)
+        cy = (y0 + y1) / 2.0
+        reach = x1 + _MAX_RIGHT * h
+        hits = []
+        for i in self.grid.query(x1 - h / 2.0, y0, reach, y1):
+            w = self.words[i]
+            if w.x0 < x1 - h / 2.0 or w.x0 > reach:
+                continue
+            if abs((w.y0 + w.y1) / 2.0 - cy) > 0.6 * h:
+                continue
+            hits.append((w.x0 - x1, i))
+        hits.sort()
+        return [i for _, i in hits[:limit]] if limit else [i for _, i in hits]
+
+    def _below(self, box, limit: int = None):
+        """Words under box that overlap it horizontally, nearest first"""
+        x0, y0, x1, y1 = box
+        h = max(1, y1 - y0)
+        reach = y1 + _MAX_BELOW * h
+        hits = []
+        for i in self.grid.query(x0 - h, y1, x1 + 4 * h, reach):
+            w = self.words[i]
+            if w.y0 < y1 - h / 2.0 or w.y0 > reach:
+                continue
+            if w.x1 < x0 - h or w.x0 > x1 + 4 * h:
+                continue
+            hits.append((w.y0 - y1, abs(w.x0 - x0), i))
+        hits.sort()
+        return [i for _, _, i in hits[:limit]] if limit else [i for _, _, i in hits]
+
+    # --- labels -----------------------------------------------------------
+
+    def _find_labels(self, label: tuple):
+        """Yield (box, word indexes) for each occurrence of a multi-token label"""
+        for first in self.by_token.get(label[0], ()):
+            indexes = [first]
+            for token in label[1:]:
+                w = self.words[indexes[-1]]
+                right = self._right_of((w.x0, w.y0, w.x1, w.y1), limit=1)
+                if not right or self.tokens[right[0]] != token:
+                    break
+                indexes.append(right[0])
+            else:
+                ws = [self.words[i] for i in indexes]
+                yield (min(w.x0 for w in ws), min(w.y0 for w in ws), max(w.x1 for w in ws), max(w.y1 for w in ws)), indexes
+
+    def _value_words(self, box, label_indexes):
+        """Candidate value words: same row to the right first, then below"""
+        used = set(label_indexes)
+        for i in self._right_of(box, limit=4) + self._below(box, limit=3):
+            if i in used or _PUNCT_ONLY_RE.match(self.words[i].text) or self.tokens[i] in ("NO", "#", "NUMBER"):
+                continue
+            yield i
+
+    # --- fields -----------------------------------------------------------
+
+    def _identifier(self, field: str):
+        for label in LABELS[field]:
+            for box, indexes in self._find_labels(label):
+                # "INVOICE DATE" is a date label, not an invoice number label
+                right = self._right_of(box, limit=1)
+                if right and self.tokens[right[0]] == "DATE":
+                    continue
+                for i in self._value_words(box, indexes):
+                    value = self.words[i].text.lstrip("#:")
+                    if _IDENTIFIER_RE.fullmatch(value):
+                        return value
+                    break
+        return None
+
+    def _quantity(self):
+        for label in LABELS["total_quantity"]:
+            for box, indexes in self._find_labels(label):
+                for i in self._value_words(box, indexes):
+                    value = self.words[i].text.lstrip(":")
+                    if _QUANTITY_RE.fullmatch(value):
+                        try:
+                            return float(value.replace(",", ""))
+                        except ValueError:
+                            pass
+                    break
+        return None
+
+    def _date(self):
+        for label in LABELS["invoice_date"]:
+            for box, indexes in self._find_labels(label):
+                for i in self._value_words(box, indexes):
+                    # Dates such as "Jul 4, 2025" are split into several words
+                    row = [i] + [j for j in self._right_of(self._box(i), limit=2)]
+                    text = " ".join(self.words[j].text for j in row).lstrip(":")
+                    for pattern in DATE_PATTERNS:
+                        m = pattern.match(text)
+                        if m:
+                            return m.group(0)
+                    break
+        return None
+
+    def _box(self, i):
+        w = self.words[i]
+        return w.x0, w.y0, w.x1, w.y1
+
+    def extract(self) -> dict:
+        """Return the fields that could be resolved spatially (missing keys = no match)"""
+        if not self.words:
+            return {}
+        found = {
+            "invoice_number": self._identifier("invoice_number"),
+            "store_number": self._identifier("store_number"),
+            "invoice_date": self._date(),
+            "total_quantity": self._quantity(),
+        }
+        return {k: v for k, v in found.items() if v is not None}
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# Routes: /batch-process rejects an empty folder and reports the counts of the batch it ran.
+import os
+import tempfile
+
+from google.cloud import vision
+from google.oauth2 import service_account
+
+# The app opens its stores and the Vision client at import: keep them away from real paths and credentials
+_STATE = tempfile.mkdtemp()
+for _name in ("UPLOAD_DIR", "JOB_DB_PATH", "RESULT_STORE_PATH", "RESULTS_EXCEL_PATH"):
+    os.environ.setdefault(_name, os.path.join(_STATE, _name.lower()))
+service_account.Credentials.from_service_account_file = staticmethod(lambda *args, **kwargs: None)
+vision.ImageAnnotatorClient = lambda *args, **kwargs: None
+
+import app  # noqa: E402
+from batch_processor import BatchProcessor  # noqa: E402
+
+
+def test_batch_process_rejects_empty_folder(tmp_path):
+    response = app.app.test_client().post("/batch-process", data={"folder_path": str(tmp_path)})
+    assert response.status_code == 400
+    assert "No PDF files found" in response.get_json()["error"]
+
+
+def test_batch_process_reports_counts_from_the_batch(tmp_path, monkeypatch):
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+
+    def process_batch(self):
+        files = list(self.get_pdf_files())
+        return {"total_files": len(files), "successful": len(files) - 1, "failed": 1, "output_file": "out.xlsx"}
+
+    monkeypatch.setattr(BatchProcessor, "process_batch", process_batch)
+    response = app.app.test_client().post("/batch-process", data={"folder_path": str(tmp_path)})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data["pdf_count"], data["successful"], data["failed"], data["output_file"]) == (2, 1, 1, "out.xlsx")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+# Batch inputs: recursive scandir walk with include/exclude globs, any-case .pdf, and PDFs inside zip archives.
+import zipfile
+
+from batch_inputs import iter_inputs, split_member, input_signature, input_hash, local_copy
+
+
+def _tree(tmp_path):
+    (tmp_path / "sub" / "drafts").mkdir(parents=True)
+    for name in ("a.pdf", "B.PDF", "notes.txt", "sub/c.pdf", "sub/drafts/d.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF " + name.encode())
+    with zipfile.ZipFile(tmp_path / "sub" / "scans.zip", "w") as archive:
+        archive.writestr("2024/e.pdf", b"%PDF e")
+        archive.writestr("readme.txt", b"not a pdf")
+    return tmp_path
+
+
+def _relative(root, paths):
+    return sorted(str(p)[len(str(root)) + 1:] for p in paths)
+
+
+def test_top_level_only_by_default(tmp_path):
+    root = _tree(tmp_path)
+    assert _relative(root, iter_inputs(root, recursive=False, include=[], exclude=[])) == ["B.PDF", "a.pdf"]
+
+
+def test_recursive_with_globs_and_zips(tmp_path):
+    root = _tree(tmp_path)
+    found = _relative(root, iter_inputs(root, recursive=True, include=[], exclude=[]))
+    assert found == ["B.PDF", "a.pdf", "sub/c.pdf", "sub/drafts/d.pdf", "sub/scans.zip!/2024/e.pdf"]
+
+    assert _relative(root, iter_inputs(root, recursive=True, include=[], exclude=["sub/drafts"])) == [
+        "B.PDF", "a.pdf", "sub/c.pdf", "sub/scans.zip!/2024/e.pdf"]
+    assert _relative(root, iter_inputs(root, recursive=True, include=["sub/*"], exclude=[], archives=False)) == [
+        "sub/c.pdf", "sub/drafts/d.pdf"]
+
+
+def test_zip_members_read_like_files(tmp_path):
+    root = _tree(tmp_path)
+    member = next(p for p in iter_inputs(root, recursive=True, include=["*e.pdf"], exclude=[]))
+    assert split_member(member) == (str(root / "sub" / "scans.zip"), "2024/e.pdf")
+    assert split_member(str(root / "a.pdf")) == (str(root / "a.pdf"), None)
+
+    assert input_signature(member)[0] == len(b"%PDF e")
+    copy = local_copy(member, tmp_path)
+    assert open(copy, "rb").read() == b"%PDF e"
+    assert input_hash(member) == input_hash(copy)
+    assert local_copy(str(root / "a.pdf"), tmp_path) == str(root / "a.pdf")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Batch manifest: finished files are skipped, interrupted ones resume from their checkpoint, changed or forced ones start over.
+import os
+
+from batch_manifest import BatchManifest, PENDING, DONE, FAILED
+from batch_work import DocumentWork
+from result_store import file_hash
+
+
+def _pdfs(tmp_path, *names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"%PDF-1.4 " + name.encode())
+        paths.append(path)
+    return paths
+
+
+def test_resume_skips_done_and_restores_checkpoints(tmp_path):
+    manifest = BatchManifest(tmp_path / "manifest.sqlite")
+    a, b, c = _pdfs(tmp_path, "a.pdf", "b.pdf", "c.pdf")
+
+    works, already_done = manifest.plan([a, b, c])
+    assert [w.filename for w in works] == ["a.pdf", "b.pdf", "c.pdf"] and already_done == 0
+
+    # a.pdf finished, b.pdf got through OCR before the run died, c.pdf never started
+    first, second = works[0], works[1]
+    first.content_hash, first.result = "hash-a", {"filename": "a.pdf"}
+    manifest.checkpoint("extract", first)
+    manifest.mark_done([first.path])
+    second.content_hash, second.image_paths, second.pages = "hash-b", ["p1.png"], ["page 1 text"]
+    manifest.checkpoint("ocr", second)
+
+    works, already_done = manifest.plan([a, b, c])
+    assert already_done == 1
+    resumed = {w.filename: w for w in works}
+    assert set(resumed) == {"b.pdf", "c.pdf"}
+    assert resumed["b.pdf"].stage == "ocr"
+    assert resumed["b.pdf"].pages == ["page 1 text"] and resumed["b.pdf"].content_hash == "hash-b"
+    assert resumed["c.pdf"].stage is None
+
+    manifest.checkpoint("ocr", resumed["b.pdf"])  # already recorded: no-op
+    manifest.mark_failed(resumed["c.pdf"].path, "PDF has no pages")
+    assert manifest.counts() == {DONE: 1, PENDING: 1, FAILED: 1}
+
+
+def test_changed_content_and_force_start_over(tmp_path):
+    manifest = BatchManifest(tmp_path / "manifest.sqlite")
+    a, b = _pdfs(tmp_path, "a.pdf", "b.pdf")
+    works, _ = manifest.plan([a, b])
+    for work in works:
+        work.content_hash, work.result = file_hash(work.path), {"filename": work.filename}
+        manifest.checkpoint("extract", work)
+    manifest.mark_done([w.path for w in works])
+
+    # Touched but identical: still done. Rewritten: processed again.
+    os.utime(a, (1, 1))
+    b.write_bytes(b"%PDF-1.4 new content")
+    works, already_done = manifest.plan([a, b])
+    assert already_done == 1
+    assert [w.filename for w in works] == ["b.pdf"] and works[0].stage is None and works[0].content_hash
+
+    works, already_done = manifest.plan([a, b], force=True)
+    assert already_done == 0 and len(works) == 2
+    assert all(isinstance(w, DocumentWork) and w.result is None for w in works)
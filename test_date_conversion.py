@@ -1,120 +1,181 @@
 #!/usr/bin/env python3
 
-# Test script to verify date conversion logic
+# Correctness tests and benchmark for date_normalizer.
+# legacy_convert is the original OCRProcessor._convert_date_format (debug prints included);
+# normalize must agree with it on every format it handled.
+import contextlib
+import io
+import random
 import re
+import time
 
-def test_date_conversion():
-    """Test the date conversion logic"""
-    
-    def _convert_date_format(date_str: str) -> str:
-        """Convert various date formats to MM/DD/YYYY format"""
-        if not date_str:
-            return date_str
-        
-        print(f"\nTesting date: {date_str}")
-        
-        # Handle DD.MMM.YYYY format (e.g., "04.Jul.2025" -> "07/04/2025")
-        dd_mmm_yyyy_pattern = r"(\d{1,2})\.(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.(\d{4})"
-        match = re.match(dd_mmm_yyyy_pattern, date_str, re.IGNORECASE)
-        if match:
-            day, month, year = match.groups()
-            print(f"DD.MMM.YYYY pattern matched: day={day}, month={month}, year={year}")
-            month_map = {
-                'jan': '01', 'feb': '02', 'mar': '03', 'apr': '04',
-                'may': '05', 'jun': '06', 'jul': '07', 'aug': '08',
-                'sep': '09', 'oct': '10', 'nov': '11', 'dec': '12'
-            }
-            month_num = month_map.get(month.lower(), '01')
-            # Ensure two-digit format for day and month
-            day = day.zfill(2)
-            month_num = month_num.zfill(2)
-            # Convert DD.MMM.YYYY to MM/DD/YYYY (swap day and month)
-            result = f"{month_num}/{day}/{year}"
-            print(f"DD.MMM.YYYY conversion result: {result}")
-            return result
-        
-        # Handle DD/MM/YYYY format (convert to MM/DD/YYYY)
-        dd_mm_yyyy_pattern = r"(\d{1,2})/(\d{1,2})/(\d{4})"
-        match = re.match(dd_mm_yyyy_pattern, date_str)
-        if match:
-            day, month, year = match.groups()
-            print(f"DD/MM/YYYY pattern matched: day={day}, month={month}, year={year}")
-            # Ensure two-digit format for day and month
-            day = day.zfill(2)
-            month = month.zfill(2)
-            # Convert DD/MM/YYYY to MM/DD/YYYY (swap day and month)
-            result = f"{month}/{day}/{year}"
-            print(f"DD/MM/YYYY conversion result: {result}")
-            return result
-        
-        # Handle MMM DD, YYYY format (e.g., "Jul 04, 2025" -> "07/04/2025")
-        mmm_dd_yyyy_pattern = r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+(\d{1,2}),?\s+(\d{4})"
-        match = re.match(mmm_dd_yyyy_pattern, date_str, re.IGNORECASE)
-        if match:
-            month, day, year = match.groups()
-            print(f"MMM DD, YYYY pattern matched: month={month}, day={day}, year={year}")
-            month_map = {
-                'jan': '01', 'feb': '02', 'mar': '03', 'apr': '04',
-                'may': '05', 'jun': '06', 'jul': '07', 'aug': '08',
-                'sep': '09', 'oct': '10', 'nov': '11', 'dec': '12'
-            }
-            month_num = month_map.get(month.lower(), '01')
-            # Ensure two-digit format for day and month
-            day = day.zfill(2)
-            month_num = month_num.zfill(2)
-            result = f"{month_num}/{day}/{year}"
-            print(f"MMM DD, YYYY conversion result: {result}")
-            return result
-        
-        # Handle YYYY-MM-DD format
-        yyyy_mm_dd_pattern = r"(\d{4})-(\d{1,2})-(\d{1,2})"
-        match = re.match(yyyy_mm_dd_pattern, date_str)
-        if match:
-            year, month, day = match.groups()
-            print(f"YYYY-MM-DD pattern matched: year={year}, month={month}, day={day}")
-            # Ensure two-digit format for day and month
-            day = day.zfill(2)
-            month = month.zfill(2)
-            result = f"{month}/{day}/{year}"
-            print(f"YYYY-MM-DD conversion result: {result}")
-            return result
-        
-        # Handle MM/DD/YYYY format (ensure consistent formatting)
-        mm_dd_yyyy_pattern = r"(\d{1,2})/(\d{1,2})/(\d{4})"
-        match = re.match(mm_dd_yyyy_pattern, date_str)
-        if match:
-            month, day, year = match.groups()
-            print(f"MM/DD/YYYY pattern matched: month={month}, day={day}, year={year}")
-            # Ensure two-digit format for day and month
-            day = day.zfill(2)
-            month = month.zfill(2)
-            result = f"{month}/{day}/{year}"
-            print(f"MM/DD/YYYY conversion result: {result}")
-            return result
-        
-        # If no conversion needed, return as-is
-        print(f"No pattern matched, returning as-is: {date_str}")
+import pandas as pd
+
+from date_normalizer import normalize, normalize_series
+from field_extractor import first_date, find_date
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+FULL_MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+               "October", "November", "December"]
+
+
+def legacy_convert(date_str: str) -> str:
+    if not date_str:
         return date_str
 
-    # Test cases
-    test_dates = [
-        "04.Jul.2025",  # Should become "07/04/2025"
-        "07.Jul.2025",  # Should become "07/07/2025"
-        "25.Dec.2025",  # Should become "12/25/2025"
-        "04/07/2025",   # Should become "07/04/2025" (DD/MM/YYYY)
-        "07/04/2025",   # Should become "07/04/2025" (MM/DD/YYYY)
-        "Jul 04, 2025", # Should become "07/04/2025"
-        "2025-07-04",   # Should become "07/04/2025"
-        "7/4/2025",     # Should become "07/04/2025"
+    match = re.match(r"(\d{1,2})\.(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\.(\d{4})", date_str, re.IGNORECASE)
+    if match:
+        day, month, year = match.groups()
+        month_num = MONTHS.index(month.capitalize()) + 1
+        print(f"DD.MMM.YYYY pattern matched: day={day}, month={month}, year={year}")
+        result = f"{month_num:02d}/{int(day):02d}/{year}"
+        print(f"DD.MMM.YYYY conversion result: {result}")
+        return result
+
+    match = re.match(r"(\d{1,2})/(\d{1,2})/(\d{4})", date_str)
+    if match:
+        month, day, year = match.groups()
+        if int(month) > 12 and int(day) <= 12:
+            result = f"{int(day):02d}/{int(month):02d}/{year}"
+        else:
+            result = f"{int(month):02d}/{int(day):02d}/{year}"
+        print(f"MM/DD/YYYY pattern matched: month={month}, day={day}, year={year}")
+        print(f"MM/DD/YYYY formatting result: {result}")
+        return result
+
+    match = re.match(r"(\d{4})-(\d{1,2})-(\d{1,2})", date_str)
+    if match:
+        year, month, day = match.groups()
+        result = f"{int(month):02d}/{int(day):02d}/{year}"
+        print(f"YYYY-MM-DD pattern matched: year={year}, month={month}, day={day}")
+        print(f"YYYY-MM-DD formatting result: {result}")
+        return result
+
+    print(f"Date conversion: {date_str} -> {date_str}")
+    return date_str
+
+
+def _legacy_formats(rng):
+    """Date strings in the shapes the legacy converter handled"""
+    m, d, y = rng.randint(1, 12), rng.randint(1, 31), rng.randint(2000, 2099)
+    return [
+        f"{d:02d}.{MONTHS[m - 1]}.{y}",
+        f"{d}.{MONTHS[m - 1].upper()}.{y}",
+        f"{m:02d}/{d:02d}/{y}",
+        f"{m}/{d}/{y}",
+        f"{d}/{m}/{y}",
+        f"{y}-{m:02d}-{d:02d}",
+        f"{y}-{m}-{d}",
     ]
-    
-    print("Testing Date Conversion Logic")
-    print("=" * 50)
-    
-    for test_date in test_dates:
-        result = _convert_date_format(test_date)
-        print(f"Final result: {test_date} -> {result}")
-        print("-" * 30)
+
+
+def test_agrees_with_legacy_on_legacy_formats():
+    rng = random.Random(42)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2000):
+            for date_str in _legacy_formats(rng):
+                assert normalize(date_str) == legacy_convert(date_str), date_str
+
+
+def test_formats_the_legacy_converter_missed():
+    cases = {
+        "Jul 04, 2025": "07/04/2025",
+        "Jul 4 2025": "07/04/2025",
+        "July 4, 25": "07/04/2025",
+        "sept 30, 2025": "09/30/2025",
+        "04-Jul-2025": "07/04/2025",
+        "4 July 2025": "07/04/2025",
+        "04/Jul/25": "07/04/2025",
+        "4.Sept.2025": "09/04/2025",
+        "07-04-2025": "07/04/2025",
+        "07.04.2025": "07/04/2025",
+        "7/4/25": "07/04/2025",
+        "31.12.25": "12/31/2025",
+        "2025/07/04": "07/04/2025",
+        "2025.7.4": "07/04/2025",
+        "45-12-31": "12/31/2045",
+    }
+    for date_str, expected in cases.items():
+        assert normalize(date_str) == expected, date_str
+
+
+def test_year_first_matches_read_year_month_day():
+    for text, expected in {"25-12-31": "12/31/2025", "25/07/04": "07/04/2025", "2025.07.04": "07/04/2025"}.items():
+        found, year_first = find_date(f"INVENTORY {text} ref")
+        assert (found, year_first) == (text, True)
+        assert normalize(found, year_first=year_first) == expected, text
+
+
+def test_unrecognised_values_pass_through():
+    for value in [None, "", "Not Available", "2025", "07/04", "Jul 2025"]:
+        assert normalize(value) == value
+
+
+def test_extracted_dates_normalize():
+    # Every format the extractor's DATE_PATTERNS recognises comes back as MM/DD/YYYY
+    rng = random.Random(7)
+    for _ in range(500):
+        m, d, y = rng.randint(1, 12), rng.randint(1, 28), rng.randint(2000, 2099)
+        expected = f"{m:02d}/{d:02d}/{y}"
+        sep = rng.choice("/-.")
+        for rendered in [
+            f"{m}{sep}{d}{sep}{y}",
+            f"{m:02d}{sep}{d:02d}{sep}{y % 100:02d}",
+            f"{d}{rng.choice('.-/ ')}{rng.choice([MONTHS, FULL_MONTHS])[m - 1]}{rng.choice('.-/ ')}{y}",
+            f"{rng.choice([MONTHS, FULL_MONTHS])[m - 1]} {d}, {y}",
+            f"{y}{sep}{m:02d}{sep}{d:02d}",
+        ]:
+            found = first_date(f"Invoice Date: {rendered} ref")
+            assert found == rendered, rendered
+            assert normalize(found) == expected, rendered
+
+
+def test_normalize_is_memoized():
+    normalize.cache_clear()
+    for _ in range(3):
+        normalize("04.Jul.2025")
+    info = normalize.cache_info()
+    assert info.misses == 1 and info.hits == 2
+
+
+def test_normalize_series():
+    dates = pd.Series(["04.Jul.2025", None, "Jul 4, 2025", "garbage", "04.Jul.2025"], index=[10, 11, 12, 13, 14], name="d")
+    result = normalize_series(dates)
+    assert list(result.index) == [10, 11, 12, 13, 14]
+    assert result.name == "d"
+    assert result[10] == result[12] == result[14] == "07/04/2025"
+    assert result[13] == "garbage"
+    assert pd.isna(result[11])
+
+
+def benchmark(n=100000, distinct=300):
+    rng = random.Random(1)
+    pool = [s for _ in range(distinct // 7 + 1) for s in _legacy_formats(rng)][:distinct]
+    dates = [rng.choice(pool) for _ in range(n)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for date_str in dates:
+            legacy_convert(date_str)
+        legacy = time.perf_counter() - start
+
+    normalize.cache_clear()
+    start = time.perf_counter()
+    for date_str in dates:
+        normalize(date_str)
+    memoized = time.perf_counter() - start
+
+    series = pd.Series(dates)
+    normalize.cache_clear()
+    start = time.perf_counter()
+    normalize_series(series)
+    vectorized = time.perf_counter() - start
+
+    print(f"{n} dates, {distinct} distinct")
+    print(f"legacy      {n / legacy:12.0f} dates/sec")
+    print(f"normalize   {n / memoized:12.0f} dates/sec")
+    print(f"series      {n / vectorized:12.0f} dates/sec")
+
 
 if __name__ == "__main__":
-    test_date_conversion()
+    benchmark()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Document scheduler: bounded concurrency, results in input order, errors handed back per item,
+# and priority order: interactive before bulk by weight, shortest document first, aging, per-class waits.
+import subprocess
+import threading
+import time
+
+from document_scheduler import DocumentScheduler, FairExecutor, document_cost, INTERACTIVE, BULK
+
+
+def test_map_overlaps_documents_and_keeps_order():
+    scheduler = DocumentScheduler(documents=3, pages=1)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def work(n):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05 * (5 - n % 5))  # early items finish last
+        with lock:
+            running[0] -= 1
+        if n == 4:
+            raise ValueError("unreadable")
+        return n * n
+
+    outcomes = list(scheduler.map(work, range(10)))
+    scheduler.close()
+
+    assert [item for item, _, _ in outcomes] == list(range(10))
+    assert [result for _, result, _ in outcomes if result is not None] == [n * n for n in range(10) if n != 4]
+    assert isinstance(outcomes[4][2], ValueError)
+    assert peak[0] == 3
+    assert scheduler.page_pool is None
+
+
+def test_page_pool_is_shared_and_sized():
+    scheduler = DocumentScheduler(documents=2, pages=4)
+    assert scheduler.page_pool.size == 4
+    assert scheduler.page_pool.submit(sum, [1, 2]).result() == 3
+    scheduler.close()
+
+
+def _run_in_order(scheduler_pool, submissions):
+    """Submit (name, priority, cost) while the single worker is busy; return the names in the order they ran"""
+    gate, order = threading.Event(), []
+    blocker = scheduler_pool.submit(gate.wait, priority=BULK)
+    time.sleep(0.05)
+    futures = [scheduler_pool.submit(order.append, name, priority=priority, cost=cost)
+               for name, priority, cost in submissions]
+    time.sleep(0.05)
+    gate.set()
+    blocker.result()
+    for future in futures:
+        future.result()
+    return order
+
+
+def test_interactive_first_then_shortest_job():
+    pool = FairExecutor(1, "test", weights={INTERACTIVE: 4, BULK: 1}, aging_seconds=0)
+    order = _run_in_order(pool, [("bulk-80", BULK, 80), ("bulk-2", BULK, 2), ("upload", INTERACTIVE, 1)])
+    assert order == ["upload", "bulk-2", "bulk-80"]
+
+    metrics = pool.metrics()
+    assert metrics[INTERACTIVE]["started"] == 1 and metrics[BULK]["started"] == 3
+    assert metrics[BULK]["wait_max"] >= 0.05
+    pool.shutdown()
+
+
+def test_bulk_keeps_its_share_under_interactive_load():
+    pool = FairExecutor(1, "test", weights={INTERACTIVE: 4, BULK: 1}, aging_seconds=0)
+    order = _run_in_order(pool, [(f"b{i}", BULK, 1) for i in range(4)] + [(f"i{i}", INTERACTIVE, 1) for i in range(16)])
+    # Four interactive documents for each bulk one while both wait; bulk is not starved until the end
+    assert [name[0] for name in order[:10]].count("b") == 2
+    pool.shutdown()
+
+
+def test_aging_lets_a_long_wait_beat_a_short_job():
+    pool = FairExecutor(1, "test", weights={BULK: 1}, aging_seconds=0.005)
+    gate, order = threading.Event(), []
+    blocker = pool.submit(gate.wait)
+    big = pool.submit(order.append, "big", cost=40)
+    time.sleep(0.3)  # 60 pages' worth of waiting
+    small = pool.submit(order.append, "small", cost=1)
+    gate.set()
+    for future in (blocker, big, small):
+        future.result()
+    assert order == ["big", "small"]
+    pool.shutdown()
+
+
+def test_pages_inherit_the_document_class_and_oversized_uploads_are_bulk(tmp_path, monkeypatch):
+    scheduler = DocumentScheduler(documents=1, pages=2, interactive_max_pages=5)
+
+    def document(cost):
+        return scheduler.page_pool.submit(lambda: None).result() or cost
+
+    outcomes = list(scheduler.map(document, [1, 50], priority=INTERACTIVE, cost=float))
+    assert [result for _, result, _ in outcomes] == [1, 50]
+    metrics = scheduler.metrics()
+    assert metrics["documents"][INTERACTIVE]["started"] == 1 and metrics["documents"][BULK]["started"] == 1
+    assert metrics["pages"][INTERACTIVE]["started"] == 1 and metrics["pages"][BULK]["started"] == 1
+    scheduler.close()
+
+    (tmp_path / "scan.png").write_bytes(b"png")
+    (tmp_path / "big.pdf").write_bytes(b"x" * 3_000_000)  # estimated from the size
+    monkeypatch.setattr(subprocess, "Popen", None)  # no pdfinfo on the request path
+    assert document_cost(tmp_path / "scan.png") == 1.0
+    assert document_cost(tmp_path / "big.pdf") == 20.0
+    assert document_cost(tmp_path / "big.pdf", max_pages=5) == 5.0
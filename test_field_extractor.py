@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# Golden-corpus tests and benchmark for the single-pass field extraction engine.
+# The reference below is the original per-call implementation of
+# OCRProcessor.extract_invoice_fields; the engine must agree with it exactly.
+import random
+import re
+import time
+
+from field_extractor import extract_fields, convert_date_format, LineIndex, KEYWORDS
+from models import InvoiceFields
+from spatial_extractor import SpatialExtractor, Word
+
+
+def reference_extract(full_text, signature_flag, has_sticker=False, convert_date=convert_date_format):
+    lines = [line.strip() for line in full_text.splitlines() if line.strip()]
+
+    def first_match(patterns, text, flags=re.IGNORECASE):
+        for p in patterns:
+            m = re.search(p, text, flags)
+            if m:
+                return m.group(1) if m.lastindex else m.group(0)
+        return None
+
+    invoice_patterns = [
+        r"\bDOCUMENT\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b",
+        r"\bINVOICE\s*(?:NO\.?|#|NUMBER)?\s*[:\-]?\s*([A-Z0-9\-]+)\b(?!\s+DATE)",
+        r"\bINV\s*(?:NO\.?|#)?\s*[:\-]?\s*([A-Z0-9\-]+)\b",
+    ]
+    invoice_number = first_match(invoice_patterns, full_text)
+
+    store_patterns = [
+        r"\bSTORE\s*(?:NUMBER|NO\.?)\s*[:\-]?\s*([A-Z0-9\-]{2,})\b",
+    ]
+    store_number = first_match(store_patterns, full_text)
+
+    date_patterns = [
+        r"\b(?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])[/\-\.](?:20)?\d{2}\b",
+        r"\b(?:0?[1-9]|[12][0-9]|3[01])[\.\-/\s](?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)[\.\-/\s](?:20)?\d{2}\b",
+        r"\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+(?:0?[1-9]|[12][0-9]|3[01]),?\s+(?:20)?\d{2}\b",
+        r"\b(?:20)?\d{2}[/\-\.](?:0?[1-9]|1[0-2])[/\-\.](?:0?[1-9]|[12][0-9]|3[01])\b",
+    ]
+    invoice_date = None
+    for i, pattern in enumerate(date_patterns):
+        match = re.search(pattern, full_text, flags=re.IGNORECASE)
+        if match:
+            invoice_date = convert_date(match.group(0), year_first=i == 3)
+            break
+
+    sticker_date = None
+    if has_sticker:
+        for i, pattern in enumerate(date_patterns):
+            match = re.search(pattern, full_text, flags=re.IGNORECASE)
+            if match:
+                sticker_date = convert_date(match.group(0), year_first=i == 3)
+                break
+
+    total_qty = None
+    total_qty_patterns = [
+        r"\bTOTAL\s*(?:QTY|QUANTITY)\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+        r"\b(?:QTY|QUANTITY)\s*TOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+        r"\bTOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\s*(?:QTY|QUANTITY)\b",
+        r"\bTOTAL\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+        r"\b(?:QTY|QUANTITY)\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+        r"\bAMOUNT\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+        r"\bTOTAL\s*EACHES\s*SOLD\s*[:\-]?\s*([-]?[0-9,]+(?:\.[0-9]+)?)\b",
+    ]
+    for line in lines:
+        if re.search(r"\b(QTY|QUANTITY|TOTAL|AMOUNT)\b", line, re.IGNORECASE):
+            candidate = first_match(total_qty_patterns, line)
+            if candidate:
+                try:
+                    total_qty = float(candidate.replace(',', ''))
+                    break
+                except ValueError:
+                    continue
+    if total_qty is None:
+        candidate = first_match(total_qty_patterns, full_text)
+        if candidate:
+            try:
+                total_qty = float(candidate.replace(',', ''))
+            except ValueError:
+                pass
+
+    has_frito_lay = bool(re.search(r"\bFRITO\s*LAY\b", full_text, re.IGNORECASE))
+
+    return InvoiceFields(
+        invoice_number=invoice_number,
+        store_number=store_number,
+        invoice_date=invoice_date,
+        sticker_date=sticker_date,
+        total_quantity=total_qty,
+        has_frito_lay=has_frito_lay,
+        has_signature=signature_flag,
+        has_sticker=has_sticker,
+        is_valid="Valid" if has_sticker else "Invalid"
+    )
+
+
+GOLDEN_CORPUS = [
+    "",
+    "\n\n   \n",
+    "FRITO-LAY, INC.\nDELIVERY RECEIPT\nDOCUMENT NO: 37338500\nStore Number: 2516\nInvoice Date 07/04/2025\n"
+    "ITEM            QTY\nLAYS CLASSIC     12\nDORITOS NACHO    -3\nTOTAL QTY: 1,080\nSIGNATURE ________",
+    "Target Store #1234\nINVOICE # 4306447\nINVOICE DATE: 04.Jul.2025\nTotal Quantity 80\nFrito Lay",
+    "INVOICE DATE 2025-07-04\nINV NO. A-1234\nSTORE NO. 09\nTOTAL EACHES SOLD: 80\n",
+    "Document\nNumber\n: 555-12\nstore number\n0042\nfrito\nlay\nqty total 14.5",
+    "Delivered Jul 4, 2025 to Store Number 77\nInvoice: 9988\nAMOUNT 12.00\nTOTAL 15 QTY",
+    "INVOICE NUMBER 1111\nINVOICE 2222\nQTY: ,\nQUANTITY 7\n",
+    "TOTAL: ,,,\nTOTAL: 42\n",
+    "sticker 13/04/2025 received\ninvoice 31.12.25\n",
+    "Date 4 Sept 2025\nFRITOLAY\nTOTAL QUANTITY:- 96",
+    "25-12-31 INVENTORY\nINVENTORY 77\n",
+    "İNVOICE 8899\nSTORE NUMBER: 12\n TOTAL QTY 5",
+    "ſtore number 44\nınvoice 555\ntotal qty 3\r\nFRITO\x1cLAY",
+    "INVOICE\n\nDATE 01/02/2025\nTOTAL\n\n10\n",
+    "Frito Lay North America\nAMOUNT: -12.5\nSubtotal 40\nGrand TOTAL 41\n",
+]
+
+
+def _as_dict(fields):
+    return fields.model_dump()
+
+
+def test_golden_corpus_matches_reference():
+    for text in GOLDEN_CORPUS:
+        for signature_flag, has_sticker in [(False, False), (True, True), (False, True)]:
+            expected = reference_extract(text, signature_flag, has_sticker)
+            actual = extract_fields(text, signature_flag, has_sticker)
+            assert _as_dict(actual) == _as_dict(expected), text
+
+
+def test_year_first_dates_read_year_month_day():
+    # Checked against literal dates, not the normaliser: YY-MM-DD must not come back as DD-MM-YY
+    assert extract_fields("25-12-31 INVENTORY\nINVENTORY 77\n", False).invoice_date == "12/31/2025"
+    assert extract_fields("Date 25/07/04", False, has_sticker=True).sticker_date == "07/04/2025"
+
+
+def _random_text(rng):
+    tokens = [
+        "INVOICE", "Invoice", "INV", "INVENTORY", "DOCUMENT", "NO.", "#", "NUMBER", "DATE", "STORE", "Store",
+        "TOTAL", "Total", "QTY", "QUANTITY", "AMOUNT", "EACHES", "SOLD", "FRITO", "LAY", "Frito-Lay", ":", "-",
+        "12", "-7", "1,234", "3.5", ",", "A-77", "2516", "07/04/2025", "13/04/2025", "4.Jul.2025", "Jul 4, 2025",
+        "2025-07-04", "25/12/31", "Sept", "04", "2025", "x", "İNV", "ſTORE",
+    ]
+    seps = [" ", " ", " ", "\n", "\n", "\r\n", "\t", ""]
+    return "".join(rng.choice(tokens) + rng.choice(seps) for _ in range(rng.randint(0, 40)))
+
+
+def test_random_texts_match_reference():
+    rng = random.Random(1234)
+    for _ in range(3000):
+        text = _random_text(rng)
+        has_sticker = rng.random() < 0.5
+        assert _as_dict(extract_fields(text, False, has_sticker)) == _as_dict(reference_extract(text, False, has_sticker)), repr(text)
+
+
+def test_line_index_finds_first_keyword_lines():
+    index = LineIndex("header\nStore Number 1\ninvoice 2\nTOTAL QTY 3\n")
+    assert index.offsets["STORE"] == len("header\n")
+    assert index.offsets["INVOICE"] == index.offsets["INV"] == len("header\nStore Number 1\n")
+    assert [line for line, _ in index.qty_lines] == ["TOTAL QTY 3"]
+    assert set(index.offsets) <= set(KEYWORDS)
+
+
+def _row(y, *tokens, x=50):
+    words = []
+    for token in tokens:
+        width = len(token) * 12
+        words.append(Word(token, x, y, x + width, y + 20))
+        x += width + 10
+    return words
+
+
+def test_spatial_resolves_values_right_and_below():
+    words = (
+        _row(50, "Invoice", "Date", ":", "07/04/2025")
+        + _row(80, "Invoice", "No.", "#", "37338500", "Store", "Number", "2516")
+        + _row(160, "TOTAL", "QTY")
+        + _row(185, "1,080", x=55)
+    )
+    assert SpatialExtractor(words).extract() == {
+        "invoice_number": "37338500",
+        "store_number": "2516",
+        "invoice_date": "07/04/2025",
+        "total_quantity": 1080.0,
+    }
+
+
+def test_spatial_falls_back_to_regex_per_field():
+    # Nothing next to the store label and no quantity label in the layout: those come from the regex path
+    words = _row(10, "Store", "Number") + _row(40, "Invoice", "9988")
+    text = "Store Number\nInvoice 9988\nTOTAL QTY: 12"
+    fields = extract_fields(text, False, False, words=words)
+    assert fields.invoice_number == 9988
+    assert fields.store_number is None
+    assert fields.total_quantity == 12.0
+
+
+def benchmark(pages=2000):
+    rng = random.Random(7)
+    corpus = [_random_text(rng) * 4 for _ in range(pages // 2)] + GOLDEN_CORPUS * (pages // 2 // len(GOLDEN_CORPUS))
+
+    for name, fn in [("reference", reference_extract), ("engine", extract_fields)]:
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text, False, True)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10} {len(corpus) / elapsed:10.0f} pages/sec")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+# Folder watcher: existing and new PDFs are reported once they stop changing; rewritten files are reported again.
+import os
+import threading
+import time
+
+import pytest
+
+from folder_watcher import FolderWatcher
+
+
+def _collect(watcher, stop, seen):
+    for path in watcher.changes(stop):
+        seen.append(os.path.basename(path))
+
+
+def _wait_for(seen, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(seen) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return list(seen)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_reports_settled_new_and_changed_pdfs(tmp_path, use_inotify):
+    (tmp_path / "old.pdf").write_bytes(b"%PDF old")
+    (tmp_path / "notes.txt").write_bytes(b"not a pdf")
+    watcher = FolderWatcher(tmp_path, settle_seconds=0.3, poll_seconds=0.05, use_inotify=use_inotify)
+    stop, seen = threading.Event(), []
+    thread = threading.Thread(target=_collect, args=(watcher, stop, seen), daemon=True)
+    thread.start()
+    try:
+        assert _wait_for(seen, 1) == ["old.pdf"]
+
+        # Written in two parts: not reported until it has stopped changing
+        with open(tmp_path / "new.pdf", "wb") as f:
+            f.write(b"%PDF first half")
+            f.flush()
+            time.sleep(0.1)
+            assert seen == ["old.pdf"]
+            f.write(b" second half")
+        assert _wait_for(seen, 2) == ["old.pdf", "new.pdf"]
+
+        time.sleep(0.4)
+        assert seen == ["old.pdf", "new.pdf"]  # unchanged files are not reported twice
+
+        (tmp_path / "old.pdf").write_bytes(b"%PDF old, rescanned")
+        assert _wait_for(seen, 3) == ["old.pdf", "new.pdf", "old.pdf"]
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not thread.is_alive()
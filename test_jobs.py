@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Job queue: submit/complete with per-file progress, failures, and resuming unfinished jobs after a restart.
+import threading
+import time
+
+from jobs import JobManager, DONE, FAILED, QUEUED, RUNNING
+
+
+def _record(job):
+    for job_file in job.pending_files():
+        job.file_started(job_file)
+        if job_file.filename.startswith("bad"):
+            job.file_failed(job_file, "unreadable")
+        else:
+            job.file_done(job_file, {"filename": job_file.filename})
+    return {"files": len(job.files)}
+
+
+def test_submit_runs_in_background(tmp_path):
+    manager = JobManager(_record, tmp_path / "jobs.sqlite", workers=2)
+    job_id = manager.submit("batch", [("a.pdf", tmp_path / "a.pdf"), ("bad.pdf", tmp_path / "bad.pdf")])
+    manager.join()
+
+    job = manager.get(job_id)
+    assert job.status == DONE
+    assert job.summary == {"files": 2}
+    assert job.progress() == {"total": 2, "done": 1, "failed": 1, "running": 0, "queued": 0}
+    data = job.to_dict()
+    assert data["files"][0]["result"] == {"filename": "a.pdf"}
+    assert data["files"][1]["error"] == "unreadable"
+    assert manager.get("missing") is None
+
+
+def test_failing_job_is_marked_failed(tmp_path):
+    def explode(job):
+        raise RuntimeError("no OCR credentials")
+
+    manager = JobManager(explode, tmp_path / "jobs.sqlite", workers=1)
+    job_id = manager.submit("document", [("a.pdf", tmp_path / "a.pdf")])
+    manager.join()
+    job = manager.get(job_id)
+    assert job.status == FAILED
+    assert job.error == "no OCR credentials"
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    started, release = threading.Event(), threading.Event()
+
+    def first_file_then_hang(job):
+        first = job.files[0]
+        job.file_started(first)
+        job.file_done(first, {"filename": first.filename})
+        job.file_started(job.files[1])
+        started.set()
+        release.wait()  # the "process" stops here
+
+    crashed = JobManager(first_file_then_hang, path, workers=1, interactive_workers=0)
+    job_id = crashed.submit("batch", [("a.pdf", "a.pdf"), ("b.pdf", "b.pdf"), ("c.pdf", "c.pdf")])
+    queued_id = crashed.submit("document", [("d.pdf", "d.pdf")])
+    assert started.wait(5)
+
+    seen = []
+
+    def record_seen(job):
+        seen.extend(f.filename for f in job.pending_files())
+        return _record(job)
+
+    restarted = JobManager(record_seen, path, workers=1, interactive_workers=0)
+    restarted.join()
+
+    assert seen == ["b.pdf", "c.pdf", "d.pdf"]  # a.pdf had finished; the interrupted b.pdf starts over
+    assert restarted.get(job_id).status == DONE
+    assert restarted.get(job_id).progress()["done"] == 3
+    assert restarted.get(queued_id).status == DONE
+    assert restarted.get(queued_id).files[0].status != QUEUED
+    release.set()
+
+
+def test_single_documents_do_not_wait_for_batches(tmp_path):
+    release = threading.Event()
+
+    def slow_batches(job):
+        if job.kind == "batch":
+            release.wait(5)
+        return _record(job)
+
+    manager = JobManager(slow_batches, tmp_path / "jobs.sqlite", workers=1, interactive_workers=1)
+    batch_id = manager.submit("batch", [("a.pdf", "a.pdf")])
+    deadline = time.monotonic() + 5
+    while manager.get(batch_id).status != RUNNING and time.monotonic() < deadline:
+        time.sleep(0.01)
+    document_id = manager.submit("document", [("b.pdf", "b.pdf")])
+    while manager.get(document_id).status != DONE and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.get(document_id).status == DONE
+    assert manager.get(batch_id).status == RUNNING
+    release.set()
+    manager.join()
+    assert manager.get(batch_id).status == DONE
+
+
+def test_event_stream_follows_a_running_job(tmp_path):
+    release = threading.Event()
+
+    def staged(job):
+        for job_file in job.pending_files():
+            job.file_started(job_file)
+            job.emit("ocred", file=job_file.index, page=1)
+            release.wait(5)
+            job.file_done(job_file, {"filename": job_file.filename})
+
+    manager = JobManager(staged, tmp_path / "jobs.sqlite", workers=1)
+    job_id = manager.submit("batch", [("a.pdf", "a.pdf")])
+
+    names = []
+    for event in manager.events.follow(job_id, timeout=0.05):
+        if event is None:
+            release.set()  # idle heartbeat: let the job finish
+            continue
+        names.append(event[1])
+    assert names == ["job_started", "file_started", "ocred", "file_done", "job_finished"]
+
+    # A reconnecting reader resumes after the last event it saw
+    assert [e[1] for e in manager.events.follow(job_id, after=3)] == ["file_done", "job_finished"]
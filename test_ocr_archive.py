@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Round trip through the OCR archive and re-extraction of archived documents.
+import csv
+
+from models import InvoiceFields, OCRResult
+from ocr_archive import OCRArchive, iter_documents, part_files
+from reextract import reextract
+from spatial_extractor import Word
+
+
+def _result(filename, invoice_number, sticker_flag=False):
+    master_fields = InvoiceFields(invoice_number=invoice_number)
+    if not sticker_flag:
+        master_fields.sticker_date = "Not Available"
+    return OCRResult(
+        filename=filename,
+        total_pages=2,
+        master_fields=master_fields,
+        fields_found=[],
+        page_details=[],
+        sticker_flag=sticker_flag,
+        signature_flag=False,
+    )
+
+
+def test_archive_round_trip(tmp_path):
+    archive = OCRArchive(tmp_path)
+    words = [Word("Invoice", 10, 10, 80, 30), Word("4306447", 90, 10, 170, 30)]
+    archive.add_document(_result("a.pdf", "4306447"), [(2, None, [], None), (1, "Invoice 4306447", words, None)])
+    archive.close()
+
+    [part] = part_files(tmp_path)
+    [doc] = list(iter_documents(part))
+    assert doc["filename"] == "a.pdf"
+    assert [page for page, _, _ in doc["pages"]] == [1, 2]
+    assert doc["pages"][0][2] == words
+    assert doc["pages"][1][1] is None
+    assert doc["fields"]["invoice_number"] == 4306447
+
+
+def test_reextract_reports_changed_fields_for_latest_document(tmp_path):
+    archive = OCRArchive(tmp_path / "archive", part_rows=1)
+    # Older run of b.pdf, then a newer one whose archived invoice number no longer matches the engine
+    archive.add_document(_result("b.pdf", "1"), [(1, "Invoice 1", [], None)])
+    archive.add_document(_result("b.pdf", "7"), [(1, "Invoice 2\nTOTAL QTY 5", [], None)])
+    archive.add_document(_result("c.pdf", None), [(1, "", [], None)])
+    archive.close()
+
+    summary = reextract(tmp_path / "archive", tmp_path / "out.csv", tmp_path / "diff.csv", workers=2)
+    assert summary["documents"] == 2
+    assert summary["changed_documents"] == 1
+
+    with open(tmp_path / "diff.csv") as diff_file:
+        diff = [(row["filename"], row["field"], row["old_value"], row["new_value"]) for row in csv.DictReader(diff_file)]
+    assert diff == [("b.pdf", "invoice_number", "7", "2"), ("b.pdf", "total_quantity", "", "5.0")]
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# Page hash index: near-duplicate lookup, same-name pages kept apart, banded candidates, persistence.
+import cv2
+import numpy as np
+
+from page_dedupe import PageHashIndex
+
+
+def _page(seed: int) -> np.ndarray:
+    blocks = np.random.default_rng(seed).integers(0, 256, (16, 12), dtype=np.uint8)
+    return cv2.resize(blocks, (600, 800), interpolation=cv2.INTER_NEAREST)
+
+
+def test_pages_with_the_same_source_do_not_share_results():
+    index = PageHashIndex()
+    a, b = index.hash_page(_page(1)), index.hash_page(_page(2))
+    index.add(a, "invoice.pdf#1", detections=["sticker"])
+    index.add(a, "invoice.pdf#1", full_text="page A")  # OD and OCR of the same page merge
+    index.add(b, "invoice.pdf#1", full_text="page B")  # another file of the same name
+
+    assert len(index.entries) == 2
+    assert index.lookup(a, "full_text")["full_text"] == "page A"
+    assert index.lookup(a, "detections")["detections"] == ["sticker"]
+    assert index.lookup(b, "full_text")["full_text"] == "page B"
+    assert index.lookup(b, "detections") is None
+
+
+def test_near_duplicates_found_through_bands_and_after_reload(tmp_path):
+    path = tmp_path / "page_hashes.json"
+    index = PageHashIndex(path=path)
+    for seed in range(200):
+        index.add(index.hash_page(_page(seed)), f"f{seed}.pdf#1", full_text=f"text {seed}")
+    index.save()
+
+    rescan = _page(7).astype(np.int16) + np.random.default_rng(99).integers(-3, 4, (800, 600))
+    rescan = index.hash_page(np.clip(rescan, 0, 255).astype(np.uint8))
+    reloaded = PageHashIndex(path=path)
+    assert reloaded.lookup(rescan, "full_text")["full_text"] == "text 7"
+    assert reloaded.lookup(PageHashIndex.hash_page(_page(1000)), "full_text") is None
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Page content gate: blank backs and separator sheets skip OCR, text pages do not, and skips are counted.
+import threading
+
+import cv2
+import numpy as np
+
+from page_gate import PageContentGate
+
+
+def _blank_page():
+    return np.full((1100, 850), 250, dtype=np.uint8)
+
+
+def _separator_sheet():
+    # A few heavy bars: enough ink and contrast, but only a handful of blobs
+    page = _blank_page()
+    for top in (200, 500, 800):
+        page[top:top + 40, 100:750] = 30
+    return page
+
+
+def _text_page():
+    page = np.full((1100, 850, 3), 255, dtype=np.uint8)
+    for line in range(25):
+        cv2.putText(page, f"INVOICE 4306447 STORE 2516 QTY {line}", (40, 60 + line * 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    return page
+
+
+def test_blank_and_separator_pages_skip_text_pages_do_not():
+    gate = PageContentGate()
+    reason, stats = gate.check(_blank_page())
+    assert reason.startswith("ink ratio") and stats.components == 0
+
+    reason, stats = gate.check(_separator_sheet())
+    assert stats.ink_ratio >= gate.min_ink_ratio and stats.variance >= gate.min_variance
+    assert reason == f"3 connected components below {gate.min_components}"
+
+    reason, stats = gate.check(_text_page())
+    assert reason is None and stats.components > 100
+    assert gate.ocr_calls_avoided == 2
+
+
+def test_skips_counted_from_many_threads():
+    gate, blank = PageContentGate(), _blank_page()[:200, :200]
+    threads = [threading.Thread(target=lambda: [gate.check(blank) for _ in range(50)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gate.ocr_calls_avoided == 400
+
+
+def test_disabled_gate_checks_nothing():
+    gate = PageContentGate(enabled=False)
+    assert gate.check(_blank_page()) == (None, None)
+    assert gate.ocr_calls_avoided == 0
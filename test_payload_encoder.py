@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+# Vision payload encoder: grayscale, downscaling to the long edge, JPEG/WebP at the set quality, PNG passthrough.
+import cv2
+import numpy as np
+
+from payload_encoder import PayloadEncoder
+
+
+def _page(height=1600, width=1200):
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    page[:, : width // 2] = (40, 120, 200)
+    for line in range(20):
+        cv2.putText(page, f"INVOICE 4306447 LINE {line}", (30, 70 + line * 70), cv2.FONT_HERSHEY_SIMPLEX, 1.2,
+                    (0, 0, 0), 2)
+    return page
+
+
+def test_grayscale_and_downscale_to_long_edge():
+    encoder = PayloadEncoder("png", max_long_edge=800, grayscale=True)
+    decoded = cv2.imdecode(np.frombuffer(encoder.encode(_page()), np.uint8), cv2.IMREAD_UNCHANGED)
+    assert decoded.shape == (800, 600)  # one channel, long edge 1600 -> 800, aspect kept
+
+    small = PayloadEncoder("png", max_long_edge=2000).prepare(_page())
+    assert small.shape == (1600, 1200, 3)  # never upscaled
+
+
+def test_jpeg_and_webp_at_the_configured_quality():
+    page = _page()
+    for fmt, ext, flag, magic in [("jpeg", ".jpg", cv2.IMWRITE_JPEG_QUALITY, b"\xff\xd8"),
+                                  ("webp", ".webp", cv2.IMWRITE_WEBP_QUALITY, b"RIFF")]:
+        low, high = PayloadEncoder(fmt, quality=30).encode(page), PayloadEncoder(fmt, quality=90).encode(page)
+        assert low.startswith(magic) and high.startswith(magic)
+        assert low == cv2.imencode(ext, page, [flag, 30])[1].tobytes()
+        assert len(low) < len(high)
+
+
+def test_png_passthrough_is_unchanged(tmp_path):
+    path = tmp_path / "page_0.png"
+    cv2.imwrite(str(path), _page())
+    encoder = PayloadEncoder.from_spec("original")
+    assert encoder.is_passthrough
+    assert encoder.encode_file(str(path), image=_page()) == path.read_bytes()
+
+
+def test_from_spec():
+    encoder = PayloadEncoder.from_spec("webp:70:1600:gray")
+    assert (encoder.fmt, encoder.quality, encoder.max_long_edge, encoder.grayscale) == ("webp", 70, 1600, True)
+    assert encoder.describe() == "webp:70:1600:gray"
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Staged pipeline: every item passes every stage, queues stay bounded, failures pass through, metrics name the bottleneck.
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+
+import pytest
+
+from pipeline_engine import Pipeline, Stage, parse_stages, THREAD, ASYNC
+
+
+@dataclass
+class Item:
+    n: int
+    seen: list = field(default_factory=list)
+    error: str = None
+
+
+def _step(name, seconds=0.0):
+    def fn(item):
+        time.sleep(seconds)
+        if name == "explode" and item.n == 3:
+            raise ValueError("bad page")
+        item.seen.append(name)
+        return item
+    return fn
+
+
+def test_items_pass_every_stage_with_bounded_queues():
+    pipeline = Pipeline([Stage("fast", _step("fast")), Stage("slow", _step("slow", 0.01), workers=2),
+                         Stage("write", _step("write"))], queue_size=2)
+    out = list(pipeline.run(Item(n) for n in range(20)))
+
+    assert sorted(item.n for item in out) == list(range(20))
+    assert all(item.seen == ["fast", "slow", "write"] for item in out)
+    metrics = pipeline.metrics()
+    assert all(stage["max_queue"] <= 2 for stage in metrics["stages"].values())
+    assert metrics["stages"]["slow"]["items"] == 20
+    assert metrics["bottleneck"] == "slow"
+    assert metrics["stages"]["fast"]["blocked_seconds"] > 0  # held back by the slow stage's full queue
+
+
+def test_failed_items_skip_later_stages_except_always():
+    pipeline = Pipeline([Stage("explode", _step("explode")), Stage("ocr", _step("ocr")),
+                         Stage("write", _step("write"), always=True)])
+    out = {item.n: item for item in pipeline.run(Item(n) for n in range(5))}
+
+    assert out[3].error == "bad page"
+    assert out[3].seen == ["write"]
+    assert out[0].seen == ["explode", "ocr", "write"]
+    assert pipeline.metrics()["stages"]["explode"]["errors"] == 1
+
+
+def test_async_stage_overlaps_its_items():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    async def call_vision(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        item.seen.append("ocr")
+        return item
+
+    pipeline = Pipeline([Stage("rasterize", _step("rasterize"), THREAD, 2), Stage("ocr", call_vision, ASYNC, 4)],
+                        queue_size=8)
+    out = list(pipeline.run(Item(n) for n in range(12)))
+
+    assert len(out) == 12 and all(item.seen == ["rasterize", "ocr"] for item in out)
+    assert peak[0] > 1
+
+
+def test_parse_stages():
+    assert parse_stages("rasterize=thread:2, detect=process:1,ocr=async") == {
+        "rasterize": ("thread", 2), "detect": ("process", 1), "ocr": ("async", 1)}
+    with pytest.raises(ValueError):
+        parse_stages("ocr=fiber:2")
+
+
+def test_async_stage_runs_sync_functions_workers_way():
+    pipeline = Pipeline([Stage("ocr", _step("ocr", 0.2), ASYNC, 16)], queue_size=16)
+    start = time.perf_counter()
+    out = list(pipeline.run(Item(n) for n in range(16)))
+
+    assert len(out) == 16
+    assert time.perf_counter() - start < 0.35  # one item's time, not 16 / (cpu + 4) of them
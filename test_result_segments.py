@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Sharded runs: content-hash partitioning, remembered hashes, per-shard segments, and the incremental, deduplicating merge.
+import hashlib
+import os
+
+import batch_inputs
+from batch_inputs import Shard
+from batch_manifest import BatchManifest
+from models import ExcelRow
+from result_segments import ResultSegment, merge_segments
+from result_store import ResultStore
+
+
+def _row(filename, invoice_number):
+    return ExcelRow(filename=filename, invoice_number=invoice_number, total_quantity=1.0)
+
+
+def test_every_hash_has_exactly_one_shard():
+    shards = [Shard.parse(f"{i}/3") for i in (1, 2, 3)]
+    hashes = [hashlib.sha256(str(n).encode()).hexdigest() for n in range(300)]
+    owners = [[s for s in shards if s.owns(h)] for h in hashes]
+    assert all(len(o) == 1 for o in owners)
+    assert all(sum(o[0] is s for o in owners) > 50 for s in shards)
+    assert Shard.parse("3/12").label == "shard-03-of-12"
+
+
+def test_shard_hashes_only_new_or_changed_files(tmp_path, monkeypatch):
+    paths = []
+    for n in range(30):
+        path = tmp_path / f"{n}.pdf"
+        path.write_bytes(b"%PDF-1.4 " + str(n).encode())
+        paths.append(str(path))
+    reads = []
+    real_hash = batch_inputs.input_hash
+    monkeypatch.setattr(batch_inputs, "input_hash", lambda path: reads.append(path) or real_hash(path))
+    shard, manifest = Shard(1, 3), BatchManifest(tmp_path / "manifest.shard-1-of-3.sqlite")
+
+    first = list(shard.select(paths, manifest, chunk_size=7))
+    assert len(reads) == 30 and 0 < len(first) < 30
+    reads.clear()
+    assert list(shard.select(paths, manifest, chunk_size=7)) == first
+    assert reads == []  # every input, owned or not, was remembered
+
+    os.utime(paths[4], (1, 1))
+    assert list(shard.select(paths, manifest)) == first
+    assert reads == [paths[4]]
+
+
+def test_merge_is_incremental_and_keeps_newest_row(tmp_path, monkeypatch):
+    segments, store = tmp_path / "segments", ResultStore(tmp_path / "results.sqlite")
+    first = ResultSegment.for_shard(Shard(1, 2), segments)
+    second = ResultSegment.for_shard(Shard(2, 2), segments)
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("result_segments.time.time", lambda: next(clock))
+
+    first.add_many([(_row("a.pdf", 1), "h1"), (_row("b.pdf", 2), "h2")])
+    second.add_many([(_row("c.pdf", 3), "h3")])
+    assert merge_segments(store, segments) == 3
+    assert merge_segments(store, segments) == 0  # nothing new
+
+    # A line still being written is left for the next merge
+    second.add_many([(_row("a.pdf", 10), "h4")])
+    with open(second.path, "ab") as f:
+        f.write(b'{"content_hash": "h5", "stored_')
+    assert merge_segments(store, segments) == 1
+    first.add_many([(_row("b.pdf", 20), "h6")])
+    second.add_many([(_row("c.pdf", 30), "h7")])  # ends the cut-off line, skipped as damaged
+    assert merge_segments(store, segments) == 2
+
+    latest = store.latest()
+    assert sorted(zip(latest["filename"], latest["invoice_number"])) == [("a.pdf", 10), ("b.pdf", 20), ("c.pdf", 30)]
+
+    # An older row arriving late from a slow shard does not replace a newer one
+    monkeypatch.setattr("result_segments.time.time", lambda: 50)
+    first.add_many([(_row("a.pdf", 99), "h8")])
+    assert merge_segments(store, segments) == 0
+    assert dict(zip(store.latest()["filename"], store.latest()["invoice_number"]))["a.pdf"] == 10
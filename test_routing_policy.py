@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# OD-driven routing: dominant "bad" pages and pages without a required class skip OCR; the batch report adds up.
+from models import InvoiceFields, OCRResult
+from routing_policy import RoutingPolicy, RoutingReport, class_shares, ROUTE_OCR, ROUTE_SKIP
+
+
+def _det(class_name, bbox, score=1.0):
+    return {"class_name": class_name, "bbox": bbox, "score": score}
+
+
+def test_skip_when_bad_dominates():
+    policy = RoutingPolicy(skip_dominant=("bad",), dominance_ratio=0.5)
+    bad_page = [_det("bad", (0, 0, 100, 100)), _det("sticker", (0, 0, 50, 50))]  # 80% of the weighted area
+    decision = policy.decide(bad_page)
+    assert (decision.route, decision.run_ocr) == (ROUTE_SKIP, False)
+    assert decision.reason == "'bad' dominates the page (80% of detected area)"
+
+    # The same boxes with a low-confidence "bad" no longer dominate
+    assert policy.decide([_det("bad", (0, 0, 100, 100), 0.2), _det("sticker", (0, 0, 50, 50))]).run_ocr
+    assert class_shares([_det("bad", (0, 0, 100, 100), 0.2), _det("sticker", (0, 0, 50, 50))]) == {
+        "bad": 2000 / 4500, "sticker": 2500 / 4500}
+
+
+def test_only_ocr_with_receipt_outline():
+    policy = RoutingPolicy(skip_dominant=(), require_any=("receipt_outline",))
+    assert policy.decide([_det("receipt_outline", (0, 0, 10, 10)), _det("sticker", (0, 0, 90, 90))]).run_ocr
+    decision = policy.decide([_det("sticker", (0, 0, 90, 90))])
+    assert (decision.route, decision.reason) == (ROUTE_SKIP, "none of receipt_outline detected")
+
+
+def test_no_detections_default():
+    assert RoutingPolicy().decide([]).route == ROUTE_OCR
+    assert RoutingPolicy(require_any=("receipt_outline",)).decide([]).route == ROUTE_SKIP
+
+
+def _result(route, pages, ocr_calls, skipped=0, reused=0, od_seconds=0.5, ocr_seconds=1.0, detections_reused_from=None):
+    return OCRResult(filename="a.pdf", total_pages=pages, master_fields=InvoiceFields(), fields_found=[],
+                     page_details=[], route=route, ocr_calls=ocr_calls, pages_skipped=skipped, pages_reused=reused,
+                     od_seconds=od_seconds, ocr_seconds=ocr_seconds, detections_reused_from=detections_reused_from)
+
+
+def test_summary_adds_up_a_batch():
+    report = RoutingReport(cost_per_1000_pages=1.5)
+    report.add(_result(ROUTE_OCR, pages=4, ocr_calls=2, skipped=1, reused=1))
+    report.add(_result(ROUTE_SKIP, pages=3, ocr_calls=0, ocr_seconds=0.0))
+    report.add(_result(ROUTE_OCR, pages=1, ocr_calls=1, od_seconds=0.0, detections_reused_from="b.pdf#1"))
+    summary = report.summary()
+
+    assert (summary["documents"], summary["pages"], summary["routes"]) == (3, 8, {ROUTE_OCR: 2, ROUTE_SKIP: 1})
+    assert (summary["ocr_calls"], summary["ocr_calls_avoided"]) == (3, 5)
+    assert (summary["ocr_calls_avoided_by_route"], summary["ocr_calls_avoided_blank"],
+            summary["ocr_calls_avoided_duplicate"]) == (3, 1, 1)
+    assert (summary["od_calls"], summary["od_reused"]) == (2, 1)
+    assert (summary["od_seconds"], summary["ocr_seconds"], summary["avg_seconds_per_document"]) == (1.0, 2.0, 1.0)
+    assert (summary["estimated_ocr_cost"], summary["estimated_ocr_savings"]) == (0.0045, 0.0075)
+    assert RoutingReport().summary()["avg_seconds_per_document"] == 0.0
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Shared work queue: exclusive claims, lease expiry and fencing, retries with backoff, dead letters, status.
+import os
+import threading
+import time
+
+from work_queue import WorkQueue, READY, LEASED, DONE, DEAD
+
+
+def test_each_task_is_claimed_once(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    ids = [queue.put(tmp_path / f"{i}.pdf") for i in range(40)]
+    assert queue.put(tmp_path / "0.pdf", task_id=ids[0]) == ids[0]  # already queued: not added again
+
+    claimed = {}
+
+    def worker(owner):
+        while True:
+            tasks = queue.claim(owner, limit=3)
+            if not tasks:
+                return
+            claimed.setdefault(owner, []).extend(task.id for task in tasks)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    everything = [task_id for owned in claimed.values() for task_id in owned]
+    assert sorted(everything) == sorted(ids)
+    assert queue.status()["counts"] == {READY: 0, LEASED: 40, DONE: 0, DEAD: 0}
+
+
+def test_failures_retry_then_dead_letter(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", max_attempts=2, retry_seconds=0.05)
+    task_id = queue.put(tmp_path / "a.pdf")
+    task = queue.claim("w1")[0]
+    assert queue.fail(task, "Vision quota exceeded")
+    assert queue.claim("w1") == []  # backing off
+    time.sleep(0.06)
+    task = queue.claim("w2")[0]
+    assert (task.attempts, task.errors) == (2, ["Vision quota exceeded"])
+    assert queue.fail(task, "still failing")
+    assert queue.get(task_id).state == DEAD
+    assert [t.error for t in queue.finished([task_id])] == ["still failing"]
+
+    assert queue.retry() == 1
+    task = queue.claim("w1")[0]
+    assert queue.complete(task, {"filename": "a.pdf"}, "h1")
+    assert queue.finished([task_id])[0].result == {"filename": "a.pdf"}
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", lease_seconds=10, retry_seconds=0)
+    task_id = queue.put(tmp_path / "a.pdf")
+    stale = queue.claim("crashed")[0]
+    leased = tmp_path / "queue" / LEASED / f"{task_id}.crashed.json"
+    os.utime(leased, (time.time() - 20, time.time() - 20))  # no heartbeat for 20 seconds
+    assert queue.status()["leases"][0]["expired"]
+
+    task = queue.claim("w2")[0]
+    assert task.errors == ["lease held by crashed expired"]
+    assert queue.heartbeat([stale, task]) == [stale]
+    assert not queue.complete(stale, {"filename": "a.pdf"})  # the old holder's result is dropped
+    assert queue.complete(task, {"filename": "a.pdf"})
+    assert queue.status()["counts"] == {READY: 0, LEASED: 0, DONE: 1, DEAD: 0}
+
+
+def test_task_stranded_mid_state_change_is_recovered(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", lease_seconds=10, retry_seconds=0)
+    interrupted, finished = queue.put(tmp_path / "a.pdf"), queue.put(tmp_path / "b.pdf")
+    for task in queue.claim("crashed", limit=2):
+        taken = queue._take(queue._leased_path(task))  # the process dies right after this rename
+        if task.id == finished:
+            queue._write(tmp_path / "queue" / DONE / f"{task.id}.json", task)  # ... or after writing the result
+        os.utime(taken, (time.time() - 20, time.time() - 20))
+    assert queue.get(interrupted) is None
+    assert queue.missing([interrupted, finished, "gone"]) == ["gone"]
+    leases = queue.status()["leases"]
+    assert sorted(lease["task_id"] for lease in leases) == sorted([interrupted, finished])
+    assert all(lease["expired"] and lease["stranded"] for lease in leases)
+
+    task = queue.claim("w2")[0]
+    assert (task.id, task.errors) == (interrupted, ["state change by crashed was interrupted"])
+    assert queue.get(finished).state == DONE
+    assert os.listdir(tmp_path / "queue" / LEASED) == [f"{interrupted}.w2.json"]
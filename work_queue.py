@@ -0,0 +1,414 @@
+# work_queue.py
+"""
+Work queue shared by several hosts through a folder, with no broker.
+
+The app (with WORK_QUEUE_ENABLED) puts the files of each upload job here,
+and ``batch_processor.py --queue`` workers on any host that mounts the
+folder take them. Each task is a small JSON file, and its folder is its
+state:
+
+    ready/<available at, ms>.<task id>.json   waiting; taken in name order once available
+    leased/<task id>.<owner>.json             claimed by a worker; mtime is its last heartbeat
+    done/<task id>.json                       finished, with the result
+    dead/<task id>.json                       failed WORK_QUEUE_MAX_ATTEMPTS times
+
+Every state change is a rename. A rename is atomic on local disks and on
+NFS, and of several workers renaming the same file exactly one succeeds.
+That is the only locking. SQLite is not used here because its locks are not
+reliable across hosts on a network filesystem.
+
+- ``claim`` moves a ready task to leased and counts an attempt.
+- A worker must ``heartbeat`` its tasks more often than ``lease_seconds``.
+  If it stops (the host died, the process hung), any worker's next claim
+  finds the expired lease and puts the task back: to ready after a delay,
+  or to dead once it has used all its attempts.
+- ``complete`` and ``fail`` first rename the holder's lease file. A worker
+  whose lease expired and was taken over gets False and must drop its
+  result, so a task is never finished twice.
+- That rename gives the file a hidden name (``.<name>.taken-<random>``)
+  until the state change is written. If the process dies in between, the
+  hidden file is stranded. After ``lease_seconds`` it counts as an expired
+  lease: it is dropped if the task got to its next state, otherwise the
+  task is put back like any other expired lease.
+
+Lease expiry compares file mtimes with this host's clock. Host clocks must
+therefore agree to well within the lease time.
+
+    python work_queue.py status|dead|retry|enqueue|purge   (see --help)
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Optional
+
+from batch_inputs import iter_inputs, resolve_input
+from config import (WORK_QUEUE_DIR, WORK_QUEUE_ENABLED, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS,
+                    WORK_QUEUE_RETRY_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+READY, LEASED, DONE, DEAD = "ready", "leased", "done", "dead"
+STATES = (READY, LEASED, DONE, DEAD)
+
+
+def default_owner() -> str:
+    """This process's name in lease files: host and pid"""
+    return f"{socket.gethostname()}-{os.getpid()}".replace(".", "_")
+
+
+@dataclass
+class Task:
+    id: str
+    path: str
+    filename: str
+    job_id: Optional[str] = None
+    enqueued_at: float = 0.0
+    attempts: int = 0
+    owner: Optional[str] = None
+    errors: list = field(default_factory=list)  # one per failed attempt
+    result: Optional[dict] = None  # OCRResult as JSON, once done
+    content_hash: str = ""
+    finished_at: Optional[float] = None
+    state: str = READY
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.errors[-1] if self.errors else None
+
+
+class WorkQueue:
+    """Folder-backed task queue with leases, retries and dead letters (see the module docstring)"""
+
+    def __init__(self, root=WORK_QUEUE_DIR, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS,
+                 max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS, retry_seconds: float = WORK_QUEUE_RETRY_SECONDS):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        for state in STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls):
+        """The queue the app hands upload jobs to, or None when WORK_QUEUE_ENABLED is off"""
+        if not WORK_QUEUE_ENABLED:
+            return None
+        return cls()
+
+    def _names(self, state: str) -> list:
+        # Names starting with "." are files in the middle of a state change
+        return [name for name in os.listdir(self.root / state) if not name.startswith(".")]
+
+    def _stranded(self, state: str) -> list:
+        """(path, original name, age) of taken files in ``state`` whose state change has not finished for lease_seconds"""
+        now = time.time()
+        stranded = []
+        for name in os.listdir(self.root / state):
+            if not name.startswith(".") or ".taken-" not in name:
+                continue
+            path = self.root / state / name
+            try:
+                age = now - path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age >= self.lease_seconds:
+                stranded.append((path, name[1:].rsplit(".taken-", 1)[0], age))
+        return stranded
+
+    def _read(self, path: Path, state: str) -> Task:
+        task = Task(**json.loads(path.read_text(encoding="utf-8")))
+        task.state = state
+        return task
+
+    def _write(self, path: Path, task: Task):
+        """Write ``task`` to ``path`` in one step: readers see the old file or the new one, never half of it"""
+        tmp = path.with_name(f".{path.name}.tmp-{uuid.uuid4().hex[:8]}")
+        tmp.write_text(json.dumps(asdict(task), default=str), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _take(self, path: Path) -> Optional[Path]:
+        """Rename ``path`` to a name only this call knows; None if another worker moved it first"""
+        original = path.name[1:].rsplit(".taken-", 1)[0] if path.name.startswith(".") else path.name
+        taken = path.with_name(f".{original}.taken-{uuid.uuid4().hex[:8]}")
+        try:
+            os.rename(path, taken)
+        except FileNotFoundError:
+            return None
+        os.utime(taken)  # the time the state change started, for _stranded
+        return taken
+
+    def _ready_path(self, task_id: str, available_at: float) -> Path:
+        return self.root / READY / f"{int(available_at * 1000):015d}.{task_id}.json"
+
+    def _leased_path(self, task: Task) -> Path:
+        return self.root / LEASED / f"{task.id}.{task.owner}.json"
+
+    def get(self, task_id: str) -> Optional[Task]:
+        for state in (DONE, DEAD):
+            path = self.root / state / f"{task_id}.json"
+            if path.exists():
+                return self._read(path, state)
+        for name in self._names(LEASED):
+            if name.split(".", 1)[0] == task_id:
+                return self._read(self.root / LEASED / name, LEASED)
+        for name in self._names(READY):
+            if name.split(".")[1] == task_id:
+                return self._read(self.root / READY / name, READY)
+        return None
+
+    def put(self, path, filename: str = None, task_id: str = None, job_id: str = None) -> str:
+        """Queue a file and return its task id. A task id that is already queued is not added again."""
+        if task_id is not None and self.get(task_id) is not None:
+            return task_id
+        now = time.time()
+        task = Task(task_id or uuid.uuid4().hex, resolve_input(path), filename or Path(path).name,
+                    job_id=job_id, enqueued_at=now)
+        self._write(self._ready_path(task.id, now), task)
+        logger.debug("Task queued", extra={"task_id": task.id, "document": task.filename})
+        return task.id
+
+    def claim(self, owner: str, limit: int = 1) -> list:
+        """Lease up to ``limit`` available tasks to ``owner``, oldest first"""
+        self.reclaim_expired()
+        now = time.time()
+        claimed = []
+        for name in sorted(self._names(READY)):
+            available_at, task_id, _ = name.split(".")
+            if len(claimed) >= limit or int(available_at) > now * 1000:
+                break
+            source = self.root / READY / name
+            leased = self.root / LEASED / f"{task_id}.{owner}.json"
+            try:
+                os.utime(source)  # the lease starts now: rename keeps the mtime
+                os.rename(source, leased)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            task = self._read(leased, LEASED)
+            task.attempts += 1
+            task.owner = owner
+            self._write(leased, task)
+            claimed.append(task)
+        return claimed
+
+    def heartbeat(self, tasks) -> list:
+        """Renew the leases of ``tasks``; returns those whose lease was lost"""
+        lost = []
+        for task in tasks:
+            try:
+                os.utime(self._leased_path(task))
+            except FileNotFoundError:
+                lost.append(task)
+        return lost
+
+    def complete(self, task: Task, result: dict = None, content_hash: str = "") -> bool:
+        """Finish a leased task; False if the lease was lost (the task is someone else's now)"""
+        taken = self._take(self._leased_path(task))
+        if taken is None:
+            return False
+        task.result, task.content_hash, task.finished_at = result, content_hash, time.time()
+        self._write(self.root / DONE / f"{task.id}.json", task)
+        taken.unlink()
+        return True
+
+    def fail(self, task: Task, error: str) -> bool:
+        """Give a leased task back to be retried later, or dead-letter it; False if the lease was lost"""
+        taken = self._take(self._leased_path(task))
+        if taken is None:
+            return False
+        self._retry_or_bury(taken, error)
+        return True
+
+    def _retry_or_bury(self, taken: Path, error: str):
+        task = self._read(taken, LEASED)
+        task.errors.append(error)
+        task.owner = None
+        if task.attempts >= self.max_attempts:
+            task.finished_at = time.time()
+            self._write(self.root / DEAD / f"{task.id}.json", task)
+            logger.warning("Task dead-lettered after %d attempt(s): %s", task.attempts, error,
+                           extra={"task_id": task.id, "document": task.filename})
+        else:
+            delay = self.retry_seconds * 2 ** (task.attempts - 1)
+            self._write(self._ready_path(task.id, time.time() + delay), task)
+            logger.info("Task retried in %.0fs: %s", delay, error, extra={"task_id": task.id, "document": task.filename})
+        taken.unlink()
+
+    def reclaim_expired(self) -> int:
+        """Put tasks whose lease has not been renewed for lease_seconds back in the queue.
+
+        Tasks stranded in the middle of a state change (see the module
+        docstring) are recovered here too.
+        """
+        now = time.time()
+        reclaimed = 0
+        for name in self._names(LEASED):
+            path = self.root / LEASED / name
+            try:
+                if now - path.stat().st_mtime < self.lease_seconds:
+                    continue
+            except FileNotFoundError:
+                continue
+            taken = self._take(path)
+            if taken is not None:
+                owner = name[:-len(".json")].split(".", 1)[1]
+                self._retry_or_bury(taken, f"lease held by {owner} expired")
+                reclaimed += 1
+        for state in (LEASED, DEAD):
+            for path, name, _ in self._stranded(state):
+                taken = self._take(path)
+                if taken is not None:
+                    reclaimed += self._recover(taken, name, state)
+        return reclaimed
+
+    def _recover(self, taken: Path, name: str, state: str) -> int:
+        """Finish or undo the interrupted state change of a stranded file; 1 if its task was put back"""
+        task_id = name.split(".", 1)[0]
+        if self.get(task_id) is not None:
+            taken.unlink()  # the new state was written before the process died
+            return 0
+        if state == DEAD:
+            os.replace(taken, self.root / DEAD / name)  # an interrupted retry: the task stays dead
+            return 0
+        owner = name[:-len(".json")].split(".", 1)[1]
+        self._retry_or_bury(taken, f"state change by {owner} was interrupted")
+        return 1
+
+    def missing(self, task_ids) -> list:
+        """The tasks among ``task_ids`` that are in no state at all, e.g. deleted from the folder"""
+        missing = list(task_ids)
+        for _ in range(2):  # a task moving between states while the folders are listed is found by the second look
+            present = set()
+            for state in (READY, LEASED, DEAD):
+                for name in os.listdir(self.root / state):
+                    name = name[1:] if name.startswith(".") else name
+                    present.add(name.split(".")[1] if state == READY else name.split(".", 1)[0])
+            missing = [task_id for task_id in missing
+                       if task_id not in present and not (self.root / DONE / f"{task_id}.json").exists()]
+        return missing
+
+    def finished(self, task_ids) -> list:
+        """The tasks among ``task_ids`` that are done or dead"""
+        tasks = []
+        for task_id in task_ids:
+            for state in (DONE, DEAD):
+                path = self.root / state / f"{task_id}.json"
+                try:
+                    tasks.append(self._read(path, state))
+                    break
+                except FileNotFoundError:
+                    continue
+        return tasks
+
+    def retry(self, task_ids=None) -> int:
+        """Queue dead tasks again (all of them when ``task_ids`` is None), with their attempts reset"""
+        names = self._names(DEAD) if task_ids is None else [f"{task_id}.json" for task_id in task_ids]
+        retried = 0
+        for name in names:
+            taken = self._take(self.root / DEAD / name)
+            if taken is None:
+                continue
+            task = self._read(taken, DEAD)
+            task.attempts, task.finished_at = 0, None
+            self._write(self._ready_path(task.id, time.time()), task)
+            taken.unlink()
+            retried += 1
+        return retried
+
+    def purge(self, older_than: float) -> int:
+        """Delete done tasks finished more than ``older_than`` seconds ago"""
+        cutoff = time.time() - older_than
+        purged = 0
+        for name in self._names(DONE):
+            path = self.root / DONE / name
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    purged += 1
+            except FileNotFoundError:
+                continue
+        return purged
+
+    def status(self) -> dict:
+        """Task counts per state, the age of the oldest available task, and the current leases"""
+        now = time.time()
+        ready = sorted(self._names(READY))
+        available = [name for name in ready if int(name.split(".")[0]) <= now * 1000]
+        leases = []
+        for name in self._names(LEASED):
+            task_id, owner = name[:-len(".json")].split(".", 1)
+            try:
+                age = now - (self.root / LEASED / name).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            leases.append({"task_id": task_id, "owner": owner, "heartbeat_age": round(age, 1),
+                           "expired": age >= self.lease_seconds, "stranded": False})
+        for _, name, age in self._stranded(LEASED):
+            task_id, owner = name[:-len(".json")].split(".", 1)
+            leases.append({"task_id": task_id, "owner": owner, "heartbeat_age": round(age, 1),
+                           "expired": True, "stranded": True})
+        oldest = None
+        if available:
+            try:
+                oldest = round(now - self._read(self.root / READY / available[0], READY).enqueued_at, 1)
+            except FileNotFoundError:
+                pass
+        return {
+            "counts": {READY: len(ready), LEASED: len(leases), DONE: len(self._names(DONE)), DEAD: len(self._names(DEAD))},
+            "available": len(available),
+            "oldest_wait_seconds": oldest,
+            "leases": leases,
+        }
+
+    def dead(self) -> list:
+        tasks = []
+        for name in sorted(self._names(DEAD)):
+            try:
+                tasks.append(self._read(self.root / DEAD / name, DEAD))
+            except FileNotFoundError:
+                continue
+        return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the shared work queue")
+    parser.add_argument("--queue", default=WORK_QUEUE_DIR, help="Work queue folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Task counts, queue wait and current leases")
+    commands.add_parser("dead", help="List dead-lettered tasks with their errors")
+    retry = commands.add_parser("retry", help="Queue dead-lettered tasks again")
+    retry.add_argument("task_ids", nargs="*", help="Tasks to retry (default: all dead tasks)")
+    enqueue = commands.add_parser("enqueue", help="Queue PDF files, or the PDFs in folders")
+    enqueue.add_argument("paths", nargs="+")
+    enqueue.add_argument("--recursive", action="store_true", help="Include subfolders")
+    purge = commands.add_parser("purge", help="Delete finished tasks")
+    purge.add_argument("--older-than", type=float, default=86400, help="Seconds since the task finished")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.command == "status":
+        print(json.dumps(queue.status(), indent=2))
+    elif args.command == "dead":
+        for task in queue.dead():
+            print(f"{task.id}\t{task.path}\tattempts={task.attempts}\t{task.error}")
+    elif args.command == "retry":
+        print(f"Queued {queue.retry(args.task_ids or None)} dead task(s) again")
+    elif args.command == "enqueue":
+        queued = 0
+        for path in args.paths:
+            files = iter_inputs(path, recursive=args.recursive) if os.path.isdir(path) else [path]
+            for file in files:
+                queue.put(file)
+                queued += 1
+        print(f"Queued {queued} file(s) in {args.queue}")
+    elif args.command == "purge":
+        print(f"Deleted {queue.purge(args.older_than)} finished task(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ import os
 import sys
 import argparse
 import inspect
+import logging
+import threading
 import warnings
 
 import cv2
@@ -25,6 +27,8 @@ import numpy as np
 import torch
 from .config import EXP_FILE, CKPT_PATH, CONF_THRES, NMS_THRES, DEVICE
 
+logger = logging.getLogger(__name__)
+
 # Ensure YOLOX root is importable when running from repo root
 sys.path.insert(0, os.path.abspath("."))
 
@@ -98,8 +102,22 @@ def get_class_names(exp):
         return None
 
 
-# def run_inference(exp_file, ckpt_path, image_path, conf_thres, nms_thres, device):
-def run_inference(image):
+_model = None
+_model_lock = threading.Lock()
+# One forward pass at a time: torch already spreads a pass over the CPU cores
+_inference_lock = threading.Lock()
+
+
+def load_model():
+    """Experiment, fused model and device, loaded from CKPT_PATH once per process and shared by every caller"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = _load_model()
+        return _model
+
+
+def _load_model():
     # Load experiment & model
     exp = get_exp(EXP_FILE, None)
     model = exp.get_model()
@@ -117,6 +135,18 @@ def run_inference(image):
     # Fuse for speed & move to device
     device = torch.device(DEVICE if torch.cuda.is_available() and DEVICE.startswith("cuda") else "cpu")
     model = fuse_model(model).to(device)
+    logger.info("OD model loaded", extra={"checkpoint": CKPT_PATH, "device": str(device)})
+    return exp, model, device
+
+
+# def run_inference(exp_file, ckpt_path, image_path, conf_thres, nms_thres, device):
+def run_detection(image):
+    """Run the detector on a BGR image.
+
+    Returns (vis_img, detections) where each detection is a dict with
+    ``class_name``, ``score`` and ``bbox`` ([x0, y0, x1, y1] in image pixels).
+    """
+    exp, model, device = load_model()
 
     # Read image
     # img = cv2.imread(image)
@@ -128,7 +158,7 @@ def run_inference(image):
     img_tensor = torch.from_numpy(img_processed).unsqueeze(0).float().to(device)
 
     # Inference
-    with torch.no_grad():
+    with _inference_lock, torch.no_grad():
         outputs = model(img_tensor)
         outputs = postprocess(
             outputs,
@@ -138,6 +168,7 @@ def run_inference(image):
         )
 
     # Visualize
+    detections = []
     if outputs[0] is not None:
         pred = outputs[0].cpu()
         bboxes = pred[:, 0:4] / ratio  # de-scale to original image size
@@ -147,23 +178,32 @@ def run_inference(image):
         class_names = get_class_names(exp)
         vis_img, op_results = vis(image, bboxes, scores, cls_ids, conf=CONF_THRES, class_names=class_names)
         
-        # Create detection results with class names
-        detection_results = []
+        # Create detection results with class names, scores and boxes
         for i, cls_id in enumerate(cls_ids):
             if cls_id < len(class_names):
-                detection_results.append(class_names[int(cls_id)])
+                detections.append({
+                    "class_name": class_names[int(cls_id)],
+                    "score": float(scores[i]),
+                    "bbox": [float(v) for v in bboxes[i].tolist()],
+                })
         
-        print(f"Raw detection results: {detection_results}")
+        logger.debug("Raw detection results: %s", [d["class_name"] for d in detections])
         
         # saving img
         # save_path = os.path.splitext(os.path.basename(image))[0] + "_yolox.jpg"
         # cv2.imwrite(save_path, vis_img)
         # print(f"Saved: {save_path}")
     else:
-        print("No objects detected above threshold.")
-        detection_results = []
+        logger.debug("No objects detected above threshold.")
+        vis_img = image
     
-    return vis_img, detection_results
+    return vis_img, detections
+
+
+def run_inference(image):
+    """Run the detector and return (vis_img, list of detected class names)"""
+    vis_img, detections = run_detection(image)
+    return vis_img, [d["class_name"] for d in detections]
 
 
 def parse_args():